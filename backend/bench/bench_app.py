@@ -0,0 +1,282 @@
+"""
+端到端压测：用 uvicorn 启动 main.app，后端接本地 Mock GitHub (可配置延迟和文章数) 与桩图床，
+Redis 使用 fakeredis 或真实实例 (会清空指定的 db)。按阶段执行编辑者脚本：
+list / open / save / rename / upload，报告每种操作的吞吐、p50/p95/p99 延迟和平均 GitHub 调用次数，
+结果保存为 JSON，可与基线对比发现性能回退。
+
+    cd backend && pip install -r bench/requirements.txt
+    python -m bench.bench_app --posts 1000 --editors 20 --iterations 10 --latency 0.05
+    python -m bench.bench_app --posts 1000 --compare bench/results/<baseline>.json
+    python -m bench.bench_app --redis 127.0.0.1:6379 --redis-db 15
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import tempfile
+
+import httpx
+
+from bench.bench_github_client import percentile
+from bench.mock_github import create_mock_github, serve
+from bench.stub_image_host import create_stub_image_host
+
+OPS = ("list", "open", "save", "rename", "upload")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+ADMIN_PASSWORD = "bench-password"
+
+
+def post_path(i: int) -> str:
+    # 与 MockRepo 生成的文章路径一致
+    return f"src/posts/{i % 20}/post-{i}.md"
+
+
+def summarize(samples: list, errors: int, wall: float, github_calls: int) -> dict:
+    count = len(samples)
+    return {
+        "count": count,
+        "errors": errors,
+        "throughput_ops": round(count / wall, 1) if wall else None,
+        "p50_ms": round(percentile(samples, 50) * 1000, 1),
+        "p95_ms": round(percentile(samples, 95) * 1000, 1),
+        "p99_ms": round(percentile(samples, 99) * 1000, 1),
+        "github_calls_per_op": round(github_calls / count, 2) if count else None,
+    }
+
+
+def make_images(count: int) -> list:
+    """生成测试图片；有 Pillow 时为真实 JPEG (会经过缩放转码)，否则为随机字节"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return [os.urandom(300 * 1024) for _ in range(count)]
+    images = []
+    for _ in range(count):
+        buf = io.BytesIO()
+        Image.effect_noise((1600, 1200), 30).convert("RGB").save(buf, "JPEG", quality=90)
+        images.append(buf.getvalue())
+    return images
+
+
+class Workload:
+    def __init__(self, http: httpx.AsyncClient, repo, args):
+        self.http = http
+        self.repo = repo
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.shas = {}
+        self.names = {}
+        self.images = make_images(4)
+
+    async def call(self, method: str, url: str, **kwargs) -> dict:
+        response = await self.http.request(method, url, **kwargs)
+        if response.status_code != 200:
+            return {"code": response.status_code}
+        return response.json()
+
+    async def op_list(self, i: int, r: int) -> bool:
+        return (await self.call("GET", "/api/articles"))["code"] == 200
+
+    async def op_open(self, i: int, r: int) -> bool:
+        # 热点分布：大部分请求集中在最近的少量文章上
+        target = min(int(self.rng.paretovariate(1.2)) - 1, self.args.posts - 1)
+        res = await self.call("GET", "/api/article/detail", params={"path": post_path(target)})
+        return res["code"] == 200
+
+    async def own_sha(self, i: int) -> str:
+        """编辑者 i 当前文章的 SHA (首次使用时读取详情)"""
+        if i not in self.shas:
+            detail = await self.call("GET", "/api/article/detail", params={"path": self.names.get(i, post_path(i))})
+            self.shas[i] = detail.get("sha")
+        return self.shas[i]
+
+    async def op_save(self, i: int, r: int) -> bool:
+        sha = await self.own_sha(i)
+        res = await self.call("POST", "/api/article/save", json={
+            "path": self.names.get(i, post_path(i)),
+            "content": f"---\ntitle: 文章 {i}\n---\n\n第 {r} 次编辑\n",
+            "sha": sha,
+        })
+        if res["code"] == 200:
+            self.shas[i] = res["sha"]
+        return res["code"] == 200
+
+    async def op_rename(self, i: int, r: int) -> bool:
+        old = self.names.get(i, post_path(i))
+        new = post_path(i) if old != post_path(i) else f"src/posts/{i % 20}/renamed-{i}.md"
+        sha = await self.own_sha(i)
+        res = await self.call("POST", "/api/article/rename", json={"old_path": old, "new_path": new, "sha": sha})
+        if res["code"] == 200:
+            self.names[i], self.shas[i] = new, res["sha"]
+        return res["code"] == 200
+
+    async def op_upload(self, i: int, r: int) -> bool:
+        data = self.rng.choice(self.images)
+        if self.rng.random() >= self.args.dup_rate:
+            # JPEG 结束标记之后的字节会被解码器忽略，用来制造内容不同的图片
+            data += os.urandom(16)
+        res = await self.call("POST", "/api/upload/image", files={"file": (f"shot-{i}-{r}.jpg", data, "image/jpeg")})
+        return res["code"] == 200
+
+
+async def run_phase(name: str, workload: Workload, editors: int, iterations: int) -> dict:
+    op = getattr(workload, f"op_{name}")
+    samples, errors = [], 0
+
+    async def editor(i: int):
+        nonlocal errors
+        for r in range(iterations):
+            start = time.perf_counter()
+            try:
+                ok = await op(i, r)
+            except Exception:
+                ok = False
+            samples.append(time.perf_counter() - start)
+            errors += 0 if ok else 1
+
+    calls = workload.repo.api_calls
+    start = time.perf_counter()
+    await asyncio.gather(*(editor(i) for i in range(editors)))
+    wall = time.perf_counter() - start
+    return summarize(samples, errors, wall, workload.repo.api_calls - calls)
+
+
+async def run(args, base_url: str, repo) -> dict:
+    limits = httpx.Limits(max_connections=args.editors, max_keepalive_connections=args.editors)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as http:
+        res = await http.post("/api/login", json={"password": ADMIN_PASSWORD})
+        res.raise_for_status()
+        http.headers["Authorization"] = f"Bearer {res.json()['access_token']}"
+        workload = Workload(http, repo, args)
+
+        report = {}
+        calls = repo.api_calls
+        start = time.perf_counter()
+        ok = await workload.op_list(0, 0)
+        report["list_cold"] = summarize([time.perf_counter() - start], 0 if ok else 1, time.perf_counter() - start,
+                                        repo.api_calls - calls)
+        for name in args.ops:
+            report[name] = await run_phase(name, workload, args.editors, args.iterations)
+            # 让后台预热等任务完成，避免计入下一个阶段
+            await asyncio.sleep(0.2)
+        return report
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """返回回退项列表；p99 或每次操作的 GitHub 调用数上升超过 threshold、或出现新的错误视为回退"""
+    regressions = []
+    print(f"\n{'op':<10}{'p50 ms':>18}{'p99 ms':>18}{'ops/s':>18}{'gh calls/op':>18}")
+    for op, cur in report["ops"].items():
+        base = baseline.get("ops", {}).get(op)
+        if not base:
+            continue
+        cells = []
+        for field in ("p50_ms", "p99_ms", "throughput_ops", "github_calls_per_op"):
+            b, c = base.get(field), cur.get(field)
+            delta = f"{(c - b) / b * 100:+.0f}%" if b else "n/a"
+            cells.append(f"{b}->{c} ({delta})")
+        print(f"{op:<10}" + "".join(f"{cell:>18}" for cell in cells))
+        for field in ("p99_ms", "github_calls_per_op"):
+            b, c = base.get(field), cur.get(field)
+            if b and c is not None and c > b * (1 + threshold):
+                regressions.append(f"{op}.{field}: {b} -> {c}")
+        if cur["errors"] > base.get("errors", 0):
+            regressions.append(f"{op}.errors: {base.get('errors', 0)} -> {cur['errors']}")
+    return regressions
+
+
+def configure_redis(args):
+    if args.redis == "fake":
+        try:
+            import fakeredis
+            import redis
+        except ImportError:
+            sys.exit("fakeredis 未安装：pip install -r bench/requirements.txt，或使用 --redis host:port")
+        server = fakeredis.FakeServer()
+        redis.Redis = lambda *a, **k: fakeredis.FakeRedis(server=server, decode_responses=k.get("decode_responses", False))
+        return
+    import redis
+    host, _, port = args.redis.partition(":")
+    os.environ.update({"REDIS_HOST": host, "REDIS_PORT": port or "6379", "REDIS_DB": str(args.redis_db)})
+    # 保证每次运行从冷缓存开始，结果可比
+    redis.Redis(host=host, port=int(port or 6379), db=args.redis_db).flushdb()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=1000, help="仓库文章数 (如 100 / 1000 / 10000)")
+    parser.add_argument("--editors", type=int, default=20, help="并发编辑者数")
+    parser.add_argument("--iterations", type=int, default=10, help="每个编辑者每个阶段的操作次数")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock GitHub 单次请求延迟 (秒)")
+    parser.add_argument("--image-latency", type=float, default=0.1, help="桩图床单次上传延迟 (秒)")
+    parser.add_argument("--dup-rate", type=float, default=0.3, help="重复上传同一图片的比例")
+    parser.add_argument("--ops", nargs="+", default=list(OPS), choices=OPS)
+    parser.add_argument("--redis", default="fake", help="fake 或 host:port (会清空 --redis-db)")
+    parser.add_argument("--redis-db", type=int, default=15)
+    parser.add_argument("--port", type=int, default=9100, help="应用端口，Mock GitHub 和桩图床使用后续两个端口")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果文件路径 (默认 bench/results/<时间>-<文章数>.json)")
+    parser.add_argument("--compare", help="基线结果文件，p99 或 GitHub 调用数回退超过阈值时退出码为 1")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.editors > args.posts:
+        parser.error("--editors 不能大于 --posts (每个编辑者编辑自己的文章)")
+
+    mock = create_mock_github(latency=args.latency, posts=args.posts)
+    stub = create_stub_image_host(latency=args.image_latency)
+    servers = [serve(mock, args.port + 1), serve(stub, args.port + 2)]
+    auth_dir = tempfile.mkdtemp(prefix="cms-bench-")
+    os.environ.update({
+        "GITHUB_API_URL": f"http://127.0.0.1:{args.port + 1}",
+        "GITHUB_TOKEN": "bench",
+        "REPO_NAME": "bench/blog",
+        "GITHUB_BACKEND": "api",
+        "TG_IMG_API": f"http://127.0.0.1:{args.port + 2}/upload",
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "SAVE_JOURNAL_FILE": os.path.join(auth_dir, "save_journal.jsonl"),
+    })
+    configure_redis(args)
+
+    # 认证文件写到临时目录，不影响本地真实的 auth_data.json
+    from core import auth
+    auth.AUTH_FILE = os.path.join(auth_dir, "auth_data.json")
+    import main as app_module
+
+    try:
+        servers.append(serve(app_module.app, args.port))
+        ops = asyncio.run(run(args, f"http://127.0.0.1:{args.port}", mock.state.repo))
+    finally:
+        for server in servers:
+            server.should_exit = True
+
+    result = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "python": sys.version.split()[0],
+        "ops": ops,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{args.posts}posts.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"\n结果已保存到 {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            print("\n性能回退：\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\n未发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+增量保存基准：一篇带内嵌数据的长文章连续自动保存 (每次一处小改动)，对比
+- full：每次上传完整内容
+- delta：只上传相对于上一版本的补丁和校验值
+报告请求体大小、请求模型解析耗时和端到端保存延迟 (进程内 TestClient，写后提交模式)。
+
+    cd backend && python -m bench.bench_delta --size 300 --saves 50
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+
+from bench.bench_app import configure_redis, ADMIN_PASSWORD
+from bench.bench_github_client import summarize
+from bench.mock_github import create_mock_github, serve
+
+PATH = "src/posts/0/post-0.md"
+
+
+def make_document(kb: int) -> str:
+    """front-matter + 正文 + 内嵌的大段 JSON 数据"""
+    rng = random.Random(0)
+    rows = []
+    while sum(len(r) for r in rows) < kb * 1024:
+        rows.append(json.dumps({"x": rng.random(), "y": rng.random(), "label": f"点{len(rows)}"}, ensure_ascii=False))
+    return "---\ntitle: 长文章\ndate: 2024-01-01\n---\n\n正文\n\n```json\n[" + ",\n".join(rows) + "]\n```\n"
+
+
+def diff_patch(base: str, new: str) -> list:
+    """与前端 diffPatch 相同：公共前缀 / 后缀之间的一次替换 (测试文本不含 BMP 以外的字符)"""
+    prefix = 0
+    limit = min(len(base), len(new))
+    while prefix < limit and base[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and base[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return [[prefix, len(base) - prefix - suffix, new[prefix:len(new) - suffix]]]
+
+
+def run(c, headers: dict, mode: str, saves: int, content: str, sha: str, model, git_blob_sha) -> dict:
+    rng = random.Random(1)
+    samples = {"save": [], "parse": []}
+    sizes = []
+    errors = 0
+    for i in range(saves):
+        pos = rng.randrange(len(content))
+        new = content[:pos] + f"[{mode}{i}]" + content[pos:]
+        if mode == "delta":
+            payload = {"path": PATH, "sha": sha, "patch": diff_patch(content, new), "checksum": git_blob_sha(new)}
+        else:
+            payload = {"path": PATH, "sha": sha, "content": new}
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        sizes.append(len(body))
+
+        start = time.perf_counter()
+        model.model_validate_json(body)
+        samples["parse"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        res = c.post("/api/article/save", content=body, headers={**headers, "Content-Type": "application/json"}).json()
+        samples["save"].append(time.perf_counter() - start)
+        if res["code"] != 200:
+            errors += 1
+            continue
+        content, sha = new, res["sha"]
+    return {
+        "request_bytes_mean": round(sum(sizes) / len(sizes)),
+        "errors": errors,
+        **summarize(samples),
+    }, content, sha
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=300, help="文章大小 (KB)")
+    parser.add_argument("--saves", type=int, default=50)
+    parser.add_argument("--port", type=int, default=9001)
+    args = parser.parse_args()
+
+    mock = create_mock_github(posts=20)
+    mock.state.repo.set_file(PATH, make_document(args.size).encode("utf-8"))
+    mock.state.repo.commit()
+    server = serve(mock, args.port)
+    tmp = tempfile.mkdtemp(prefix="cms-bench-")
+    os.environ.update({
+        "GITHUB_API_URL": f"http://127.0.0.1:{args.port}",
+        "GITHUB_TOKEN": "bench",
+        "REPO_NAME": "bench/blog",
+        "GITHUB_BACKEND": "api",
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "SAVE_JOURNAL_FILE": os.path.join(tmp, "save_journal.jsonl"),
+        # 基准测试期间不提交，只比较保存接口本身
+        "SAVE_DEBOUNCE": "3600",
+        "SAVE_MAX_DELAY": "3600",
+        "PREFETCH_ENABLED": "false",
+    })
+    configure_redis(argparse.Namespace(redis="fake"))
+    from core import auth
+    auth.AUTH_FILE = os.path.join(tmp, "auth_data.json")
+    import main as app_module
+    from fastapi.testclient import TestClient
+
+    try:
+        with TestClient(app_module.app) as c:
+            token = c.post("/api/login", json={"password": ADMIN_PASSWORD}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            detail = c.get("/api/article/detail", params={"path": PATH}, headers=headers).json()
+            content, sha = detail["data"]["content"], detail["sha"]
+            report = {"document_kb": round(len(content.encode("utf-8")) / 1024), "saves": args.saves}
+            for mode in ("full", "delta"):
+                report[mode], content, sha = run(
+                    c, headers, mode, args.saves, content, sha,
+                    app_module.SaveArticleRequest, app_module.git_blob_sha,
+                )
+            report["deltas"] = app_module.save_deltas
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+变更推送基准：N 个空闲的事件流连接 (进程内，不经过网络)，报告
+- 每个空闲连接占用的内存 (tracemalloc)
+- 发布一条变更送达所有连接的耗时 (编码一次，放入 N 个队列)
+- 对比轮询：同样 N 个客户端每 interval 秒请求一次 /api/version 的请求速率
+
+    cd backend && python -m bench.bench_feed --connections 5000
+"""
+import json
+import time
+import asyncio
+import argparse
+import tracemalloc
+
+from core.change_feed import ChangeFeed
+
+
+async def run(connections: int, events: int) -> dict:
+    feed = ChangeFeed(max_connections=connections, heartbeat=3600)
+    received = [0] * connections
+
+    async def client(i):
+        async for frame in feed.stream():
+            if frame.startswith(b"id:"):
+                received[i] += 1
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [asyncio.ensure_future(client(i)) for i in range(connections)]
+    await asyncio.sleep(0.1)
+    idle_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    fanout = []
+    for n in range(events):
+        changes = [{"path": f"src/posts/{n % 20}/post-{n}.md", "action": "update", "sha": "%040x" % n}]
+        start = time.perf_counter()
+        feed.deliver(feed.event(changes, commit="%040x" % n))
+        fanout.append(time.perf_counter() - start)
+        # 等所有客户端取走
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.1)
+    await feed.stop()
+    await asyncio.gather(*tasks)
+    fanout.sort()
+    return {
+        "connections": connections,
+        "idle_bytes_per_connection": round(idle_bytes / connections),
+        "fanout_p50_ms": round(fanout[len(fanout) // 2] * 1000, 3),
+        "fanout_max_ms": round(fanout[-1] * 1000, 3),
+        "all_delivered": all(r == events for r in received),
+        "stats": feed.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--poll-interval", type=float, default=300, help="被替代的 /api/version 轮询间隔 (秒)")
+    args = parser.parse_args()
+    report = asyncio.run(run(args.connections, args.events))
+    report["polling_requests_per_second"] = round(args.connections / args.poll_interval, 1)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+对比同步 GitHubClient (PyGithub + Starlette 默认线程池) 与 AsyncGitHubClient
+在 N 个编辑者并发读写时的 p50/p99 延迟。
+
+    cd backend && python -m bench.bench_github_client --editors 50 --rounds 5 --latency 0.1
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from functools import partial
+
+import anyio.to_thread
+
+from bench.mock_github import create_mock_github, serve
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    index = min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(samples: dict) -> dict:
+    result = {}
+    for op, values in samples.items():
+        result[op] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "mean_ms": round(statistics.mean(values) * 1000, 1),
+        }
+    return result
+
+
+async def run_editors(editors: int, rounds: int, read, write) -> dict:
+    """每个编辑者反复执行：读取自己的文章 -> 基于 SHA 保存"""
+    samples = {"read": [], "save": []}
+
+    async def editor(i: int):
+        path = f"src/posts/{i % 20}/post-{i}.md"
+        for r in range(rounds):
+            start = time.perf_counter()
+            content, sha = await read(path)
+            samples["read"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await write(path, content + f"\nedit {r}", sha)
+            samples["save"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(editor(i) for i in range(editors)))
+    wall = time.perf_counter() - start
+    result = summarize(samples)
+    result["wall_s"] = round(wall, 2)
+    return result
+
+
+async def bench_sync(editors: int, rounds: int) -> dict:
+    from core.github_client import GitHubClient
+
+    client = GitHubClient()
+    # 与旧版 sync def 接口一致：阻塞调用在 anyio 默认线程池 (40 线程) 中执行
+    async def read(path):
+        return await anyio.to_thread.run_sync(client.get_file_content, path)
+
+    async def write(path, content, sha):
+        return await anyio.to_thread.run_sync(partial(client.save_file, path, "bench", content, sha))
+
+    return await run_editors(editors, rounds, read, write)
+
+
+async def bench_async(editors: int, rounds: int) -> dict:
+    from core.async_github_client import AsyncGitHubClient
+
+    client = AsyncGitHubClient()
+
+    async def write(path, content, sha):
+        return await client.update_file(path, "bench", content, sha)
+
+    try:
+        return await run_editors(editors, rounds, client.get_file_content, write)
+    finally:
+        await client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--editors", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.1, help="模拟的 GitHub 单次请求延迟 (秒)")
+    parser.add_argument("--port", type=int, default=9001)
+    args = parser.parse_args()
+
+    server = serve(create_mock_github(latency=args.latency, posts=max(args.editors, 100)), args.port)
+    os.environ.update({
+        "GITHUB_API_URL": f"http://127.0.0.1:{args.port}",
+        "GITHUB_TOKEN": "bench",
+        "REPO_NAME": "bench/blog",
+        "GITHUB_BACKEND": "api",
+    })
+    try:
+        report = {
+            "editors": args.editors,
+            "rounds": args.rounds,
+            "latency_s": args.latency,
+            "sync_threadpool": asyncio.run(bench_sync(args.editors, args.rounds)),
+            "async_pool": asyncio.run(bench_async(args.editors, args.rounds)),
+        }
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+GitHub 访问层的故障注入测试：在本地 Mock GitHub 上注入 5xx、次级限额、整体故障和额度耗尽，
+观察重试、熔断、优先级调度和额度预留的效果。
+
+    cd backend && python -m bench.bench_resilience --requests 300
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+
+from bench.mock_github import create_mock_github, serve
+from bench.bench_github_client import summarize
+from core.github_scheduler import priority, BACKGROUND, GitHubUnavailable
+
+
+def make_client(**env):
+    from core.async_github_client import AsyncGitHubClient
+
+    os.environ.update({k: str(v) for k, v in env.items()})
+    return AsyncGitHubClient()
+
+
+async def read_all(client, paths: list) -> dict:
+    """并发读取，统计成功率、延迟、重试次数"""
+    samples, outcome = {"read": []}, {"ok": 0, "error": 0, "unavailable": 0}
+
+    async def read(path):
+        start = time.perf_counter()
+        try:
+            await client.get_file_content(path)
+            outcome["ok"] += 1
+        except GitHubUnavailable:
+            outcome["unavailable"] += 1
+        except Exception:
+            outcome["error"] += 1
+        samples["read"].append(time.perf_counter() - start)
+
+    await asyncio.gather(*(read(path) for path in paths))
+    return {**outcome, "success_rate": round(outcome["ok"] / len(paths), 4), **summarize(samples)}
+
+
+async def scenario_flaky(app, requests: int) -> dict:
+    """20% 502 + 5% 次级限额 403：对比不重试与带抖动重试"""
+    faults = app.state.faults
+    faults.error_rate, faults.secondary_rate, faults.retry_after = 0.2, 0.05, 1
+    paths = [f"src/posts/{i % 20}/post-{i}.md" for i in range(requests)]
+    result = {}
+    for retries in (0, 3):
+        # 熔断阈值调高，只观察重试本身
+        client = make_client(GITHUB_RETRIES=retries, GITHUB_BREAKER_THRESHOLD=10 ** 6)
+        calls = app.state.repo.api_calls
+        try:
+            report = await read_all(client, paths)
+        finally:
+            await client.aclose()
+        report["github_calls"] = app.state.repo.api_calls - calls
+        report["retries"] = client.scheduler.counters["retries"]
+        result[f"retries={retries}"] = report
+    faults.error_rate = faults.secondary_rate = 0.0
+    return result
+
+
+async def scenario_outage(app, duration: float, rps: int) -> dict:
+    """持续读取期间 GitHub 整体故障 duration 秒：熔断后快速失败，故障期间只有探测请求到达上游"""
+    faults = app.state.faults
+    client = make_client(GITHUB_RETRIES=2, GITHUB_BREAKER_THRESHOLD=5, GITHUB_BREAKER_COOLDOWN=2)
+    outcome = {"ok": 0, "error": 0, "unavailable": 0}
+    fast_fail = []
+    tasks = []
+    recovered = None
+
+    async def read(i):
+        nonlocal recovered
+        start = time.perf_counter()
+        try:
+            await client.get_file_content(f"src/posts/{i % 20}/post-{i % 100}.md")
+            outcome["ok"] += 1
+            if not faults.outage and outage_end and recovered is None:
+                recovered = time.perf_counter() - outage_end
+        except GitHubUnavailable:
+            outcome["unavailable"] += 1
+            fast_fail.append(time.perf_counter() - start)
+        except Exception:
+            outcome["error"] += 1
+
+    outage_end = None
+    total = int(duration * 2 * rps)
+    calls_during = 0
+    try:
+        for i in range(total):
+            if i == total // 4:
+                faults.outage = True
+                calls_before = app.state.repo.api_calls
+            if faults.outage and i == total // 4 + int(duration * rps):
+                faults.outage = False
+                calls_during = app.state.repo.api_calls - calls_before
+                outage_end = time.perf_counter()
+            tasks.append(asyncio.ensure_future(read(i)))
+            await asyncio.sleep(1 / rps)
+        await asyncio.gather(*tasks)
+    finally:
+        await client.aclose()
+    return {
+        **outcome,
+        "outage_s": duration,
+        "requests_during_outage": int(duration * rps),
+        "github_calls_during_outage": calls_during,
+        "fast_fail_p50_ms": round(sorted(fast_fail)[len(fast_fail) // 2] * 1000, 2) if fast_fail else None,
+        "recovered_after_s": round(recovered, 2) if recovered is not None else None,
+        "scheduler": {k: v for k, v in client.scheduler.counters.items() if v},
+    }
+
+
+async def scenario_priority(app, background_reads: int, saves: int) -> dict:
+    """并发上限 2，后台批量读取排队时插入保存：保存优先拿到名额"""
+    app.state.faults.spike_rate = 0.0
+    client = make_client(GITHUB_MAX_CONCURRENCY=2, GITHUB_RETRIES=0)
+    samples = {"background": [], "save": []}
+
+    async def background_read(i):
+        start = time.perf_counter()
+        with priority(BACKGROUND):
+            await client.get_file_content(f"src/posts/{i % 20}/post-{i % 100}.md")
+        samples["background"].append(time.perf_counter() - start)
+
+    async def save(i):
+        await asyncio.sleep(0.05)
+        path = f"src/posts/{i % 20}/post-{i}.md"
+        start = time.perf_counter()
+        await client.update_file(path, "bench", f"edit {i}", app.state.repo.sha_of(path))
+        samples["save"].append(time.perf_counter() - start)
+
+    try:
+        await asyncio.gather(
+            *(background_read(i) for i in range(background_reads)),
+            *(save(i) for i in range(saves)),
+        )
+    finally:
+        await client.aclose()
+    return summarize(samples)
+
+
+async def scenario_budget(port: int, rate_limit: int, reserve: int) -> dict:
+    """主额度接近耗尽：后台请求在预留额度前停下，交互请求仍可使用预留部分"""
+    client = make_client(GITHUB_API_URL=f"http://127.0.0.1:{port}", GITHUB_BACKGROUND_RESERVE=reserve)
+    background_ok, deferred = 0, 0
+    try:
+        with priority(BACKGROUND):
+            for i in range(rate_limit):
+                try:
+                    await client.get_file_content(f"src/posts/{i % 20}/post-{i % 100}.md")
+                    background_ok += 1
+                except GitHubUnavailable:
+                    deferred += 1
+                    break
+        interactive = await read_all(client, [f"src/posts/{i % 20}/post-{i}.md" for i in range(reserve // 2)])
+    finally:
+        await client.aclose()
+    return {
+        "rate_limit": rate_limit,
+        "reserve": reserve,
+        "background_ok": background_ok,
+        "background_deferred": deferred,
+        "interactive_success_rate": interactive["success_rate"],
+        "remaining": client.rate_remaining,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.01, help="模拟的 GitHub 单次请求延迟 (秒)")
+    parser.add_argument("--outage", type=float, default=6, help="整体故障持续时间 (秒)")
+    parser.add_argument("--port", type=int, default=9001)
+    args = parser.parse_args()
+
+    app = create_mock_github(latency=args.latency, posts=max(args.requests, 100))
+    server = serve(app, args.port)
+    budget_server = serve(create_mock_github(latency=args.latency, rate_limit=300), args.port + 1)
+    os.environ.update({k: str(v) for k, v in {
+        "GITHUB_API_URL": f"http://127.0.0.1:{args.port}",
+        "GITHUB_TOKEN": "bench",
+        "REPO_NAME": "bench/blog",
+        "GITHUB_BACKEND": "api",
+        # Mock 不限制次级额度，放开本地预算以免场景之间互相影响
+        "GITHUB_SECONDARY_POINTS": 10 ** 6,
+        "GITHUB_WRITES_PER_MINUTE": 10 ** 6,
+    }.items()})
+    try:
+        report = {
+            "flaky": asyncio.run(scenario_flaky(app, args.requests)),
+            "outage": asyncio.run(scenario_outage(app, args.outage, rps=20)),
+            "priority": asyncio.run(scenario_priority(app, background_reads=200, saves=10)),
+            "budget": asyncio.run(scenario_budget(args.port + 1, rate_limit=300, reserve=100)),
+            "injected": app.state.faults.injected,
+        }
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    finally:
+        server.should_exit = True
+        budget_server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
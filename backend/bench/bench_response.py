@@ -0,0 +1,68 @@
+"""
+文章列表响应编码基准：对 N 篇文章的树，比较
+- 旧路径：success() 字典 -> jsonable_encoder -> 标准库 json 编码
+- dumps()：同样经过 jsonable_encoder，编码改用 orjson (已安装时)
+- 预序列化命中：PrecomputedPayload 直接拼接信封 (未压缩 / 已缓存的 gzip)
+
+    cd backend && python -m bench.bench_response --posts 10000 --rounds 50
+"""
+import json
+import time
+import argparse
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from bench.bench_github_client import percentile
+from core.article_index import ArticleIndex
+from core.response import success, dumps, orjson, PrecomputedPayload
+
+
+class _Request:
+    def __init__(self, accept_encoding: str):
+        self.headers = {"accept-encoding": accept_encoding}
+
+
+def measure(fn, rounds: int) -> dict:
+    samples = []
+    size = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        size = len(fn())
+        samples.append(time.perf_counter() - start)
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    index = ArticleIndex()
+    index.rebuild("bench", [
+        {"path": f"src/posts/{i % 50}/文章-{i}.md", "type": "blob", "sha": f"{i:040x}"} for i in range(args.posts)
+    ])
+    articles = index.articles()
+    payload = PrecomputedPayload(articles, total=len(articles))
+    plain, gzipped = _Request(""), _Request("gzip, deflate")
+
+    report = {
+        "posts": args.posts,
+        "orjson": orjson is not None,
+        "jsonable_encoder+json": measure(
+            lambda: JSONResponse(jsonable_encoder(success(data=articles, total=len(articles)))).body, args.rounds),
+        "jsonable_encoder+dumps": measure(
+            lambda: dumps(jsonable_encoder(success(data=articles, total=len(articles)))), args.rounds),
+        "precomputed": measure(lambda: payload.response(plain, extra={"cache": "HIT"}).body, args.rounds),
+        "precomputed_gzip": measure(lambda: payload.response(gzipped, extra={"cache": "HIT"}).body, args.rounds),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
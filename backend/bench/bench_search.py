@@ -0,0 +1,72 @@
+"""
+全文检索基准：生成 N 篇中英混排文章，测量建索引耗时、内存中的词项数以及查询 p50/p99。
+
+    cd backend && python -m bench.bench_search --posts 10000 --queries 200
+"""
+import json
+import time
+import random
+import argparse
+
+from bench.bench_github_client import percentile
+from core.search_index import SearchIndex
+
+WORDS = [
+    "异步", "编程", "数据库", "缓存", "索引", "性能", "优化", "部署", "容器", "网络",
+    "前端", "后端", "框架", "组件", "测试", "日志", "监控", "算法", "结构", "安全",
+    "python", "redis", "docker", "fastapi", "github", "vue", "nginx", "linux", "http", "api",
+]
+QUERIES = ["异步编程", "缓存索引", "redis", "性能优化", "docker 部署", "前端框架", "日志监控 linux", "安全"]
+
+
+def make_post(rng: random.Random, words: int) -> str:
+    body = []
+    for _ in range(words // 12):
+        sentence = "".join(rng.choice(WORDS) + (" " if rng.random() < 0.3 else "") for _ in range(12))
+        body.append(sentence + "。")
+    return f"---\ntitle: {rng.choice(WORDS)}{rng.choice(WORDS)}笔记\n---\n" + "\n".join(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--words", type=int, default=400, help="每篇文章的词数")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    contents = {f"{i:040x}": make_post(rng, args.words) for i in range(args.posts)}
+    files = {f"src/posts/{i}.md": sha for i, sha in enumerate(contents)}
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.add_many(contents)
+    build_s = time.perf_counter() - start
+
+    samples = []
+    for i in range(args.queries):
+        q = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        index.search(q, files, page=1, page_size=20)
+        samples.append(time.perf_counter() - start)
+
+    # 增量更新：替换 1% 的文章
+    changed = {f"{args.posts + i:040x}": make_post(rng, args.words) for i in range(args.posts // 100)}
+    start = time.perf_counter()
+    index.add_many(changed)
+    index.prune(set(contents) - set(list(contents)[:len(changed)]) | set(changed))
+    update_s = time.perf_counter() - start
+
+    print(json.dumps({
+        "posts": args.posts,
+        "terms": len(index._postings),
+        "build_s": round(build_s, 2),
+        "incremental_update_ms": round(update_s * 1000, 1),
+        "query_p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "query_p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+图片上传基准：对比旧实现 (整文件读入内存 + 同步 requests.post) 与异步流式上传，
+测量 N 张图片的总耗时、上传期间事件循环的最大卡顿以及 Python 堆内存峰值。
+桩图床会按 fail_rate 返回 503，用于验证重试。
+
+    cd backend && python -m bench.bench_upload --files 20 --size-mb 4 --latency 0.2 --fail-rate 0.1
+"""
+import os
+import io
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+import requests
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from bench.mock_github import serve
+from bench.stub_image_host import create_stub_image_host
+
+
+def make_uploads(count: int, size: int) -> list:
+    uploads = []
+    for i in range(count):
+        spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        chunk = os.urandom(min(size, 1024 * 1024))
+        written = 0
+        while written < size:
+            spooled.write(chunk[:size - written])
+            written += min(len(chunk), size - written)
+        spooled.seek(0)
+        uploads.append(UploadFile(file=spooled, filename=f"img-{i}.jpg",
+                                  headers=Headers({"content-type": "image/jpeg"})))
+    return uploads
+
+
+async def loop_lag_probe(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """测量事件循环的最大调度延迟 (被同步调用阻塞时会显著增大)"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def measure(upload_all) -> dict:
+    stop = asyncio.Event()
+    probe = asyncio.ensure_future(loop_lag_probe(stop))
+    tracemalloc.start()
+    start = time.perf_counter()
+    results = await upload_all()
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stop.set()
+    return {
+        "wall_s": round(wall, 2),
+        "ok": sum(1 for r in results if r),
+        "max_loop_lag_ms": round(await probe * 1000, 1),
+        "peak_heap_mb": round(peak / 1024 / 1024, 1),
+    }
+
+
+async def bench_legacy(api_url: str, uploads: list) -> dict:
+    async def legacy_one(file: UploadFile):
+        # 与旧版 TelegramUploader 相同：整文件读入内存 + 阻塞式 requests.post，不重试
+        content = await file.read()
+        try:
+            response = requests.post(api_url, files={"file": (file.filename, content, file.content_type)}, timeout=30)
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    async def upload_all():
+        return await asyncio.gather(*(legacy_one(f) for f in uploads))
+
+    return await measure(upload_all)
+
+
+async def bench_async(uploads: list) -> dict:
+    from core.image_uploader import TelegramUploader
+
+    uploader = TelegramUploader()
+
+    async def upload_all():
+        return [r["url"] for r in await uploader.upload_many(uploads)]
+
+    try:
+        return await measure(upload_all)
+    finally:
+        await uploader.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="桩图床处理单张图片的延迟 (秒)")
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--port", type=int, default=9002)
+    args = parser.parse_args()
+
+    app = create_stub_image_host(latency=args.latency, fail_rate=args.fail_rate)
+    server = serve(app, args.port)
+    api_url = f"http://127.0.0.1:{args.port}/upload"
+    os.environ.update({
+        "TG_IMG_API": api_url,
+        "TG_IMG_MAX_CONCURRENCY": str(args.concurrency),
+        "TG_IMG_BACKOFF": "0.05",
+    })
+    size = int(args.size_mb * 1024 * 1024)
+    try:
+        report = {
+            "files": args.files,
+            "size_mb": args.size_mb,
+            "fail_rate": args.fail_rate,
+            "legacy_sync": asyncio.run(bench_legacy(api_url, make_uploads(args.files, size))),
+            "async_stream": asyncio.run(bench_async(make_uploads(args.files, size))),
+            "stub_failures_injected": app.state.stub.failures,
+            "stub_max_in_flight": app.state.stub.max_in_flight,
+        }
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
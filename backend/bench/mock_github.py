@@ -0,0 +1,299 @@
+"""
+本地 Mock GitHub REST API，仅实现 CMS 用到的接口，用于基准测试。
+
+    app = create_mock_github(latency=0.05, posts=100)
+    server = serve(app, port=9001)
+
+故障注入 (可在运行中修改 app.state.faults)：
+    app.state.faults.error_rate = 0.2      # 20% 的请求返回 502
+    app.state.faults.outage = True         # 所有请求返回 503
+"""
+import time
+import random
+import base64
+import asyncio
+import hashlib
+import threading
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def git_blob_sha(content: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+class MockRepo:
+    """内存中的单分支仓库：blob/tree/commit 对象 + 当前 HEAD 的 path -> bytes 视图"""
+
+    def __init__(self, posts: int = 100):
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.files = {}
+        self.entries = {}
+        self.head = None
+        self.api_calls = 0
+        for i in range(posts):
+            body = f"---\ntitle: 文章 {i}\ndate: 2024-01-{i % 28 + 1:02d}\ntags: [t{i % 10}]\n---\n\n正文内容 {i}\n"
+            self.set_file(f"src/posts/{i % 20}/post-{i}.md", body.encode("utf-8"))
+        self.commit()
+
+    def set_file(self, path: str, content: bytes):
+        self.files[path] = content
+        self.entries[path] = self.add_blob(content)
+
+    def remove_file(self, path: str):
+        self.files.pop(path, None)
+        self.entries.pop(path, None)
+
+    def add_blob(self, content: bytes) -> str:
+        sha = git_blob_sha(content)
+        self.blobs[sha] = content
+        return sha
+
+    def add_tree(self, entries: dict) -> str:
+        sha = hashlib.sha1(repr(sorted(entries.items())).encode()).hexdigest()
+        self.trees[sha] = entries
+        return sha
+
+    def add_commit(self, tree_sha: str, parents: list) -> dict:
+        sha = hashlib.sha1(f"commit-{len(self.commits)}-{tree_sha}".encode()).hexdigest()
+        self.commits[sha] = {"sha": sha, "tree": {"sha": tree_sha}, "parents": [{"sha": p} for p in parents]}
+        return self.commits[sha]
+
+    def commit(self) -> dict:
+        """把 files 的当前状态提交为新的 HEAD (Contents API 路径)"""
+        tree_sha = self.add_tree(dict(self.entries))
+        commit = self.add_commit(tree_sha, [self.head] if self.head else [])
+        self.head = commit["sha"]
+        return commit
+
+    def advance(self, commit_sha: str):
+        """更新分支引用 (Git Data API 路径)"""
+        self.head = commit_sha
+        self.entries = dict(self.trees[self.commits[commit_sha]["tree"]["sha"]])
+        self.files = {path: self.blobs[sha] for path, sha in self.entries.items()}
+
+    def resolve_tree(self, ref: str) -> dict:
+        if ref in self.trees:
+            return self.trees[ref]
+        commit = self.commits.get(self.head if ref == "main" else ref)
+        return self.trees[commit["tree"]["sha"]] if commit else None
+
+    def list_dir(self, entries: dict) -> list:
+        """非递归树：直接子项；子目录登记为以相对路径为键的子树"""
+        blobs, dirs = [], {}
+        for path, sha in entries.items():
+            head, sep, rest = path.partition("/")
+            if sep:
+                dirs.setdefault(head, {})[rest] = sha
+            else:
+                blobs.append({"path": path, "mode": "100644", "type": "blob", "sha": sha})
+        subtrees = [{"path": name, "mode": "040000", "type": "tree", "sha": self.add_tree(children)}
+                    for name, children in dirs.items()]
+        return sorted(blobs + subtrees, key=lambda e: e["path"])
+
+    def sha_of(self, path: str):
+        return self.entries.get(path)
+
+
+class Faults:
+    """故障注入配置；注入的错误在请求处理之前返回，写请求不会生效"""
+
+    def __init__(self, seed: int = 0):
+        self.error_rate = 0.0      # 随机返回 502 的比例
+        self.secondary_rate = 0.0  # 随机返回次级限额 403 (带 Retry-After) 的比例
+        self.retry_after = 1
+        self.spike_rate = 0.0      # 随机增加 spike 秒延迟的比例
+        self.spike = 1.0
+        self.outage = False        # 所有请求返回 503
+        self.rng = random.Random(seed)
+        self.injected = {"error": 0, "secondary": 0, "spike": 0, "outage": 0}
+
+    def pick(self):
+        if self.outage:
+            return "outage"
+        roll = self.rng.random()
+        if roll < self.error_rate:
+            return "error"
+        if roll < self.error_rate + self.secondary_rate:
+            return "secondary"
+        return None
+
+    def response(self, kind: str) -> JSONResponse:
+        self.injected[kind] += 1
+        if kind == "secondary":
+            return JSONResponse(
+                {"message": "You have exceeded a secondary rate limit. Please wait a few minutes before you try again."},
+                status_code=403, headers={"Retry-After": str(self.retry_after)},
+            )
+        if kind == "outage":
+            return JSONResponse({"message": "Service Unavailable"}, status_code=503)
+        return JSONResponse({"message": "Server Error"}, status_code=502)
+
+
+def create_mock_github(latency: float = 0.0, posts: int = 100, rate_limit: int = 5000) -> FastAPI:
+    app = FastAPI()
+    repo = MockRepo(posts)
+    faults = Faults()
+    app.state.repo = repo
+    app.state.faults = faults
+
+    def not_found():
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+
+    @app.middleware("http")
+    async def simulate_network(request: Request, call_next):
+        repo.api_calls += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if faults.spike_rate and faults.rng.random() < faults.spike_rate:
+            faults.injected["spike"] += 1
+            await asyncio.sleep(faults.spike)
+        fault = faults.pick()
+        response = faults.response(fault) if fault else await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(rate_limit)
+        response.headers["X-RateLimit-Remaining"] = str(max(rate_limit - repo.api_calls, 0))
+        response.headers["X-RateLimit-Reset"] = str(int(time.time()) + 3600)
+        return response
+
+    @app.get("/repos/{owner}/{name}")
+    async def get_repo(owner: str, name: str, request: Request):
+        base = str(request.base_url).rstrip("/")
+        return {
+            "id": 1,
+            "name": name,
+            "full_name": f"{owner}/{name}",
+            "url": f"{base}/repos/{owner}/{name}",
+            "default_branch": "main",
+        }
+
+    @app.get("/repos/{owner}/{name}/branches/{branch}")
+    async def get_branch(owner: str, name: str, branch: str):
+        return {"name": branch, "commit": {"sha": repo.head}}
+
+    @app.get("/repos/{owner}/{name}/git/ref/heads/{branch}")
+    @app.get("/repos/{owner}/{name}/git/refs/heads/{branch}")
+    async def get_ref(owner: str, name: str, branch: str, request: Request):
+        base = str(request.base_url).rstrip("/")
+        return {
+            "ref": f"refs/heads/{branch}",
+            "url": f"{base}/repos/{owner}/{name}/git/refs/heads/{branch}",
+            "object": {"sha": repo.head, "type": "commit"},
+        }
+
+    @app.get("/repos/{owner}/{name}/git/trees/{ref}")
+    async def get_tree(owner: str, name: str, ref: str, recursive: str = None):
+        entries = repo.resolve_tree(ref)
+        if entries is None:
+            return not_found()
+        if recursive:
+            tree = [
+                {"path": path, "mode": "100644", "type": "blob", "sha": sha}
+                for path, sha in sorted(entries.items())
+            ]
+        else:
+            tree = repo.list_dir(entries)
+        return {"sha": ref, "tree": tree, "truncated": False}
+
+    @app.get("/repos/{owner}/{name}/git/commits/{sha}")
+    async def get_commit(owner: str, name: str, sha: str):
+        return repo.commits.get(sha) or not_found()
+
+    @app.get("/repos/{owner}/{name}/git/blobs/{sha}")
+    async def get_blob(owner: str, name: str, sha: str):
+        content = repo.blobs.get(sha)
+        if content is None:
+            return not_found()
+        return {"sha": sha, "encoding": "base64", "size": len(content),
+                "content": base64.b64encode(content).decode("ascii")}
+
+    @app.post("/repos/{owner}/{name}/git/blobs")
+    async def create_blob(owner: str, name: str, request: Request):
+        body = await request.json()
+        if body.get("encoding") == "base64":
+            content = base64.b64decode(body["content"])
+        else:
+            content = body["content"].encode("utf-8")
+        return JSONResponse({"sha": repo.add_blob(content)}, status_code=201)
+
+    @app.post("/repos/{owner}/{name}/git/trees")
+    async def create_tree(owner: str, name: str, request: Request):
+        body = await request.json()
+        entries = dict(repo.trees.get(body.get("base_tree"), {}))
+        for item in body["tree"]:
+            if item.get("sha") is None:
+                entries.pop(item["path"], None)
+            else:
+                entries[item["path"]] = item["sha"]
+        return JSONResponse({"sha": repo.add_tree(entries)}, status_code=201)
+
+    @app.post("/repos/{owner}/{name}/git/commits")
+    async def create_commit(owner: str, name: str, request: Request):
+        body = await request.json()
+        return JSONResponse(repo.add_commit(body["tree"], body.get("parents", [])), status_code=201)
+
+    @app.patch("/repos/{owner}/{name}/git/refs/heads/{branch}")
+    async def update_ref(owner: str, name: str, branch: str, request: Request):
+        body = await request.json()
+        parents = [p["sha"] for p in repo.commits[body["sha"]]["parents"]]
+        if not body.get("force") and repo.head not in parents:
+            return JSONResponse({"message": "Update is not a fast forward"}, status_code=422)
+        repo.advance(body["sha"])
+        return {"ref": f"refs/heads/{branch}", "object": {"sha": repo.head, "type": "commit"}}
+
+    @app.get("/repos/{owner}/{name}/contents/{path:path}")
+    async def get_contents(owner: str, name: str, path: str):
+        content = repo.files.get(path)
+        if content is None:
+            return not_found()
+        return {
+            "type": "file",
+            "encoding": "base64",
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": repo.sha_of(path),
+            "size": len(content),
+            "content": base64.b64encode(content).decode("ascii"),
+        }
+
+    @app.put("/repos/{owner}/{name}/contents/{path:path}")
+    async def put_contents(owner: str, name: str, path: str, request: Request):
+        body = await request.json()
+        # 以下检查与写入之间没有 await，单线程事件循环下天然原子
+        current = repo.sha_of(path)
+        if current and not body.get("sha"):
+            return JSONResponse({"message": "Invalid request.\n\n\"sha\" wasn't supplied."}, status_code=422)
+        if body.get("sha") and body["sha"] != current:
+            return JSONResponse({"message": f"{path} does not match {body['sha']}"}, status_code=409)
+        repo.set_file(path, base64.b64decode(body["content"]))
+        commit = repo.commit()
+        return JSONResponse({
+            "content": {"path": path, "name": path.rsplit("/", 1)[-1], "sha": repo.sha_of(path)},
+            "commit": commit,
+        }, status_code=200 if current else 201)
+
+    @app.delete("/repos/{owner}/{name}/contents/{path:path}")
+    async def delete_contents(owner: str, name: str, path: str, request: Request):
+        body = await request.json()
+        current = repo.sha_of(path)
+        if current is None:
+            return not_found()
+        if body.get("sha") != current:
+            return JSONResponse({"message": f"{path} does not match {body.get('sha')}"}, status_code=409)
+        repo.remove_file(path)
+        commit = repo.commit()
+        return {"content": None, "commit": commit}
+
+    return app
+
+
+def serve(app, port: int, host: str = "127.0.0.1") -> uvicorn.Server:
+    """在后台线程启动 uvicorn，调用 server.should_exit = True 停止"""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
@@ -0,0 +1,131 @@
+"""
+回放 bench/fixtures/webhook 中录制的 GitHub webhook payload (按文件名顺序)：
+对每个 push 先在本地 Mock GitHub 上按 payload 的文件列表提交同样的变更，把 payload 中的
+${BEFORE} / ${AFTER} / ${COMMIT_n} / ${TREE_n} 替换为实际的 SHA，签名后发送给进程内的应用，检查
+- 返回的处理方式 (patched / rebuilt / invalidated / ignored / pong) 与 fixture 的 expect 一致
+- 之后读取的文章列表、文章索引和变更文章的详情与 Mock 仓库一致
+任一检查失败时以非零状态退出。
+
+    cd backend && python -m bench.replay_webhook
+"""
+import os
+import glob
+import json
+import hmac
+import hashlib
+import argparse
+import tempfile
+
+from bench.bench_app import configure_redis, ADMIN_PASSWORD
+from bench.mock_github import create_mock_github, serve
+from core.article_index import is_article
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "webhook")
+SECRET = "replay-secret"
+
+
+def apply_push(repo, payload: dict) -> dict:
+    """在 Mock 仓库上按 payload 逐个 commit 重放文件变更，返回占位符 -> SHA"""
+    values = {"BEFORE": repo.head}
+    if payload.get("ref") != "refs/heads/main" or payload.get("deleted"):
+        return values
+    for n, commit in enumerate(payload.get("commits") or [], 1):
+        for path in commit["added"] + commit["modified"]:
+            repo.set_file(path, f"---\ntitle: {path}\n---\n\n{commit['message']}\n".encode("utf-8"))
+        for path in commit["removed"]:
+            repo.remove_file(path)
+        created = repo.commit()
+        values[f"COMMIT_{n}"] = created["sha"]
+        values[f"TREE_{n}"] = created["tree"]["sha"]
+    values["AFTER"] = repo.head
+    return values
+
+
+def render(payload: dict, values: dict) -> bytes:
+    text = json.dumps(payload, ensure_ascii=False)
+    for name, value in values.items():
+        text = text.replace("${%s}" % name, value or "")
+    return text.encode("utf-8")
+
+
+def outcome(res: dict) -> str:
+    if res.get("msg") == "pong":
+        return "pong"
+    return (res.get("data") or {}).get("action", "ignored")
+
+
+def check_consistency(c, headers: dict, repo, main_module, payload: dict) -> list:
+    """读取后的列表、索引、变更文章详情应与 Mock 仓库一致，返回不一致的描述"""
+    problems = []
+    c.get("/api/articles")
+    expected = {path: sha for path, sha in repo.entries.items() if is_article(path)}
+    if main_module.article_index.files != expected:
+        problems.append("article index differs from repository")
+    for commit in payload.get("commits") or []:
+        for path in commit["added"] + commit["modified"]:
+            if not is_article(path) or path not in repo.files:
+                continue
+            detail = c.get("/api/article/detail", params={"path": path}, headers=headers).json()
+            if detail.get("sha") != repo.entries[path]:
+                problems.append(f"stale detail for {path}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9001)
+    args = parser.parse_args()
+
+    mock = create_mock_github(posts=20)
+    server = serve(mock, args.port)
+    tmp = tempfile.mkdtemp(prefix="cms-webhook-")
+    os.environ.update({
+        "GITHUB_API_URL": f"http://127.0.0.1:{args.port}",
+        "GITHUB_TOKEN": "bench",
+        "REPO_NAME": "bench/blog",
+        "GITHUB_BACKEND": "api",
+        "GITHUB_WEBHOOK_SECRET": SECRET,
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "SAVE_JOURNAL_FILE": os.path.join(tmp, "save_journal.jsonl"),
+        "PREFETCH_ENABLED": "false",
+        "SNAPSHOT_ENABLED": "false",
+    })
+    configure_redis(argparse.Namespace(redis="fake"))
+    from core import auth
+    auth.AUTH_FILE = os.path.join(tmp, "auth_data.json")
+    import main as app_module
+    from fastapi.testclient import TestClient
+
+    repo = mock.state.repo
+    results, failed = [], False
+    try:
+        with TestClient(app_module.app) as c:
+            token = c.post("/api/login", json={"password": ADMIN_PASSWORD}).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            # 建立索引，之后的推送才有可修补的基准
+            c.get("/api/articles")
+            for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json"))):
+                with open(path, encoding="utf-8") as f:
+                    fixture = json.load(f)
+                payload = fixture["payload"]
+                body = render(payload, apply_push(repo, payload) if fixture["event"] == "push" else {})
+                signature = "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+                res = c.post("/api/webhook/github", content=body, headers={
+                    "X-GitHub-Event": fixture["event"], "X-Hub-Signature-256": signature,
+                    "Content-Type": "application/json",
+                })
+                action = outcome(res.json()) if res.status_code == 200 else f"http {res.status_code}"
+                problems = [] if action == fixture["expect"] else [f"expected {fixture['expect']}, got {action}"]
+                problems += check_consistency(c, headers, repo, app_module, payload)
+                failed = failed or bool(problems)
+                results.append({"fixture": os.path.basename(path), "action": action, "problems": problems})
+    finally:
+        server.should_exit = True
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+本地图床桩服务，模拟 Telegraph-Image 风格的上传接口 (POST /upload，返回 [{"src": ...}])。
+
+    app = create_stub_image_host(latency=0.05, fail_rate=0.1)
+    server = serve(app, port=9002)
+"""
+import random
+import asyncio
+import hashlib
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class StubState:
+    def __init__(self):
+        self.uploads = 0
+        self.failures = 0
+        self.bytes = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+def create_stub_image_host(latency: float = 0.0, fail_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    app = FastAPI()
+    state = StubState()
+    app.state.stub = state
+    rng = random.Random(seed)
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        state.in_flight += 1
+        state.max_in_flight = max(state.max_in_flight, state.in_flight)
+        try:
+            form = await request.form()
+            file = form["file"]
+            digest = hashlib.sha1()
+            size = 0
+            while True:
+                chunk = await file.read(64 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+            if latency:
+                await asyncio.sleep(latency)
+            if rng.random() < fail_rate:
+                state.failures += 1
+                return JSONResponse({"error": "upstream busy"}, status_code=503)
+            state.uploads += 1
+            state.bytes += size
+            return [{"src": f"/file/{digest.hexdigest()}{_suffix(file.filename)}"}]
+        finally:
+            state.in_flight -= 1
+
+    return app
+
+
+def _suffix(filename: str) -> str:
+    return filename[filename.rfind("."):] if filename and "." in filename else ""
@@ -0,0 +1,258 @@
+import logging
+import threading
+from core import redis_io
+from core.metrics import INDEX_REBUILD
+
+logger = logging.getLogger("CMS-Index")
+
+ARTICLE_ROOTS = ("src/posts", "src/drafts")
+
+
+def is_article(path: str) -> bool:
+    return path.startswith(("src/posts/", "src/drafts/")) and path.endswith(".md")
+
+
+class ArticleIndex:
+    """
+    文章树索引：按 commit SHA 标记版本，持久化到 Redis (path -> blob sha)。
+    CMS 自身的写操作只修补受影响的路径，只有上游 SHA 在 CMS 之外变化时才全量重建。
+    Redis 读写在 redis_io 线程中执行 (持久化排队写入)，树的构建和修补仍在调用方线程中完成。
+    """
+
+    def __init__(self, redis_client=None, key_prefix: str = "cms:index"):
+        self.redis = redis_client
+        self.key_files = f"{key_prefix}:files"
+        self.key_commit = f"{key_prefix}:commit"
+        self.commit_sha = None
+        # 每次内容变化递增，供调用方缓存由索引派生的数据 (如预序列化的列表)
+        self.revision = 0
+        self.files = {}
+        self._root = {"name": "Root", "children": []}
+        self._folders = {"": self._root}
+        self._lock = threading.RLock()
+
+    # --- 树结构维护 ---
+
+    def _reset(self):
+        self.files = {}
+        self._root = {"name": "Root", "children": []}
+        self._folders = {"": self._root}
+        for root in ARTICLE_ROOTS:
+            self._ensure_folder(root)
+
+    def _ensure_folder(self, folder_path: str, ordered: bool = True) -> dict:
+        node = self._folders.get(folder_path)
+        if node is not None:
+            return node
+        parent_path, _, name = folder_path.rpartition("/")
+        parent = self._ensure_folder(parent_path, ordered)
+        node = {"name": name, "type": "folder", "children": [], "path": folder_path}
+        if ordered:
+            self._insert_child(parent, node)
+        else:
+            parent["children"].append(node)
+        self._folders[folder_path] = node
+        return node
+
+    @staticmethod
+    def _position(children: list, name: str) -> int:
+        """children 已按名称排序，二分查找 name 之后的插入位置"""
+        lo, hi = 0, len(children)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if children[mid]["name"] <= name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @classmethod
+    def _insert_child(cls, parent: dict, node: dict):
+        # 保持与 git tree 一致的按名称排序
+        children = parent["children"]
+        children.insert(cls._position(children, node["name"]), node)
+
+    @staticmethod
+    def _file_node(path: str, name: str, sha: str) -> dict:
+        return {
+            "name": name,
+            "path": path,
+            "type": "file",
+            "sha": sha,
+            "isDraft": "src/drafts/" in path
+        }
+
+    def _build(self, files: dict):
+        """一次性构建整棵树：先按目录挂载节点，最后每个目录排序一次 (逐个有序插入是 O(n²))"""
+        self._reset()
+        for path, sha in files.items():
+            folder_path, _, name = path.rpartition("/")
+            folder = self._ensure_folder(folder_path, ordered=False)
+            folder["children"].append(self._file_node(path, name, sha))
+        for folder in self._folders.values():
+            folder["children"].sort(key=lambda child: child["name"])
+        self.files = dict(files)
+
+    def _add_file(self, path: str, sha: str):
+        folder_path, _, name = path.rpartition("/")
+        folder = self._ensure_folder(folder_path)
+        children = folder["children"]
+        i = self._position(children, name)
+        if i and children[i - 1]["name"] == name and children[i - 1].get("type") == "file":
+            children[i - 1]["sha"] = sha
+        else:
+            children.insert(i, self._file_node(path, name, sha))
+        self.files[path] = sha
+
+    def _remove_file(self, path: str):
+        self.files.pop(path, None)
+        folder_path, _, name = path.rpartition("/")
+        folder = self._folders.get(folder_path)
+        if folder is None:
+            return
+        children = folder["children"]
+        i = self._position(children, name)
+        if i and children[i - 1].get("path") == path:
+            del children[i - 1]
+        # 向上清理空目录，但保留 posts/drafts 根目录
+        while not folder["children"] and folder_path not in ARTICLE_ROOTS and folder_path:
+            parent_path = folder_path.rpartition("/")[0]
+            parent = self._folders[parent_path]
+            parent["children"] = [c for c in parent["children"] if c is not folder]
+            del self._folders[folder_path]
+            folder, folder_path = parent, parent_path
+
+    def articles(self) -> list:
+        """返回与原接口一致的列表：posts 与 drafts 下的顶层节点"""
+        with self._lock:
+            result = []
+            for root in ARTICLE_ROOTS:
+                result.extend(self._folders[root]["children"])
+            return result
+
+    # --- 构建与修补 ---
+
+    def rebuild(self, commit_sha: str, entries: list):
+        """从完整文件树重建索引，entries 为 [{path, type, sha}]"""
+        with self._lock, INDEX_REBUILD.time():
+            self._build({
+                entry["path"]: entry["sha"] for entry in entries
+                if entry.get("type", "blob") == "blob" and is_article(entry["path"])
+            })
+            self.commit_sha = commit_sha
+            self.revision += 1
+            self._persist_all()
+        logger.info(f"Article index rebuilt at {commit_sha}: {len(self.files)} files")
+
+    def apply(self, files: dict, commit_sha: str = None, parent_sha: str = None, persist: bool = True):
+        """
+        CMS 写入后修补受影响的路径 (files 为 {path: 新 blob SHA | None 表示删除})。
+        parent_sha 与当前版本不一致说明期间有外部提交，此时放弃版本号等待全量重建。
+        persist=False 用于同步其他 worker 已经写入 Redis 的修补。
+        """
+        with self._lock:
+            for path, sha in files.items():
+                if sha and is_article(path):
+                    self._add_file(path, sha)
+                else:
+                    self._remove_file(path)
+            self._advance(commit_sha, parent_sha)
+            self.revision += 1
+            if persist:
+                self._persist(files)
+
+    def _advance(self, commit_sha: str, parent_sha: str):
+        if commit_sha and parent_sha and parent_sha == self.commit_sha:
+            self.commit_sha = commit_sha
+        else:
+            # 无法确认是线性提交，下次读取时强制全量重建
+            self.commit_sha = None
+
+    # --- 持久化 ---
+
+    async def load(self) -> bool:
+        """从 Redis 加载索引，避免重启后重新拉取全量树"""
+        if not self.redis:
+            return False
+        stored = await redis_io.run(self._read)
+        if stored is None:
+            return False
+        commit_sha, files = stored
+        with self._lock:
+            self._build(files)
+            self.commit_sha = commit_sha
+            self.revision += 1
+        logger.info(f"Article index loaded at {commit_sha}: {len(self.files)} files")
+        return True
+
+    def _read(self):
+        """(commit SHA, {path: sha})；Redis 中没有索引时返回 None"""
+        try:
+            commit_sha = self.redis.get(self.key_commit)
+            if not commit_sha:
+                return None
+            return commit_sha, self.redis.hgetall(self.key_files)
+        except Exception as e:
+            logger.error(f"Load article index failed: {e}")
+            return None
+
+    async def stored_commit(self):
+        if not self.redis:
+            return None
+        return await redis_io.run(self._read_commit)
+
+    def _read_commit(self):
+        try:
+            return self.redis.get(self.key_commit)
+        except Exception as e:
+            logger.error(f"Read article index commit failed: {e}")
+            return None
+
+    def _persist_all(self):
+        if self.redis:
+            redis_io.submit(self._write_all, dict(self.files), self.commit_sha)
+
+    def _write_all(self, files: dict, commit_sha: str):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.delete(self.key_files)
+            if files:
+                pipe.hset(self.key_files, mapping=files)
+            if commit_sha:
+                pipe.set(self.key_commit, commit_sha)
+            else:
+                pipe.delete(self.key_commit)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Persist article index failed: {e}")
+
+    def _persist(self, files: dict):
+        if self.redis:
+            redis_io.submit(self._write, dict(files), self.commit_sha)
+
+    def _write(self, files: dict, commit_sha: str):
+        try:
+            pipe = self.redis.pipeline()
+            for path, sha in files.items():
+                if sha and is_article(path):
+                    pipe.hset(self.key_files, path, sha)
+                else:
+                    pipe.hdel(self.key_files, path)
+            if commit_sha:
+                pipe.set(self.key_commit, commit_sha)
+            else:
+                pipe.delete(self.key_commit)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Persist article index failed: {e}")
+
+    async def is_current(self, version: str) -> bool:
+        """
+        索引是否已对应 version (内存或 Redis 中)，命中时无需访问 GitHub。
+        返回 False 时调用方应拉取全量树并调用 rebuild。
+        """
+        if not version:
+            return False
+        if self.commit_sha == version:
+            return True
+        return await self.stored_commit() == version and await self.load()
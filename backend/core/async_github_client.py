@@ -0,0 +1,299 @@
+import os
+import time
+import base64
+import asyncio
+import posixpath
+import logging
+from urllib.parse import quote
+import httpx
+from dotenv import load_dotenv
+from core.git_mirror import mirror_from_env, MirrorMiss
+from core.github_client import find_conflicts, resolve_blob_shas, tree_entries
+from core.metrics import GITHUB_LATENCY
+from core.github_scheduler import RequestScheduler, GitHubUnavailable, priority, SAVE
+
+load_dotenv()
+logger = logging.getLogger("CMS-GitHub")
+
+
+class GitHubAPIError(Exception):
+    """GitHub 接口返回非 2xx 时抛出；str() 形如 '409 ... does not match ...'，与 PyGithub 的错误文本保持兼容"""
+
+    def __init__(self, status: int, message: str):
+        self.status = status
+        self.message = message
+        super().__init__(f"{status} {message}")
+
+
+def _operation(method: str, url: str) -> str:
+    """把 URL 归一化为指标标签：/git/trees/<sha> -> 'GET git/trees'，/contents/<path> -> 'PUT contents'"""
+    parts = url.strip("/").split("/")
+    return f"{method} {'/'.join(parts[:2]) if parts[0] == 'git' else parts[0]}"
+
+
+class AsyncGitHubClient:
+    """
+    基于 httpx 的 asyncio 原生 GitHub 客户端：
+    - 全局共享 keep-alive 连接池 (支持 HTTP/2)
+    - 所有请求经 RequestScheduler 调度：按优先级限制并发、主/次级额度预算、抖动重试与熔断
+    """
+
+    def __init__(self, branch: str = "main"):
+        token = os.getenv("GITHUB_TOKEN")
+        repo_name = os.getenv("REPO_NAME")
+        api_url = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+        verify_ssl = os.getenv("GITHUB_VERIFY_SSL", "true").lower() == "true"
+        self.max_concurrency = int(os.getenv("GITHUB_MAX_CONCURRENCY", 10))
+        # 额度耗尽时最多等待多久，超过则直接报错而不是挂起请求
+        self.rate_limit_max_wait = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", 30))
+        # 次级限额按 token 计算，多 worker 部署时各进程平分
+        workers = max(int(os.getenv("WEB_CONCURRENCY", 1)), 1)
+        self.scheduler = RequestScheduler(
+            max_concurrency=self.max_concurrency,
+            max_wait=self.rate_limit_max_wait,
+            background_reserve=int(os.getenv("GITHUB_BACKGROUND_RESERVE", 200)),
+            secondary_points=int(os.getenv("GITHUB_SECONDARY_POINTS", 900)) // workers,
+            writes_per_minute=int(os.getenv("GITHUB_WRITES_PER_MINUTE", 80)) // workers,
+            retries=int(os.getenv("GITHUB_RETRIES", 3)),
+            breaker_threshold=int(os.getenv("GITHUB_BREAKER_THRESHOLD", 5)),
+            breaker_cooldown=float(os.getenv("GITHUB_BREAKER_COOLDOWN", 30)),
+        )
+
+        if not verify_ssl:
+            logger.warning("SSL verification is DISABLED. This is insecure but allows connection through some proxies.")
+
+        headers = {"Accept": "application/vnd.github+json"}
+        if token:
+            headers["Authorization"] = f"token {token}"
+
+        self.branch = branch
+        self.http = httpx.AsyncClient(
+            base_url=f"{api_url}/repos/{repo_name}",
+            headers=headers,
+            http2=True,
+            verify=verify_ssl,
+            timeout=30,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+        # 本进程内对同一分支的 Git Data API 提交串行执行，避免自己和自己抢 ref 导致 422
+        self._commit_locks = {}
+
+        # 读取后端：api (默认) 或 mirror (本地 git 镜像，读操作放到线程池执行)
+        self.mirror = mirror_from_env()
+
+    # --- 底层请求 ---
+
+    @property
+    def rate_remaining(self):
+        return self.scheduler.rate_remaining
+
+    @property
+    def rate_reset(self):
+        return self.scheduler.rate_reset
+
+    async def _request(self, method: str, url: str, **kwargs):
+        operation = _operation(method, url)
+
+        async def send():
+            start = time.perf_counter()
+            try:
+                response = await self.http.request(method, url, **kwargs)
+            except httpx.TransportError:
+                GITHUB_LATENCY.observe(time.perf_counter() - start, operation=operation, status="error")
+                raise
+            GITHUB_LATENCY.observe(time.perf_counter() - start, operation=operation, status=response.status_code)
+            return response
+
+        response = await self.scheduler.request(method, send)
+        if response.status_code >= 400:
+            try:
+                message = response.json().get("message", response.text)
+            except ValueError:
+                message = response.text
+            raise GitHubAPIError(response.status_code, message)
+        if response.status_code == 204 or not response.content:
+            return None
+        return response.json()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    # --- 读取 ---
+
+    async def get_latest_commit_sha(self, branch: str = None) -> str:
+        """获取指定分支的最新 Commit SHA，作为数据版本号"""
+        try:
+            data = await self._request("GET", f"/git/ref/heads/{branch or self.branch}")
+            return data["object"]["sha"]
+        except GitHubUnavailable as e:
+            # 熔断期间调用方沿用已知版本，属于预期情况
+            logger.warning(f"Skip branch sha check: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Failed to get branch sha: {e}")
+            return None
+
+    async def get_tree(self, ref: str = None) -> list:
+        """获取递归文件树 [{path, type, sha}]"""
+        if self.mirror:
+            try:
+                return await asyncio.to_thread(self._mirror_tree, ref)
+            except MirrorMiss as e:
+                logger.warning(f"{e}, reading tree from GitHub API")
+        data = await self._request("GET", f"/git/trees/{ref or self.branch}", params={"recursive": "1"})
+        if data.get("truncated"):
+            logger.warning(f"Recursive tree of {ref or self.branch} is truncated, some files are missing from the index")
+        return [{"path": f["path"], "type": f["type"], "sha": f["sha"]} for f in data["tree"]]
+
+    def _mirror_tree(self, ref: str):
+        with GITHUB_LATENCY.time(operation="mirror tree", status="ok"):
+            return self.mirror.list_tree(self.mirror.sync(ref))
+
+    async def get_file_content(self, path: str, ref: str = None):
+        """读取文件内容和 SHA"""
+        if self.mirror:
+            try:
+                return await asyncio.to_thread(self._mirror_file, path, ref)
+            except MirrorMiss as e:
+                logger.warning(f"{e}, reading {path} from GitHub API")
+        params = {"ref": ref} if ref else None
+        data = await self._request("GET", f"/contents/{quote(path)}", params=params)
+        return base64.b64decode(data["content"]).decode("utf-8"), data["sha"]
+
+    def _mirror_file(self, path: str, ref: str):
+        with GITHUB_LATENCY.time(operation="mirror contents", status="ok"):
+            blob_sha = self.mirror.resolve(self.mirror.sync(ref), path)
+            return self.mirror.read_blob(blob_sha).decode("utf-8"), blob_sha
+
+    async def get_blob(self, sha: str) -> str:
+        """按 blob SHA 读取内容 (与路径和版本无关，结果可永久缓存)"""
+        if self.mirror:
+            data = await asyncio.to_thread(self._mirror_blob, sha)
+            return data.decode("utf-8")
+        data = await self._request("GET", f"/git/blobs/{sha}")
+        return base64.b64decode(data["content"]).decode("utf-8")
+
+    def _mirror_blob(self, sha: str) -> bytes:
+        with GITHUB_LATENCY.time(operation="mirror blob", status="ok"):
+            self.mirror.ensure()
+            return self.mirror.read_blob(sha)
+
+    # --- 写入 (Contents API，返回 {"content": {...}, "commit": {...}}) ---
+
+    async def create_file(self, path: str, message: str, content: str, branch: str = None):
+        return await self.update_file(path, message, content, None, branch)
+
+    async def update_file(self, path: str, message: str, content: str, sha: str = None, branch: str = None):
+        payload = {
+            "message": message,
+            "content": base64.b64encode(content.encode("utf-8")).decode("ascii"),
+            "branch": branch or self.branch,
+        }
+        if sha:
+            payload["sha"] = sha
+        return await self._request("PUT", f"/contents/{quote(path)}", json=payload)
+
+    async def delete_file(self, path: str, message: str, sha: str, branch: str = None):
+        payload = {"message": message, "sha": sha, "branch": branch or self.branch}
+        return await self._request("DELETE", f"/contents/{quote(path)}", json=payload)
+
+    # --- 批量提交 (Git Data API：blobs -> tree -> commit -> ref) ---
+
+    async def commit_changes(self, changes: list, message: str, branch: str = None, retries: int = 2) -> dict:
+        """
+        将多个文件变更合并为一次提交，blob 并行创建，只更新一次 ref。
+        changes: [{path, content | blob_sha, sha (基准 SHA，新建为空), delete}]
+        返回 {"commit", "files": {path: 新 SHA | None}, "conflicts"}；有冲突时不提交。
+        分支在提交过程中被其他人推进 (非 fast-forward) 时重新检查冲突并重试。
+        """
+        branch = branch or self.branch
+        lock = self._commit_locks.get(branch)
+        if lock is None:
+            lock = self._commit_locks[branch] = asyncio.Lock()
+        # 提交流程中的读取 (ref/commit/tree) 与写入同属保存，优先于交互读取和后台任务
+        with priority(SAVE):
+            async with lock:
+                return await self._commit_changes(changes, message, branch, retries)
+
+    async def _commit_changes(self, changes: list, message: str, branch: str, retries: int) -> dict:
+        files = None
+        for attempt in range(retries + 1):
+            ref = await self._request("GET", f"/git/ref/heads/{branch}")
+            head_sha = ref["object"]["sha"]
+            head = await self._request("GET", f"/git/commits/{head_sha}")
+            base_tree = head["tree"]["sha"]
+            found = await self._lookup_paths(base_tree, [c["path"] for c in changes])
+            current = {path: f["sha"] for path, f in found.items()}
+            modes = {path: f["mode"] for path, f in found.items() if f.get("mode")}
+            conflicts = find_conflicts(changes, current)
+            if conflicts:
+                return {"commit": None, "files": {}, "conflicts": conflicts}
+
+            if files is None:
+                pending = [c for c in changes if not c.get("delete") and not c.get("blob_sha")]
+                blobs = await asyncio.gather(*(
+                    self._request("POST", "/git/blobs", json={"content": c["content"], "encoding": "utf-8"})
+                    for c in pending
+                ))
+                files = resolve_blob_shas(changes, {c["path"]: b["sha"] for c, b in zip(pending, blobs)})
+
+            new_tree = await self._request("POST", "/git/trees", json={
+                "base_tree": base_tree,
+                "tree": tree_entries(files, modes),
+            })
+            commit = await self._request("POST", "/git/commits", json={
+                "message": message,
+                "tree": new_tree["sha"],
+                "parents": [head_sha],
+            })
+            try:
+                await self._request("PATCH", f"/git/refs/heads/{branch}", json={"sha": commit["sha"], "force": False})
+            except GitHubAPIError as e:
+                if e.status == 422 and attempt < retries:
+                    logger.warning(f"Branch {branch} moved during batch commit, retrying ({attempt + 1}/{retries})")
+                    continue
+                raise
+            return {"commit": commit, "files": files, "conflicts": []}
+
+    async def _lookup_paths(self, base_tree: str, paths: list) -> dict:
+        """
+        只解析变更路径：从根目录逐级读取非递归树 (同一层的目录并行读取)，不拉取整棵递归树，
+        也不会因为递归树过大被截断 (truncated) 而漏掉文件。
+        返回 {path: {sha, mode}}，不存在的路径不在结果中
+        """
+        def depth(directory):
+            return directory.count("/") + 1 if directory else 0
+
+        needed = set()
+        for path in paths:
+            directory = posixpath.dirname(path)
+            while directory not in needed:
+                needed.add(directory)
+                if not directory:
+                    break
+                directory = posixpath.dirname(directory)
+
+        trees = {"": base_tree}  # 目录 -> tree SHA (不存在的目录不在其中)
+        listings = {}            # 目录 -> {名称: 条目}
+        for level in range(max(depth(d) for d in needed) + 1):
+            directories = [d for d in needed if depth(d) == level and d in trees]
+            results = await asyncio.gather(*(self._request("GET", f"/git/trees/{trees[d]}") for d in directories))
+            for directory, data in zip(directories, results):
+                if data.get("truncated"):
+                    raise GitHubAPIError(500, f"Tree of {directory or '/'} is truncated, cannot check base SHAs")
+                listings[directory] = {f["path"]: f for f in data["tree"]}
+                for name, entry in listings[directory].items():
+                    child = posixpath.join(directory, name)
+                    if entry["type"] == "tree" and child in needed:
+                        trees[child] = entry["sha"]
+
+        found = {}
+        for path in paths:
+            directory, name = posixpath.split(path)
+            entry = listings.get(directory, {}).get(name)
+            if entry and entry["type"] == "blob":
+                found[path] = entry
+        return found
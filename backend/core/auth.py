@@ -1,6 +1,10 @@
 import os
 import json
+import time
+import asyncio
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import HTTPException, status, Depends
@@ -8,11 +12,14 @@ from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from pydantic import BaseModel
+from core.coordination import file_lock
 
 # 配置
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-it")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 12 * 60  # 12 hours
+# 已验证 token 的缓存条数上限 (单用户系统，正常只有少量有效 token)
+TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 1024))
 
 # 核心修复：使用绝对路径，避免不同启动方式（docker vs local）导致的路径不一致
 # core/auth.py -> core/ -> backend/
@@ -24,6 +31,12 @@ AUTH_FILE = os.path.join(BASE_DIR, "auth_data.json")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 logger = logging.getLogger("CMS-Auth")
+# bcrypt 是刻意设计的慢计算，放到独立的小线程池执行：不阻塞事件循环，也不占满默认线程池
+_bcrypt_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bcrypt")
+# 存储的密码哈希，按文件 mtime 失效
+_hash_cache = {"mtime": None, "hash": None}
+# token -> exp 时间戳，过期后自然失效
+_token_cache = OrderedDict()
 
 # 模型
 class Token(BaseModel):
@@ -50,7 +63,25 @@ def verify_password(plain_password, hashed_password):
         logger.error(f"Password verification failed: {e}")
         return False
 
+def _auth_lock_path():
+    return f"{AUTH_FILE}.lock"
+
+def _write_auth_file(hashed_password):
+    """
+    调用方需持有文件锁。Docker 以单文件方式挂载 auth_data.json，不能用 rename 替换，
+    只能原地覆盖写；读取方同样持锁，不会读到写了一半的内容。
+    """
+    with open(AUTH_FILE, "w") as f:
+        json.dump({"hashed_password": hashed_password}, f)
+        f.flush()
+        os.fsync(f.fileno())
+
 def init_auth_file():
+    # 多个 worker 同时启动时只有第一个会生成文件，其余在锁释放后看到已存在的文件
+    with file_lock(_auth_lock_path()):
+        _init_auth_file()
+
+def _init_auth_file():
     # 优先从 ADMIN_PASSWORD 获取
     env_password = os.getenv("ADMIN_PASSWORD")
     # 如果没有 ADMIN_PASSWORD，尝试使用 SECRET_KEY，如果都没有，使用默认值 'admin123'
@@ -70,9 +101,7 @@ def init_auth_file():
 
     # 如果 auth.json 不存在，直接创建
     if not os.path.exists(AUTH_FILE):
-        default_hash = get_password_hash(env_password)
-        with open(AUTH_FILE, "w") as f:
-            json.dump({"hashed_password": default_hash}, f)
+        _write_auth_file(get_password_hash(env_password))
         logger.info(f"Initialized auth.json with password from {'ADMIN_PASSWORD' if env_password else 'SECRET_KEY'}.")
     else:
         # 1. 读取现有文件内容
@@ -86,32 +115,60 @@ def init_auth_file():
 
             # 3. 只有当明确设置 FORCE_RESET_PASSWORD=true 时才覆盖
             if os.getenv("FORCE_RESET_PASSWORD", "false").lower() == "true":
-                 default_hash = get_password_hash(env_password)
-                 with open(AUTH_FILE, "w") as f:
-                    json.dump({"hashed_password": default_hash}, f)
+                 _write_auth_file(get_password_hash(env_password))
                  logger.info("Forced reset password from env.")
                  
         except Exception as e:
             logger.warning(f"Auth file corrupted or invalid ({e}), resetting to default.")
-            default_hash = get_password_hash(env_password)
-            with open(AUTH_FILE, "w") as f:
-                json.dump({"hashed_password": default_hash}, f)
+            _write_auth_file(get_password_hash(env_password))
+
+async def verify_password_async(plain_password, hashed_password):
+    """在 bcrypt 线程池中校验密码"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_executor, verify_password, plain_password, hashed_password)
 
 def get_stored_hash():
-    if not os.path.exists(AUTH_FILE):
+    """读取存储的密码哈希；文件 mtime 未变化时直接返回内存中的值"""
+    try:
+        mtime = os.stat(AUTH_FILE).st_mtime_ns
+    except OSError:
         init_auth_file()
+        try:
+            mtime = os.stat(AUTH_FILE).st_mtime_ns
+        except OSError as e:
+            logger.error(f"Failed to read auth file: {e}")
+            return None
+    if _hash_cache["mtime"] == mtime and _hash_cache["hash"]:
+        return _hash_cache["hash"]
     try:
-        with open(AUTH_FILE, "r") as f:
+        with file_lock(_auth_lock_path()), open(AUTH_FILE, "r") as f:
             data = json.load(f)
-            return data.get("hashed_password")
     except Exception as e:
         logger.error(f"Failed to read auth file: {e}")
         return None
+    _hash_cache.update(mtime=mtime, hash=data.get("hashed_password"))
+    return _hash_cache["hash"]
+
+async def get_stored_hash_async():
+    """在 bcrypt 线程池中读取密码哈希：文件缺失时会初始化 (bcrypt + 文件锁)，不能在事件循环中执行"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_executor, get_stored_hash)
 
 def update_password(new_password):
     new_hash = get_password_hash(new_password)
-    with open(AUTH_FILE, "w") as f:
-        json.dump({"hashed_password": new_hash}, f)
+    with file_lock(_auth_lock_path()):
+        _write_auth_file(new_hash)
+        # 主动更新内存中的哈希，不依赖 mtime 精度
+        _hash_cache.update(mtime=os.stat(AUTH_FILE).st_mtime_ns, hash=new_hash)
+
+def forget_stored_hash():
+    """其他 worker 修改了密码：丢弃内存中的哈希，下次校验重新读取文件"""
+    _hash_cache.update(mtime=None, hash=None)
+
+async def update_password_async(new_password):
+    """在 bcrypt 线程池中生成新哈希并写入"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_bcrypt_executor, update_password, new_password)
 
 # Token 管理
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -131,9 +188,21 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # 验证过的 token 在过期前直接放行，跳过签名校验
+    now = time.time()
+    expires = _token_cache.get(token)
+    if expires is not None:
+        if expires > now:
+            _token_cache.move_to_end(token)
+            return True
+        del _token_cache[token]
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        # 这里我们就简单验证 token 有效性，因为是单用户系统
-        return True
     except JWTError:
         raise credentials_exception
+    # 这里我们就简单验证 token 有效性，因为是单用户系统
+    if payload.get("exp"):
+        _token_cache[token] = float(payload["exp"])
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return True
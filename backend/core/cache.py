@@ -0,0 +1,269 @@
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from core import redis_io
+from core.metrics import REDIS_LATENCY
+
+logger = logging.getLogger("CMS-Cache")
+
+
+class TwoTierCache:
+    """
+    两级缓存：进程内 LRU (保存已解码对象) + Redis (保存 JSON)。
+    - 所有 key 带代数前缀 {namespace}:{generation}:{name}，整体失效只需 INCR 代数，
+      从不扫描 keyspace；旧代数据随 TTL 自然过期
+    - get_or_fill 对同一个 key 做 single-flight，缺失时只有一个请求回源，其余等待
+    - stale_ttl 内的过期数据会先返回旧值，同时在后台刷新 (stale-while-revalidate)
+    Redis 读写都在 redis_io 线程中执行：get_or_fill 等待读取结果，set / delete 排队写入后立即返回。
+    注意：本地层返回的是共享对象，调用方不要原地修改。
+    """
+
+    def __init__(self, redis_client=None, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024,
+                 namespace: str = "cms", generation_refresh: float = 1.0):
+        self.redis = redis_client
+        self.namespace = namespace
+        self.generation_key = f"{namespace}:generation"
+        # 代数在本地缓存 generation_refresh 秒，其他 worker 的失效最多延迟这么久可见
+        self.generation_refresh = generation_refresh
+        self._generation = 0
+        self._generation_checked = 0.0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = OrderedDict()  # key -> (value, size, fresh_until, stale_until)
+        self._bytes = 0
+        self._inflight = {}
+        self.counters = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "fills": 0,
+            "fill_errors": 0,
+            "fill_seconds": 0.0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    # --- 代数 (整体失效) ---
+
+    def generation(self) -> int:
+        """当前代数 (不访问 Redis，由 get_or_fill 每 generation_refresh 秒刷新一次)"""
+        return self._generation
+
+    async def _refresh_generation(self):
+        now = time.time()
+        if not self.redis or now - self._generation_checked < self.generation_refresh:
+            return
+        self._generation_checked = now
+        generation = await redis_io.run(self._read_generation)
+        if generation is not None:
+            self._generation = generation
+
+    def _read_generation(self):
+        try:
+            with REDIS_LATENCY.time(component="cache", op="get_generation"):
+                return int(self.redis.get(self.generation_key) or 0)
+        except Exception as e:
+            logger.error(f"Redis get generation failed: {e}")
+            return None
+
+    def _key(self, name: str) -> str:
+        return f"{self.namespace}:{self.generation()}:{name}"
+
+    async def invalidate_all(self):
+        """O(1) 整体失效：推进代数，旧 key 不再被读取，等待 TTL 过期"""
+        self.counters["invalidations"] += 1
+        self._local.clear()
+        self._bytes = 0
+        if self.redis:
+            try:
+                self._generation = int(await redis_io.run(self.redis.incr, self.generation_key))
+                self._generation_checked = time.time()
+                return
+            except Exception as e:
+                logger.error(f"Redis incr generation failed: {e}")
+        self._generation += 1
+
+    def reset_local(self):
+        """其他 worker 推进了代数：清空本地层，下次读取时立即重新读取代数"""
+        self._local.clear()
+        self._bytes = 0
+        self._generation_checked = 0.0
+
+    # --- 本地 LRU ---
+
+    def _local_get(self, key: str):
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if entry[3] <= time.time():
+            self._local_drop(key)
+            return None
+        self._local.move_to_end(key)
+        return entry
+
+    def _local_put(self, key: str, value, size: int, fresh_until: float, stale_until: float):
+        self._local_drop(key)
+        if size > self.max_bytes:
+            return
+        self._local[key] = (value, size, fresh_until, stale_until)
+        self._bytes += size
+        while len(self._local) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, old_size, _, _) = self._local.popitem(last=False)
+            self._bytes -= old_size
+            self.counters["evictions"] += 1
+
+    def _local_drop(self, key: str):
+        entry = self._local.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    # --- Redis ---
+
+    def _redis_get(self, key: str):
+        if not self.redis:
+            return None
+        try:
+            with REDIS_LATENCY.time(component="cache", op="get"):
+                raw = self.redis.get(key)
+        except Exception as e:
+            logger.error(f"Redis get failed: {e}")
+            return None
+        if not raw:
+            return None
+        try:
+            envelope = json.loads(raw)
+            return envelope["v"], len(raw), envelope["f"], envelope["s"]
+        except (ValueError, KeyError, TypeError):
+            # 旧格式或损坏的数据，当作未命中
+            return None
+
+    def _redis_set(self, key: str, raw: str, ex: int):
+        try:
+            with REDIS_LATENCY.time(component="cache", op="set"):
+                self.redis.set(key, raw, ex=ex)
+        except Exception as e:
+            logger.error(f"Redis set failed: {e}")
+
+    def _redis_delete(self, keys: list):
+        try:
+            with REDIS_LATENCY.time(component="cache", op="delete"):
+                self.redis.delete(*keys)
+        except Exception as e:
+            logger.error(f"Redis delete failed: {e}")
+
+    # --- 对外接口 ---
+
+    async def lookup(self, name: str):
+        """返回 (value, fresh)；未命中返回 (None, False)"""
+        await self._refresh_generation()
+        key = self._key(name)
+        entry = self._local_get(key)
+        if entry is not None:
+            self.counters["local_hits"] += 1
+            return entry[0], entry[2] > time.time()
+        entry = await redis_io.run(self._redis_get, key) if self.redis else None
+        if entry is not None and entry[3] > time.time():
+            self.counters["redis_hits"] += 1
+            self._local_put(key, *entry)
+            return entry[0], entry[2] > time.time()
+        return None, False
+
+    def peek(self, name: str):
+        """只查进程内 LRU 的新鲜数据，不访问 Redis (用于 304 等廉价判断)"""
+        entry = self._local.get(self._key(name))
+        if entry is None or entry[2] <= time.time():
+            return None
+        return entry[0]
+
+    async def get(self, name: str):
+        value, fresh = await self.lookup(name)
+        return value if fresh else None
+
+    def set(self, name: str, value, ttl: int, stale_ttl: int = 0):
+        self._store(self._key(name), value, ttl, stale_ttl)
+
+    def _store(self, key: str, value, ttl: int, stale_ttl: int):
+        now = time.time()
+        fresh_until, stale_until = now + ttl, now + ttl + stale_ttl
+        raw = json.dumps({"v": value, "f": fresh_until, "s": stale_until})
+        self._local_put(key, value, len(raw), fresh_until, stale_until)
+        if self.redis:
+            redis_io.submit(self._redis_set, key, raw, ttl + stale_ttl)
+
+    def delete(self, *names: str):
+        """按精确 key 删除 (DEL)，不使用 KEYS 模式匹配"""
+        keys = [self._key(name) for name in names]
+        for key in keys:
+            self._local_drop(key)
+        if self.redis and keys:
+            redis_io.submit(self._redis_delete, keys)
+
+    def forget_local(self, *names: str):
+        """只丢弃本地层的条目 (其他 worker 已经更新了 Redis 中的值)"""
+        for name in names:
+            self._local_drop(self._key(name))
+
+    async def get_or_fill(self, name: str, loader, ttl: int, stale_ttl: int = 0, force: bool = False):
+        """
+        读取缓存，缺失时调用 loader() (协程) 回源并写入。返回 (value, "HIT" | "STALE" | "MISS")。
+        loader 返回 None 时不写缓存。
+        """
+        await self._refresh_generation()
+        key = self._key(name)
+        if not force:
+            value, fresh = await self.lookup(name)
+            if value is not None and fresh:
+                return value, "HIT"
+            if value is not None:
+                self.counters["stale_hits"] += 1
+                if key not in self._inflight:
+                    self._start_fill(key, loader, ttl, stale_ttl)
+                return value, "STALE"
+        self.counters["misses"] += 1
+        if key not in self._inflight:
+            self._start_fill(key, loader, ttl, stale_ttl)
+        return await asyncio.shield(self._inflight[key]), "MISS"
+
+    def _start_fill(self, key: str, loader, ttl: int, stale_ttl: int):
+        # 回源结果写回发起时所在代数的 key，期间发生整体失效则自然作废
+        task = asyncio.ensure_future(self._fill(key, loader, ttl, stale_ttl))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._on_fill_done(key, t))
+
+    def _on_fill_done(self, key: str, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 后台刷新失败时没有人 await，这里取走异常避免 "never retrieved" 警告
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Cache fill failed for {key}: {task.exception()}")
+
+    async def _fill(self, key: str, loader, ttl: int, stale_ttl: int):
+        start = time.perf_counter()
+        try:
+            value = await loader()
+        except Exception:
+            self.counters["fill_errors"] += 1
+            raise
+        finally:
+            self.counters["fill_seconds"] += time.perf_counter() - start
+        self.counters["fills"] += 1
+        if value is not None:
+            self._store(key, value, ttl, stale_ttl)
+        return value
+
+    def stats(self) -> dict:
+        c = self.counters
+        hits = c["local_hits"] + c["redis_hits"]
+        total = hits + c["misses"]
+        return {
+            **c,
+            "fill_seconds": round(c["fill_seconds"], 4),
+            "hit_ratio": round(hits / total, 4) if total else None,
+            "avg_fill_ms": round(c["fill_seconds"] / c["fills"] * 1000, 2) if c["fills"] else None,
+            "local_entries": len(self._local),
+            "local_bytes": self._bytes,
+            "generation": self._generation,
+        }
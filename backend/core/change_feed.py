@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from collections import deque
+from core.response import dumps
+
+logger = logging.getLogger("CMS-Events")
+
+# 客户端断线后的重连间隔 (毫秒)，以及心跳注释行
+RETRY_FRAME = b"retry: 3000\n\n"
+PING_FRAME = b": ping\n\n"
+
+
+def describe_changes(previous: dict, files: dict) -> list:
+    """
+    把一次提交的文件变更 {path: 新 SHA | None 表示删除} 转为结构化变更，previous 为提交前的 {path: SHA}：
+    [{"path", "action": create | update | delete | rename, "sha", "from" (仅 rename)}]
+    同一次提交中删除的文件与新建的文件 SHA 相同时合并为一条 rename。
+    """
+    deleted = {previous[path]: path for path, sha in files.items() if sha is None and path in previous}
+    changes, renamed = [], set()
+    for path, sha in files.items():
+        if sha is None:
+            continue
+        if path in previous:
+            if previous[path] != sha:
+                changes.append({"path": path, "action": "update", "sha": sha})
+            continue
+        source = deleted.pop(sha, None)
+        if source:
+            renamed.add(source)
+            changes.append({"path": path, "action": "rename", "sha": sha, "from": source})
+        else:
+            changes.append({"path": path, "action": "create", "sha": sha})
+    for path, sha in files.items():
+        if sha is None and path not in renamed:
+            changes.append({"path": path, "action": "delete", "sha": None})
+    return changes
+
+
+class ChangeFeed:
+    """
+    浏览器端的变更推送 (Server-Sent Events)：
+    - 每条事件 {"id", "type", "commit", "changes", "pending"} 只编码一次，同一个 bytes 放入所有订阅者的队列
+    - 最近 backlog 条事件保存在环形缓冲中，客户端重连时按 Last-Event-ID 补发；
+      多 worker 时 id 由 Redis INCR 全局分配，事件经 EventBus 转发到所有进程，任一 worker 都能补发
+    - 订阅者是有界队列：消费太慢 (队列满) 或要补发的事件已不在缓冲中时改为推送 resync，客户端重新拉取列表
+    - 空闲连接只是一个等待队列的协程；由单个心跳任务定期向空队列放入注释行，防止代理按空闲超时断开
+    """
+
+    def __init__(self, redis_client=None, key: str = "cms:feed:seq", backlog: int = 1000,
+                 queue_size: int = 256, heartbeat: float = 25, max_connections: int = 5000):
+        self.redis = redis_client
+        self.key = key
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.max_connections = max_connections
+        self._recent = deque(maxlen=backlog)  # (id, commit, frame)
+        self._subscribers = set()
+        self._last_id = 0
+        # 心跳任务需在事件循环内创建
+        self._task = None
+        self.counters = {"published": 0, "delivered": 0, "overflows": 0, "replayed": 0, "resyncs": 0, "connections_total": 0}
+
+    # --- 发布 ---
+
+    def next_id(self) -> int:
+        if self.redis:
+            try:
+                return int(self.redis.incr(self.key))
+            except Exception as e:
+                logger.error(f"Allocate feed id failed: {e}")
+        return self._last_id + 1
+
+    def announced(self, commit: str) -> bool:
+        """该 commit 的变更是否已经推送过 (多个 worker 各自发现同一个上游提交时去重)"""
+        return any(c == commit for _, c, _ in self._recent)
+
+    def event(self, changes: list = None, commit: str = None, pending: bool = False, kind: str = "change") -> dict:
+        self.counters["published"] += 1
+        return {"id": self.next_id(), "type": kind, "commit": commit, "changes": changes or [], "pending": pending}
+
+    def deliver(self, event: dict):
+        """推送给本进程的订阅者；本地发布和其他 worker 转发的事件都经过这里"""
+        frame = b"id: %d\nevent: %s\ndata: %s\n\n" % (event["id"], event["type"].encode(), dumps(event))
+        self._last_id = max(self._last_id, event["id"])
+        self._recent.append((event["id"], event.get("commit"), frame))
+        for queue in list(self._subscribers):
+            self._put(queue, frame)
+
+    def _put(self, queue: asyncio.Queue, frame: bytes):
+        try:
+            queue.put_nowait(frame)
+            self.counters["delivered"] += 1
+        except asyncio.QueueFull:
+            # 客户端消费不过来：丢弃积压，让它整体重新同步
+            self.counters["overflows"] += 1
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(self._resync_frame())
+
+    def _resync_frame(self) -> bytes:
+        self.counters["resyncs"] += 1
+        return b"id: %d\nevent: resync\ndata: {}\n\n" % self._last_id
+
+    def resync(self):
+        """本进程可能错过了事件 (如 Redis 订阅断开)：通知本进程的订阅者重新拉取"""
+        frame = self._resync_frame()
+        for queue in list(self._subscribers):
+            self._put(queue, frame)
+
+    # --- 订阅 ---
+
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_connections
+
+    def subscribe(self, last_id: int = None) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if last_id is not None and last_id != self._last_id:
+            missed = [frame for event_id, _, frame in self._recent if event_id > last_id]
+            oldest = self._recent[0][0] if self._recent else None
+            if last_id > self._last_id or oldest is None or oldest > last_id + 1 or len(missed) >= self.queue_size:
+                # 缓冲中没有断线期间的全部事件 (或 id 来自重启前的进程)
+                queue.put_nowait(self._resync_frame())
+            else:
+                for frame in missed:
+                    queue.put_nowait(frame)
+                self.counters["replayed"] += len(missed)
+        self._subscribers.add(queue)
+        self.counters["connections_total"] += 1
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._heartbeat())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    async def stream(self, last_id: int = None):
+        """SSE 响应体；客户端断开时 StreamingResponse 取消生成器，在 finally 中退订"""
+        queue = self.subscribe(last_id)
+        try:
+            yield RETRY_FRAME
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(queue)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            for queue in list(self._subscribers):
+                if queue.empty():
+                    queue.put_nowait(PING_FRAME)
+
+    async def stop(self):
+        """结束所有事件流 (客户端会自动重连到其他 worker)"""
+        for queue in list(self._subscribers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {**self.counters, "connections": len(self._subscribers), "last_id": self._last_id, "buffered": len(self._recent)}
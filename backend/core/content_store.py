@@ -0,0 +1,219 @@
+import time
+import zlib
+import asyncio
+import logging
+from collections import OrderedDict
+from core import redis_io
+from core.metrics import REDIS_LATENCY
+
+logger = logging.getLogger("CMS-Content")
+
+try:
+    import zstandard
+except ImportError:  # zstd 为可选依赖，缺失时使用 zlib
+    zstandard = None
+
+# 存储格式：首字节标记编码方式
+RAW, ZLIB, ZSTD = b"r", b"z", b"s"
+
+
+class ContentStore:
+    """
+    以 git blob SHA 为 key 的内容存储。blob 内容不可变，条目永不过期；
+    路径通过文章索引解析为 SHA，重命名、回滚、相同内容的文件都复用同一份数据。
+    - 进程内 LRU (已解码文本) + Redis (压缩后的二进制，需 decode_responses=False 的连接)
+    - 超过 compress_min 字节的正文用 zstd (可用时) 或 zlib 压缩
+    - Redis 中按字节预算淘汰最久未访问的 blob (有序集合记录访问时间)
+    - Redis 读写在 redis_io 线程中执行：get 等待读取结果，put 排队写入 (本地层立即可见)
+    """
+
+    def __init__(self, redis_client=None, prefix: str = "cms:blob",
+                 max_bytes: int = 256 * 1024 * 1024, local_max_bytes: int = 32 * 1024 * 1024,
+                 compression: str = None, compress_min: int = 512):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.key_lru = f"{prefix}:lru"
+        self.key_sizes = f"{prefix}:sizes"
+        self.key_bytes = f"{prefix}:bytes"
+        self.max_bytes = max_bytes
+        self.local_max_bytes = local_max_bytes
+        self.compress_min = compress_min
+        compression = (compression or ("zstd" if zstandard else "zlib")).lower()
+        if compression == "zstd" and not zstandard:
+            logger.warning("zstandard 未安装，改用 zlib 压缩")
+            compression = "zlib"
+        self.compression = compression
+        self._zstd_c = zstandard.ZstdCompressor(level=6) if compression == "zstd" else None
+        self._zstd_d = zstandard.ZstdDecompressor() if zstandard else None
+        self._local = OrderedDict()  # sha -> (text, size)
+        self._local_bytes = 0
+        self._inflight = {}
+        self.counters = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "stored": 0,
+            "raw_bytes": 0,
+            "stored_bytes": 0,
+            "evictions": 0,
+        }
+
+    def _key(self, sha: str) -> str:
+        return f"{self.prefix}:{sha}"
+
+    # --- 编解码 ---
+
+    def encode(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        if len(data) < self.compress_min or self.compression == "none":
+            return RAW + data
+        if self._zstd_c:
+            return ZSTD + self._zstd_c.compress(data)
+        return ZLIB + zlib.compress(data, 6)
+
+    def decode(self, raw: bytes) -> str:
+        tag, body = raw[:1], raw[1:]
+        if tag == ZLIB:
+            body = zlib.decompress(body)
+        elif tag == ZSTD:
+            if not self._zstd_d:
+                raise ValueError("blob 以 zstd 压缩，但未安装 zstandard")
+            body = self._zstd_d.decompress(body)
+        return body.decode("utf-8")
+
+    # --- 本地 LRU ---
+
+    def _local_put(self, sha: str, text: str):
+        if sha in self._local:
+            self._local.move_to_end(sha)
+            return
+        size = len(text.encode("utf-8"))
+        if size > self.local_max_bytes:
+            return
+        self._local[sha] = (text, size)
+        self._local_bytes += size
+        while self._local_bytes > self.local_max_bytes:
+            _, (_, old_size) = self._local.popitem(last=False)
+            self._local_bytes -= old_size
+
+    # --- 读写 ---
+
+    async def get(self, sha: str):
+        entry = self._local.get(sha)
+        if entry is not None:
+            self._local.move_to_end(sha)
+            self.counters["local_hits"] += 1
+            return entry[0]
+        if not self.redis:
+            return None
+        raw = await redis_io.run(self._redis_get, sha)
+        if raw is None:
+            return None
+        text = self.decode(raw)
+        self.counters["redis_hits"] += 1
+        self._local_put(sha, text)
+        return text
+
+    def _redis_get(self, sha: str):
+        try:
+            with REDIS_LATENCY.time(component="content", op="get"):
+                raw = self.redis.get(self._key(sha))
+                if raw is None:
+                    return None
+                self.redis.zadd(self.key_lru, {sha: time.time()})
+        except Exception as e:
+            logger.error(f"Redis get blob failed: {e}")
+            return None
+        return raw
+
+    def put(self, sha: str, text: str):
+        self._local_put(sha, text)
+        if self.redis:
+            redis_io.submit(self._redis_put, sha, text)
+
+    def _redis_put(self, sha: str, text: str):
+        try:
+            if self.redis.hexists(self.key_sizes, sha):
+                self.redis.zadd(self.key_lru, {sha: time.time()})
+                return
+            raw = self.encode(text)
+            with REDIS_LATENCY.time(component="content", op="put"):
+                pipe = self.redis.pipeline()
+                pipe.set(self._key(sha), raw)
+                pipe.hset(self.key_sizes, sha, len(raw))
+                pipe.zadd(self.key_lru, {sha: time.time()})
+                pipe.incrby(self.key_bytes, len(raw))
+                total = pipe.execute()[-1]
+        except Exception as e:
+            logger.error(f"Redis put blob failed: {e}")
+            return
+        self.counters["stored"] += 1
+        self.counters["raw_bytes"] += len(text.encode("utf-8"))
+        self.counters["stored_bytes"] += len(raw)
+        if total > self.max_bytes:
+            self._evict(total)
+
+    def _evict(self, total: int):
+        """按访问时间从旧到新淘汰，直到总字节数回到预算以内"""
+        try:
+            while total > self.max_bytes:
+                candidates = [v.decode() if isinstance(v, bytes) else v for v in self.redis.zrange(self.key_lru, 0, 31)]
+                if not candidates:
+                    break
+                victims, freed = [], 0
+                for sha, size in zip(candidates, self.redis.hmget(self.key_sizes, candidates)):
+                    victims.append(sha)
+                    freed += int(size or 0)
+                    if total - freed <= self.max_bytes:
+                        break
+                pipe = self.redis.pipeline()
+                pipe.delete(*[self._key(sha) for sha in victims])
+                pipe.hdel(self.key_sizes, *victims)
+                pipe.zrem(self.key_lru, *victims)
+                pipe.decrby(self.key_bytes, freed)
+                total = pipe.execute()[-1]
+                self.counters["evictions"] += len(victims)
+        except Exception as e:
+            logger.error(f"Redis evict blobs failed: {e}")
+
+    async def get_or_fetch(self, sha: str, loader):
+        """读取 blob，缺失时调用 loader() (协程，返回文本) 并写入；同一 SHA 并发只回源一次。返回 (text, "HIT" | "MISS")"""
+        text = await self.get(sha)
+        if text is not None:
+            return text, "HIT"
+        self.counters["misses"] += 1
+        task = self._inflight.get(sha)
+        if task is None:
+            task = self._inflight[sha] = asyncio.ensure_future(self._fetch(sha, loader))
+            task.add_done_callback(lambda t: self._on_fetch_done(sha, t))
+        return await asyncio.shield(task), "MISS"
+
+    def _on_fetch_done(self, sha: str, task):
+        if self._inflight.get(sha) is task:
+            del self._inflight[sha]
+        # 等待方被取消时没有人取走异常，这里取走避免 "never retrieved" 警告
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Fetch blob {sha} failed: {task.exception()}")
+
+    async def _fetch(self, sha: str, loader):
+        text = await loader()
+        self.put(sha, text)
+        return text
+
+    def stats(self) -> dict:
+        c = self.counters
+        stats = {
+            **c,
+            "compression": self.compression,
+            "compression_ratio": round(c["stored_bytes"] / c["raw_bytes"], 3) if c["raw_bytes"] else None,
+            "local_entries": len(self._local),
+            "local_bytes": self._local_bytes,
+            "budget_bytes": self.max_bytes,
+        }
+        if self.redis:
+            try:
+                stats["redis_bytes"] = int(self.redis.get(self.key_bytes) or 0)
+                stats["redis_entries"] = self.redis.zcard(self.key_lru)
+            except Exception as e:
+                logger.error(f"Redis blob stats failed: {e}")
+        return stats
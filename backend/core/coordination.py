@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from core import redis_io
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 本地开发：没有 flock，文件锁只在进程内互斥，所有进程都视为 leader
+    fcntl = None
+
+logger = logging.getLogger("CMS-Coordination")
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    跨进程互斥锁：对锁文件 path 加 flock (LOCK_EX)，同一进程内的线程再用 threading.Lock 串行。
+    被保护的文件通过 os.replace 原子替换时 inode 会变化，所以锁要加在单独的锁文件上。
+    """
+    with _thread_locks_guard:
+        local = _thread_locks.setdefault(path, threading.Lock())
+    with local:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # 关闭文件描述符即释放 flock
+            os.close(fd)
+
+
+class LeaderElection:
+    """
+    多 worker 部署时只让一个进程运行后台任务 (写后提交、预取轮询、快照导出)：
+    非阻塞地 flock 锁文件，拿到锁的进程成为 leader 并一直持有到退出 (进程崩溃时内核自动释放)；
+    其余进程每 interval 秒重试一次，leader 退出后由其中一个接替。
+    path 为空 (单 worker) 时不加锁，当前进程直接成为 leader。
+    """
+
+    def __init__(self, path: str = None, interval: float = 5):
+        self.path = path
+        self.interval = interval
+        self.is_leader = False
+        self._fd = None
+        self._task = None
+
+    def try_acquire(self) -> bool:
+        if self.is_leader:
+            return True
+        if not self.path:
+            self.is_leader = True
+            return True
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            # 锁文件内容只用于排查：当前 leader 的 pid
+            os.ftruncate(fd, 0)
+            os.write(fd, f"{os.getpid()}\n".encode())
+            self._fd = fd
+        self.is_leader = True
+        logger.info(f"Worker {os.getpid()} elected leader")
+        return True
+
+    def start(self, on_elected):
+        """立即尝试一次；未当选时在后台重试，当选后在事件循环内调用 on_elected()"""
+        if self.try_acquire():
+            on_elected()
+            return
+        logger.info(f"Worker {os.getpid()} running as follower")
+        self._task = asyncio.ensure_future(self._campaign(on_elected))
+
+    async def _campaign(self, on_elected):
+        while not self.try_acquire():
+            await asyncio.sleep(self.interval)
+        on_elected()
+
+    async def stop(self):
+        """取消重试并释放锁，滚动重启时其他 worker 可以立即接替"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self.is_leader = False
+
+
+class EventBus:
+    """
+    基于 Redis pub/sub 的进程间通知，用于保持各 worker 内存缓存一致：
+    - 每条消息为 {"type", "origin", ...}，进程忽略自己发出的消息
+    - 订阅在后台线程中阻塞读取，回调切回事件循环执行，不与请求并发修改内存结构
+    - 消息是尽力而为的：订阅断开重连后本地派发一次 "resync"，由订阅方丢弃可能过期的本地状态
+    未启动 (单 worker 或没有 Redis) 时 publish 为空操作。
+    """
+
+    def __init__(self, redis_client=None, channel: str = "cms:events"):
+        self.redis = redis_client
+        self.channel = channel
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers = {}
+        self._loop = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self.counters = {"published": 0, "received": 0, "reconnects": 0, "errors": 0}
+
+    def on(self, kind: str, handler):
+        self._handlers.setdefault(kind, []).append(handler)
+
+    # --- 生命周期 ---
+
+    def start(self):
+        if not self.redis or self._thread:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._listen, name="cms-events", daemon=True)
+        self._thread.start()
+        logger.info(f"Event bus subscribed to {self.channel} ({self.origin})")
+
+    async def stop(self):
+        if not self._thread:
+            return
+        self._stopped.set()
+        await asyncio.to_thread(self._thread.join, 5)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    # --- 发布 ---
+
+    def publish(self, kind: str, **data):
+        """排在此前的 Redis 写入之后发出 (redis_io 线程)，其他 worker 收到通知时能读到对应的数据"""
+        if not self._thread:
+            return
+        redis_io.submit(self._publish, kind, json.dumps({"type": kind, "origin": self.origin, **data}))
+
+    def _publish(self, kind: str, message: str):
+        try:
+            self.redis.publish(self.channel, message)
+            self.counters["published"] += 1
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.error(f"Publish {kind} event failed: {e}")
+
+    # --- 订阅 ---
+
+    def _listen(self):
+        pubsub, failed = None, False
+        while not self._stopped.is_set():
+            try:
+                if pubsub is None:
+                    pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.channel)
+                    if failed:
+                        # 断开期间可能错过了通知
+                        self.counters["reconnects"] += 1
+                        self._loop.call_soon_threadsafe(self._dispatch, {"type": "resync"})
+                        failed = False
+                message = pubsub.get_message(timeout=1.0)
+            except Exception as e:
+                if not failed:
+                    logger.warning(f"Event subscription lost, reconnecting: {e}")
+                self.counters["errors"] += 1
+                failed = True
+                self._close(pubsub)
+                pubsub = None
+                time.sleep(1)
+                continue
+            if message and message.get("type") == "message":
+                self._receive(message["data"])
+        self._close(pubsub)
+
+    @staticmethod
+    def _close(pubsub):
+        if pubsub is None:
+            return
+        try:
+            pubsub.close()
+        except Exception:
+            pass
+
+    def _receive(self, raw):
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            return
+        if event.get("origin") == self.origin:
+            return
+        self.counters["received"] += 1
+        self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: dict):
+        for handler in self._handlers.get(event.get("type"), ()):
+            try:
+                handler(event)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"Handling {event.get('type')} event failed: {e}", exc_info=True)
+
+    def stats(self) -> dict:
+        return {**self.counters, "running": self.running, "origin": self.origin}
@@ -0,0 +1,24 @@
+class PatchError(ValueError):
+    """补丁与基准内容不匹配 (越界、区间重叠或切开了代理对)"""
+
+
+def apply_patch(base: str, ops: list) -> str:
+    """
+    ops: [(at, delete, insert)]，在基准内容的 at 处删除 delete 个字符并插入 insert。
+    偏移按 UTF-16 码元计算 (与浏览器端字符串下标一致)，都相对于基准内容，需按 at 升序且互不重叠。
+    在 UTF-16 编码上拼接，整篇文章只编码、解码各一次。
+    """
+    data = base.encode("utf-16-le")
+    units = len(data) // 2
+    parts, pos = [], 0
+    for at, delete, insert in ops:
+        if at < pos or delete < 0 or at + delete > units:
+            raise PatchError(f"补丁区间无效: at={at}, delete={delete}")
+        parts.append(data[pos * 2:at * 2])
+        parts.append(insert.encode("utf-16-le", "surrogatepass"))
+        pos = at + delete
+    parts.append(data[pos * 2:])
+    try:
+        return b"".join(parts).decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise PatchError("补丁切开了 UTF-16 代理对")
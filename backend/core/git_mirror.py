@@ -0,0 +1,143 @@
+import os
+import base64
+import logging
+import subprocess
+import threading
+
+logger = logging.getLogger("CMS-Mirror")
+
+# core/git_mirror.py -> core/ -> backend/
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class MirrorError(Exception):
+    """git 命令失败，消息中带有 stderr"""
+
+
+class MirrorMiss(MirrorError):
+    """fetch 之后本地仍没有请求的 commit (如远端分支已前进、该 commit 不在浅克隆中)，调用方应改用 API 读取"""
+
+
+class GitMirror:
+    """
+    本地 bare 仓库镜像：树列表和 blob 读取直接走本地对象库，
+    只有当目标 commit 不在本地时才增量 fetch。
+    token 只在 fetch 时通过环境变量注入 http.extraHeader，不写入镜像的 config，也不出现在进程参数中。
+    """
+
+    def __init__(self, remote_url: str, path: str, branch: str = "main", token: str = None):
+        self.remote_url = remote_url
+        self.path = path
+        self.branch = branch
+        self.token = token
+        self._lock = threading.Lock()
+        self._checked_remote = False
+
+    def _git(self, *args, auth: bool = False) -> bytes:
+        env = None
+        if auth and self.token:
+            basic = base64.b64encode(f"x-access-token:{self.token}".encode()).decode()
+            env = {
+                **os.environ,
+                "GIT_CONFIG_COUNT": "1",
+                "GIT_CONFIG_KEY_0": "http.extraHeader",
+                "GIT_CONFIG_VALUE_0": f"Authorization: Basic {basic}",
+            }
+        result = subprocess.run(["git", "--git-dir", self.path, *args], capture_output=True, env=env)
+        if result.returncode != 0:
+            stderr = result.stderr.decode("utf-8", "replace").strip()
+            if self.token:
+                stderr = stderr.replace(self.token, "***")
+            raise MirrorError(f"git {args[0]} failed ({result.returncode}): {stderr}")
+        return result.stdout
+
+    def ensure(self):
+        """首次使用时初始化 bare 仓库并拉取分支"""
+        if os.path.exists(os.path.join(self.path, "HEAD")):
+            self._check_remote()
+            return
+        with self._lock:
+            if os.path.exists(os.path.join(self.path, "HEAD")):
+                return
+            os.makedirs(self.path, exist_ok=True)
+            self._git("init", "--bare", "--quiet")
+            self._git("remote", "add", "origin", self.remote_url)
+            self._checked_remote = True
+            logger.info(f"Initialized git mirror at {self.path}")
+        self.fetch()
+
+    def _check_remote(self):
+        """已有镜像的 remote 与配置不同时更新 (旧版本把 token 写在了 remote URL 中)"""
+        if self._checked_remote:
+            return
+        with self._lock:
+            current = self._git("config", "--get", "remote.origin.url").decode().strip()
+            if current != self.remote_url:
+                self._git("remote", "set-url", "origin", self.remote_url)
+                logger.info("Git mirror remote URL updated")
+            self._checked_remote = True
+
+    def fetch(self):
+        """浅克隆式增量拉取：已有对象不会重复下载"""
+        with self._lock:
+            refspec = f"+refs/heads/{self.branch}:refs/heads/{self.branch}"
+            self._git("fetch", "--quiet", "--depth", "1", "origin", refspec, auth=True)
+            logger.info(f"Git mirror fetched {self.branch}: {self.head()}")
+
+    def head(self) -> str:
+        return self._git("rev-parse", f"refs/heads/{self.branch}").decode().strip()
+
+    def has_commit(self, sha: str) -> bool:
+        try:
+            self._git("cat-file", "-e", f"{sha}^{{commit}}")
+            return True
+        except MirrorError:
+            return False
+
+    def sync(self, sha: str = None) -> str:
+        """
+        确保本地包含指定 commit；sha 为空时直接使用本地 HEAD。
+        返回实际用于读取的 commit SHA；fetch 后仍找不到 sha 时抛出 MirrorMiss
+        (不能用本地 HEAD 代替，调用方会把结果当作 sha 对应的版本缓存)。
+        """
+        self.ensure()
+        if sha and not self.has_commit(sha):
+            self.fetch()
+            if not self.has_commit(sha):
+                raise MirrorMiss(f"Commit {sha} not found in mirror after fetch")
+        return sha or self.head()
+
+    def list_tree(self, ref: str) -> list:
+        """递归列出 ref 下的所有文件，格式与 GitHub git tree 保持一致"""
+        out = self._git("ls-tree", "-r", "-z", "--full-tree", ref)
+        entries = []
+        for record in out.split(b"\0"):
+            if not record:
+                continue
+            meta, path = record.split(b"\t", 1)
+            mode, obj_type, sha = meta.decode().split(" ")
+            entries.append({
+                "path": path.decode("utf-8"),
+                "mode": mode,
+                "type": obj_type,
+                "sha": sha,
+            })
+        return entries
+
+    def read_blob(self, sha: str) -> bytes:
+        return self._git("cat-file", "blob", sha)
+
+    def resolve(self, ref: str, path: str) -> str:
+        """获取某个 ref 下文件对应的 blob SHA"""
+        return self._git("rev-parse", f"{ref}:{path}").decode().strip()
+
+
+def mirror_from_env():
+    """GITHUB_BACKEND=mirror 时根据环境变量创建镜像，否则返回 None"""
+    if os.getenv("GITHUB_BACKEND", "api").lower() != "mirror":
+        return None
+    repo_name = os.getenv("REPO_NAME")
+    remote = os.getenv("GIT_MIRROR_REMOTE") or f"https://github.com/{repo_name}.git"
+    mirror_dir = os.getenv("GIT_MIRROR_DIR", os.path.join(BASE_DIR, "data", "mirror.git"))
+    logger.info(f"Using local git mirror for reads: {mirror_dir}")
+    return GitMirror(remote, mirror_dir, token=os.getenv("GITHUB_TOKEN"))
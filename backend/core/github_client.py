@@ -1,12 +1,59 @@
 import os
+import time
 import base64
 import logging
-from github import Github
 from dotenv import load_dotenv
+from core.git_mirror import mirror_from_env, MirrorMiss
 
 load_dotenv()
 logger = logging.getLogger("CMS-GitHub")
 
+def find_conflicts(changes: list, current: dict) -> list:
+    """
+    按文件检查批量变更的基准 SHA 是否与分支当前状态一致 (乐观锁)。
+    current 为 {path: blob_sha}，返回冲突列表，为空表示可以提交。
+    """
+    conflicts = []
+    for change in changes:
+        path, expected = change["path"], change.get("sha") or None
+        actual = current.get(path)
+        reason = None
+        if change.get("delete"):
+            if actual is None:
+                reason = "文件不存在"
+            elif expected != actual:
+                reason = "版本冲突"
+        elif expected and expected != actual:
+            reason = "版本冲突"
+        elif not expected and actual:
+            reason = "文件已存在"
+        if reason:
+            conflicts.append({"path": path, "reason": reason, "expected": expected, "current": actual})
+    return conflicts
+
+
+def resolve_blob_shas(changes: list, created: dict) -> dict:
+    """汇总每个路径提交后的 blob SHA，删除为 None；created 为 {path: 新建 blob SHA}"""
+    files = {}
+    for change in changes:
+        if change.get("delete"):
+            files[change["path"]] = None
+        else:
+            files[change["path"]] = change.get("blob_sha") or created[change["path"]]
+    return files
+
+
+def tree_entries(files: dict, modes: dict) -> list:
+    """
+    新树的条目 (files 为 {path: blob SHA | None 表示删除})。
+    已有文件沿用原来的 mode，保留可执行位和符号链接；新文件为普通文件 100644。
+    """
+    return [
+        {"path": path, "mode": modes.get(path, "100644"), "type": "blob", "sha": sha}
+        for path, sha in files.items()
+    ]
+
+
 class GitHubClient:
     def __init__(self):
         token = os.getenv("GITHUB_TOKEN")
@@ -23,16 +70,38 @@ class GitHubClient:
         if not verify_ssl:
             logger.warning("SSL verification is DISABLED. This is insecure but allows connection through some proxies.")
         
-        # 初始化 Github 客户端
-        # verify 参数用于控制 SSL 证书验证
-        self.g = Github(auth=None, login_or_token=token, verify=verify_ssl)
-        
-        try:
-            self.repo = self.g.get_repo(repo_name)
-            logger.info(f"Successfully connected to repo: {repo_name}")
-        except Exception as e:
-            logger.error(f"Failed to connect to GitHub repo: {e}")
-            raise e
+        # 初始化 Github 客户端 (PyGithub 只有同步客户端使用，延迟导入，服务进程启动时不加载)
+        from github import Github
+        # verify 参数用于控制 SSL 证书验证；GITHUB_API_URL 可指向 GitHub Enterprise 或本地 Mock
+        api_url = os.getenv("GITHUB_API_URL", "https://api.github.com")
+        self.g = Github(auth=None, login_or_token=token, verify=verify_ssl, base_url=api_url)
+        # 仓库在首次使用时才连接 (get_repo 是一次网络请求)，GitHub 不可达时不影响进程启动
+        self.repo_name = repo_name
+        self.connect_retries = int(os.getenv("GITHUB_CONNECT_RETRIES", 3))
+        self._repo = None
+
+        # 读取后端：api (默认，直接调用 GitHub API) 或 mirror (本地 git 镜像)
+        self.mirror = mirror_from_env()
+
+    @property
+    def repo(self):
+        if self._repo is None:
+            self._repo = self._connect()
+        return self._repo
+
+    def _connect(self):
+        """连接仓库，失败时按 1s、2s、4s… 退避重试；全部失败时抛出最后一次的异常，下次访问再重新尝试"""
+        for attempt in range(self.connect_retries + 1):
+            try:
+                repo = self.g.get_repo(self.repo_name)
+                logger.info(f"Successfully connected to repo: {self.repo_name}")
+                return repo
+            except Exception as e:
+                if attempt == self.connect_retries:
+                    logger.error(f"Failed to connect to GitHub repo: {e}")
+                    raise
+                logger.warning(f"Connect to GitHub repo failed ({e}), retrying in {2 ** attempt}s")
+                time.sleep(2 ** attempt)
 
     def get_latest_commit_sha(self, branch: str = "main") -> str:
         """获取指定分支的最新 Commit SHA，作为数据版本号"""
@@ -43,9 +112,28 @@ class GitHubClient:
             logger.error(f"Failed to get branch sha: {e}")
             return None
 
-    def get_file_content(self, path: str):
+    def get_tree(self, ref: str = None) -> list:
+        """
+        获取递归文件树 [{path, type, sha}]。
+        ref 通常传入已缓存的版本号；镜像模式下只有该 commit 不在本地时才会 fetch。
+        """
+        if self.mirror:
+            try:
+                return self.mirror.list_tree(self.mirror.sync(ref))
+            except MirrorMiss as e:
+                logger.warning(f"{e}, reading tree from GitHub API")
+        tree = self.repo.get_git_tree(ref or "main", recursive=True)
+        return [{"path": f.path, "type": f.type, "sha": f.sha} for f in tree.tree]
+
+    def get_file_content(self, path: str, ref: str = None):
         """读取文件内容和 SHA"""
-        content_file = self.repo.get_contents(path)
+        if self.mirror:
+            try:
+                blob_sha = self.mirror.resolve(self.mirror.sync(ref), path)
+                return self.mirror.read_blob(blob_sha).decode("utf-8"), blob_sha
+            except MirrorMiss as e:
+                logger.warning(f"{e}, reading {path} from GitHub API")
+        content_file = self.repo.get_contents(path, ref=ref) if ref else self.repo.get_contents(path)
         # GitHub 返回的是 Base64 编码，需要解码
         decoded_content = base64.b64decode(content_file.content).decode("utf-8")
         return decoded_content, content_file.sha
@@ -0,0 +1,360 @@
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+import functools
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import httpx
+
+logger = logging.getLogger("CMS-GitHub")
+
+# 请求优先级，数值越小越优先
+SAVE = 0          # 写入，以及提交流程中的读取
+INTERACTIVE = 1   # 用户请求触发的读取 (默认)
+BACKGROUND = 2    # 预取、版本轮询、快照导出等后台任务
+PRIORITY_NAMES = {SAVE: "save", INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+RETRY_STATUSES = (500, 502, 503, 504)
+# 次级限额按点数计：GET 1 点，写入 5 点 (GitHub REST 文档)
+READ_POINTS, WRITE_POINTS = 1, 5
+# "每分钟内容生成请求数" 只统计创建内容的请求 (blob / tree / commit / contents 写入与删除)；
+# 移动 ref (PATCH) 不产生新内容，只计点数。一次 Git Data 提交 = 每个新 blob 1 次 + tree + commit
+CONTENT_METHODS = ("POST", "PUT", "DELETE")
+# 后台任务最多使用次级限额窗口的这个比例，剩余部分留给保存和交互请求
+BACKGROUND_SHARE = 0.8
+
+_priority = ContextVar("github_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int):
+    """在 with 块 (及其中创建的任务) 内发出的 GitHub 请求使用指定优先级"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def background(fn):
+    """包装协程函数，其中的 GitHub 请求按后台优先级调度"""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with priority(BACKGROUND):
+            return await fn(*args, **kwargs)
+    return wrapper
+
+
+class GitHubUnavailable(Exception):
+    """熔断器打开或额度不足时快速失败，请求没有发出；retry_after 为建议的等待秒数"""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PriorityLimiter:
+    """并发上限 + 按优先级放行：有空位时先唤醒数值最小的等待者，同一优先级先到先得"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []  # (priority, seq, future)
+        self._seq = itertools.count()
+
+    async def acquire(self, level: int):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (level, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已经拿到名额后才被取消，把名额交给下一个
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # 名额直接转交，active 不变
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def queued(self) -> dict:
+        counts = {name: 0 for name in PRIORITY_NAMES.values()}
+        for level, _, future in self._waiters:
+            if not future.done():
+                counts[PRIORITY_NAMES[level]] += 1
+        return counts
+
+
+class SlidingWindow:
+    """period 秒滑动窗口内的累计消耗"""
+
+    def __init__(self, period: float = 60):
+        self.period = period
+        self.used = 0
+        self._events = deque()  # (时间, 消耗)
+
+    def _expire(self, now: float):
+        while self._events and self._events[0][0] <= now - self.period:
+            self.used -= self._events.popleft()[1]
+
+    def wait_time(self, cost: float, limit: float) -> float:
+        """再消耗 cost 需要等待的秒数，0 表示立即可用"""
+        now = time.time()
+        self._expire(now)
+        excess = self.used + cost - limit
+        if excess <= 0:
+            return 0
+        freed = 0
+        for at, spent in self._events:
+            freed += spent
+            if freed >= excess:
+                return at + self.period - now
+        return self.period
+
+    def add(self, cost: float):
+        self._events.append((time.time(), cost))
+        self.used += cost
+
+
+class RequestScheduler:
+    """
+    GitHub 请求调度：
+    - 并发上限内按优先级放行 (保存 > 交互读取 > 后台任务)
+    - 主额度 (X-RateLimit-*)：剩余额度不高于 background_reserve 时后台请求让路，耗尽后等待重置，
+      需要等待超过 max_wait 秒时直接抛出 GitHubUnavailable
+    - 次级限额：60 秒滑动窗口内的点数与内容生成请求数；写入排队等到窗口释放 (最多一个窗口)，不直接失败；
+      收到 429 / 次级限额 403 时按 Retry-After 暂停所有请求
+    - 幂等读取遇到网络错误和 5xx 时按 full jitter 指数退避重试；写入只在确定未被处理时重试 (连接失败、限额拒绝)
+    - 熔断器：连续 breaker_threshold 次请求失败 (网络错误或 5xx) 后打开，cooldown 秒内直接抛出 GitHubUnavailable，
+      之后放行一个探测请求，成功则关闭，失败则重新计时
+    """
+
+    def __init__(self, max_concurrency: int = 10, max_wait: float = 30, background_reserve: int = 200,
+                 secondary_points: int = 900, writes_per_minute: int = 80, retries: int = 3,
+                 backoff_base: float = 0.5, backoff_cap: float = 8, breaker_threshold: int = 5,
+                 breaker_cooldown: float = 30):
+        self.max_wait = max_wait
+        self.background_reserve = background_reserve
+        self.secondary_points = secondary_points
+        self.writes_per_minute = writes_per_minute
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.limiter = PriorityLimiter(max_concurrency)
+        self.points = SlidingWindow()
+        self.writes = SlidingWindow()
+        self.rate_remaining = None
+        self.rate_reset = None
+        self._blocked_until = 0.0
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.counters = {
+            "requests": 0, "retries": 0, "failures": 0, "rate_limited": 0,
+            "budget_waits": 0, "deferred": 0, "rejected": 0, "breaker_trips": 0,
+        }
+
+    # --- 对外接口 ---
+
+    async def request(self, method: str, send) -> httpx.Response:
+        """
+        调度一次请求。send() 为实际发出请求的协程，返回 httpx.Response；
+        返回最后一次的响应 (可能是错误状态码)，网络错误重试用尽后原样抛出。
+        """
+        idempotent = method in IDEMPOTENT_METHODS
+        level = _priority.get() if idempotent else SAVE
+        attempt = 0
+        while True:
+            probe = self._check_breaker()
+            try:
+                await self._wait_budget(method, level)
+                await self.limiter.acquire(level)
+            except BaseException:
+                # 额度不足或被取消时探测请求没有发出，允许下一个请求继续探测
+                if probe:
+                    self._release_probe()
+                raise
+            response, error = None, None
+            self.counters["requests"] += 1
+            try:
+                response = await send()
+            except httpx.TransportError as e:
+                error = e
+            finally:
+                self.limiter.release()
+                if probe and response is None and error is None:
+                    # 探测请求被取消，允许下一个请求继续探测
+                    self._probing = False
+            if response is not None:
+                self._update_rate_limit(response.headers)
+            delay = self._record(idempotent, response, error, attempt)
+            if delay is None or attempt >= self.retries or self._opened_at is not None:
+                if error is not None:
+                    raise error
+                return response
+            attempt += 1
+            self.counters["retries"] += 1
+            logger.warning(
+                f"GitHub {method} failed ({error or response.status_code}), retry {attempt}/{self.retries} in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+
+    # --- 额度 ---
+
+    def _update_rate_limit(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is not None:
+            self.rate_remaining = int(remaining)
+        if reset is not None:
+            self.rate_reset = int(reset)
+
+    async def _wait_budget(self, method: str, level: int):
+        cost = READ_POINTS if method in IDEMPOTENT_METHODS else WRITE_POINTS
+        creates = method in CONTENT_METHODS
+        point_limit = self.secondary_points * (BACKGROUND_SHARE if level == BACKGROUND else 1)
+        while True:
+            now = time.time()
+            secondary = [self._blocked_until - now, self.points.wait_time(cost, point_limit)]
+            if creates:
+                secondary.append(self.writes.wait_time(1, self.writes_per_minute))
+            wait = max(secondary)
+            # 保存与交互请求最多等待一个次级限额窗口，排队而不是直接失败；后台任务超过 max_wait 就放弃
+            max_wait = self.max_wait if level == BACKGROUND else max(self.max_wait, self.writes.period)
+            if self.rate_remaining is not None and self.rate_reset and self.rate_reset > now:
+                floor = self.background_reserve if level == BACKGROUND else 0
+                if self.rate_remaining <= floor:
+                    # 主额度按小时重置，等待重置的上限仍是 max_wait
+                    wait = max(wait, self.rate_reset - now)
+                    max_wait = self.max_wait
+            if wait <= 0:
+                # 检查与预占之间没有 await，并发请求不会超出预算
+                self.points.add(cost)
+                if creates:
+                    self.writes.add(1)
+                if self.rate_remaining is not None:
+                    self.rate_remaining -= 1
+                return
+            if wait > max_wait:
+                self.counters["deferred"] += 1
+                raise GitHubUnavailable(f"GitHub API 额度不足，约 {int(wait)} 秒后恢复", retry_after=wait)
+            self.counters["budget_waits"] += 1
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    def _is_rate_limited(response: httpx.Response) -> bool:
+        if response.status_code == 429:
+            return True
+        if response.status_code != 403:
+            return False
+        if "Retry-After" in response.headers or response.headers.get("X-RateLimit-Remaining") == "0":
+            return True
+        return "rate limit" in response.text.lower()
+
+    def _rate_limit_wait(self, response: httpx.Response) -> float:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        if response.headers.get("X-RateLimit-Remaining") == "0" and self.rate_reset:
+            return max(self.rate_reset - time.time(), 1)
+        # 次级限额没有给出 Retry-After 时，GitHub 建议至少等待一分钟
+        return 60
+
+    # --- 重试与熔断 ---
+
+    def _backoff(self, attempt: int) -> float:
+        """full jitter：在 [0, min(cap, base * 2^attempt)] 内均匀取值，避免多个客户端同时重试"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _record(self, idempotent: bool, response, error, attempt: int):
+        """记录结果 (熔断计数)，返回重试前的等待秒数；不应重试时返回 None"""
+        if error is not None:
+            self._on_failure()
+            # 连接阶段失败时请求没有发出，写入也可以安全重试
+            if idempotent or isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+                return self._backoff(attempt)
+            return None
+        status = response.status_code
+        if status in (403, 429) and self._is_rate_limited(response):
+            # 限额拒绝不代表 GitHub 故障，不计入熔断；请求未被处理，写入也可以重试
+            self.counters["rate_limited"] += 1
+            self._release_probe()
+            wait = self._rate_limit_wait(response)
+            if wait > self.max_wait:
+                return None
+            self._blocked_until = max(self._blocked_until, time.time() + wait)
+            return wait + self._backoff(0)
+        if status >= 500:
+            self._on_failure()
+            return self._backoff(attempt) if idempotent and status in RETRY_STATUSES else None
+        self._on_success()
+        return None
+
+    def _check_breaker(self) -> bool:
+        """熔断器打开时抛出 GitHubUnavailable；冷却结束后放行一个探测请求 (返回 True)"""
+        if self._opened_at is None:
+            return False
+        remaining = self._opened_at + self.breaker_cooldown - time.time()
+        if remaining > 0 or self._probing:
+            self.counters["rejected"] += 1
+            raise GitHubUnavailable(f"GitHub 暂时不可用，约 {max(int(remaining), 1)} 秒后重试", retry_after=max(remaining, 1))
+        self._probing = True
+        return True
+
+    def _release_probe(self):
+        self._probing = False
+
+    def _on_success(self):
+        self._failures = 0
+        if self._opened_at is not None:
+            logger.info("GitHub circuit breaker closed")
+        self._opened_at = None
+        self._probing = False
+
+    def _on_failure(self):
+        self.counters["failures"] += 1
+        self._failures += 1
+        if self._probing or (self._opened_at is None and self._failures >= self.breaker_threshold):
+            if self._opened_at is None:
+                self.counters["breaker_trips"] += 1
+                logger.error(f"GitHub circuit breaker opened after {self._failures} consecutive failures")
+            self._opened_at = time.time()
+            self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._probing or time.time() >= self._opened_at + self.breaker_cooldown:
+            return "half_open"
+        return "open"
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "breaker": self.state,
+            "in_flight": self.limiter.active,
+            "queued": self.limiter.queued(),
+            "rate_remaining": self.rate_remaining,
+            "rate_reset": self.rate_reset,
+            "secondary_points": self.points.used,
+            "secondary_writes": self.writes.used,
+        }
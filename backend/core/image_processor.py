@@ -0,0 +1,243 @@
+import io
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from core import redis_io
+
+logger = logging.getLogger("CMS-Image")
+
+try:
+    from PIL import Image, ImageOps, ImageSequence
+except ImportError:  # Pillow 为可选依赖，缺失时只做去重，不压缩转码
+    Image = None
+
+# 矢量图转码会丢信息，原样上传 (动画不转码，见 strip_animated)
+PASSTHROUGH_TYPES = {"image/svg+xml"}
+FORMAT_MIME = {"WEBP": "image/webp", "AVIF": "image/avif", "JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif"}
+# 可能含拍摄设备、GPS、作者等隐私信息的元数据 (Pillow 读入 info 的键名)
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment")
+# 可以按原格式逐帧保存的动画格式；其他多帧格式 (如相机的 MPO) 按首帧转码
+ANIMATED_FORMATS = {"GIF", "WEBP", "PNG"}
+# 计算哈希时分块读取上传的临时文件
+HASH_CHUNK = 1024 * 1024
+
+
+def transcode(data: bytes, max_dimension: int, fmt: str, quality: int):
+    """
+    在子进程中执行：按 EXIF 方向摆正、缩放到 max_dimension 以内、去除 EXIF 并转码。
+    返回 (bytes, format)；结果不比原图小、无需缩放且原图不含 EXIF 时返回 None，调用方上传原图。
+    原图带 EXIF (可能含 GPS 等隐私信息) 时即使转码后更大也使用转码结果。
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        if getattr(img, "is_animated", False) and img.format in ANIMATED_FORMATS:
+            return strip_animated(img, quality)
+        has_exif = bool(img.info.get("exif")) or len(img.getexif()) > 0
+        img = ImageOps.exif_transpose(img)
+        resized = max(img.size) > max_dimension
+        if resized:
+            img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+        for target in (fmt, "WEBP"):
+            out = io.BytesIO()
+            try:
+                img.save(out, format=target, quality=quality, method=4 if target == "WEBP" else None)
+            except (KeyError, OSError, ValueError):
+                # 当前 Pillow 不支持该格式 (如未编译 AVIF)，回退 WebP
+                continue
+            if resized or has_exif or out.tell() < len(data):
+                return out.getvalue(), target
+            return None
+    return None
+
+
+def strip_animated(img, quality: int):
+    """
+    动画 (GIF / WebP / APNG) 不缩放也不换格式，逐帧按原格式重新保存，只为去除元数据；
+    不含元数据时返回 None，上传原图
+    """
+    if not any(img.info.get(key) for key in METADATA_KEYS) and len(img.getexif()) == 0:
+        return None
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(img):
+        frame = frame.copy()
+        durations.append(frame.info.get("duration", 0))
+        for key in METADATA_KEYS:
+            frame.info.pop(key, None)
+        frames.append(frame)
+    out = io.BytesIO()
+    frames[0].save(
+        out, format=img.format, save_all=True, append_images=frames[1:],
+        duration=durations, loop=img.info.get("loop", 0), quality=quality,
+    )
+    return out.getvalue(), img.format
+
+
+class ImageProcessor:
+    """
+    图床上传前的处理流水线：
+    - 内容哈希 (SHA-256) 去重，hash -> URL 持久化在 Redis 哈希中，重复图片不再上传
+    - 新图片在进程池中缩放 + 转码 (WebP / AVIF)，去除 EXIF，不占用事件循环
+    - 统计节省的字节数和各阶段耗时
+    """
+
+    def __init__(self, uploader, redis_client=None, key: str = "cms:images"):
+        self.uploader = uploader
+        self.redis = redis_client
+        self.key = key
+        self.max_dimension = int(os.getenv("IMAGE_MAX_DIMENSION", 2560))
+        self.format = os.getenv("IMAGE_FORMAT", "webp").upper()
+        self.quality = int(os.getenv("IMAGE_QUALITY", 82))
+        self.workers = int(os.getenv("IMAGE_WORKERS", 2))
+        self.enabled = Image is not None and self.format != "ORIGINAL"
+        if Image is None:
+            logger.warning("Pillow 未安装，图片将原样上传 (仍会按内容去重)")
+        self._pool = None
+        self._urls = {}  # Redis 不可用时的进程内 hash -> URL
+        self.counters = {
+            "uploads": 0,
+            "dedup_hits": 0,
+            "transcoded": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "bytes_saved": 0,
+            "hash_seconds": 0.0,
+            "transcode_seconds": 0.0,
+            "upload_seconds": 0.0,
+        }
+
+    def shutdown(self):
+        if self._pool:
+            self._pool.shutdown(wait=False)
+
+    # --- hash -> URL ---
+
+    def _lookup(self, digest: str):
+        if self.redis:
+            try:
+                return self.redis.hget(self.key, digest)
+            except Exception as e:
+                logger.error(f"Redis hget image failed: {e}")
+        return self._urls.get(digest)
+
+    def _remember(self, url: str, *digests: str):
+        mapping = {d: url for d in digests}
+        self._urls.update(mapping)
+        if self.redis:
+            redis_io.submit(self._store, mapping)
+
+    def _store(self, mapping: dict):
+        try:
+            self.redis.hset(self.key, mapping=mapping)
+        except Exception as e:
+            logger.error(f"Redis hset image failed: {e}")
+
+    # --- 流水线 ---
+
+    async def _transcode(self, data: bytes):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._pool, transcode, data, self.max_dimension, self.format, self.quality
+        )
+
+    @staticmethod
+    def _hash_file(f) -> tuple:
+        """分块读取临时文件计算 SHA-256，返回 (digest, 字节数)，不把整张图片读入内存"""
+        f.seek(0)
+        h, size = hashlib.sha256(), 0
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+            size += len(chunk)
+        f.seek(0)
+        return h.hexdigest(), size
+
+    @staticmethod
+    def _read_file(f) -> bytes:
+        f.seek(0)
+        return f.read()
+
+    async def upload(self, file: UploadFile) -> dict:
+        """处理并上传单张图片，返回 {url, dedup, bytes_in, bytes_out, timings}"""
+        timings = {}
+        start = time.perf_counter()
+        digest, size = await asyncio.to_thread(self._hash_file, file.file)
+        timings["hash_ms"] = (time.perf_counter() - start) * 1000
+        self.counters["hash_seconds"] += timings["hash_ms"] / 1000
+        self.counters["bytes_in"] += size
+
+        url = await redis_io.run(self._lookup, digest)
+        if url:
+            self.counters["dedup_hits"] += 1
+            self.counters["bytes_saved"] += size
+            return self._result(url, True, size, 0, timings)
+
+        # 不转码时直接上传原临时文件 (分块读取)；只有交给转码进程时才整体读入内存
+        target, out_size, digests = file, size, [digest]
+        if self.enabled and file.content_type not in PASSTHROUGH_TYPES:
+            start = time.perf_counter()
+            try:
+                converted = await self._transcode(await asyncio.to_thread(self._read_file, file.file))
+            except Exception as e:
+                logger.warning(f"图片 {file.filename} 转码失败，原样上传: {e}")
+                converted = None
+            timings["transcode_ms"] = (time.perf_counter() - start) * 1000
+            self.counters["transcode_seconds"] += timings["transcode_ms"] / 1000
+            if converted:
+                out, fmt = converted
+                target = UploadFile(
+                    file=io.BytesIO(out),
+                    filename=f"{os.path.splitext(file.filename or 'image')[0]}.{fmt.lower()}",
+                    headers=Headers({"content-type": FORMAT_MIME[fmt]}),
+                )
+                out_size = len(out)
+                digests.append(hashlib.sha256(out).hexdigest())
+                self.counters["transcoded"] += 1
+
+        start = time.perf_counter()
+        url = await self.uploader.upload(target)
+        timings["upload_ms"] = (time.perf_counter() - start) * 1000
+        self.counters["upload_seconds"] += timings["upload_ms"] / 1000
+        self.counters["uploads"] += 1
+        self.counters["bytes_out"] += out_size
+        self.counters["bytes_saved"] += size - out_size
+
+        # 原图和处理后的结果都记录，之后上传任意一个都能命中
+        self._remember(url, *digests)
+        return self._result(url, False, size, out_size, timings)
+
+    @staticmethod
+    def _result(url: str, dedup: bool, bytes_in: int, bytes_out: int, timings: dict) -> dict:
+        return {
+            "url": url,
+            "dedup": dedup,
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "timings": {k: round(v, 1) for k, v in timings.items()},
+        }
+
+    async def upload_many(self, files: list) -> list:
+        """并发处理多张图片，返回与输入顺序一致的 [{name, url, error, ...}]"""
+        async def one(file: UploadFile):
+            try:
+                return {"name": file.filename, "error": None, **await self.upload(file)}
+            except Exception as e:
+                logger.error(f"图片 {file.filename} 上传失败: {e}")
+                return {"name": file.filename, "url": None, "error": str(e)}
+
+        return await asyncio.gather(*(one(f) for f in files))
+
+    def stats(self) -> dict:
+        c = self.counters
+        return {
+            **{k: round(v, 4) if isinstance(v, float) else v for k, v in c.items()},
+            "transcode_enabled": self.enabled,
+            "format": self.format,
+            "max_dimension": self.max_dimension,
+        }
@@ -1,37 +1,106 @@
-import requests
 import os
+import random
+import asyncio
+import logging
+import httpx
 from fastapi import UploadFile
 
+logger = logging.getLogger("CMS-Uploader")
+
+# 这些状态码视为图床临时故障，可以重试
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class UploadError(Exception):
+    pass
+
+
 class TelegramUploader:
+    """
+    基于 httpx 的异步图床上传：
+    - 共享 keep-alive 连接池，不阻塞事件循环
+    - multipart 请求体直接从 UploadFile 的临时文件分块读取，不把整张图片读入内存
+    - 网络错误 / 5xx / 429 时指数退避重试
+    - 信号量限制同时在途的上传数 (批量上传时生效)
+    """
+
     def __init__(self):
         self.api_url = os.getenv("TG_IMG_API")
+        self.retries = int(os.getenv("TG_IMG_RETRIES", 3))
+        self.backoff = float(os.getenv("TG_IMG_BACKOFF", 0.5))
+        self.max_concurrency = int(os.getenv("TG_IMG_MAX_CONCURRENCY", 4))
+        self.http = httpx.AsyncClient(
+            timeout=float(os.getenv("TG_IMG_TIMEOUT", 30)),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+        # 信号量需在事件循环内创建
+        self._semaphore = None
 
-    async def upload_image(self, file: UploadFile):
+    async def aclose(self):
+        await self.http.aclose()
+
+    @staticmethod
+    def _parse_url(res_data):
+        # 兼容处理：根据 API 文档，通常返回在 data.url 或直接在 url 字段
+        if isinstance(res_data, list) and len(res_data) > 0:
+            return res_data[0].get("src")  # 批量上传模式
+        return res_data.get("data", {}).get("url") or res_data.get("url")
+
+    async def _post(self, file: UploadFile) -> str:
+        # 每次尝试都从头读取临时文件；httpx 按块读取并根据文件大小设置 Content-Length
+        file.file.seek(0)
+        files = {"file": (file.filename, file.file, file.content_type)}
+        response = await self.http.post(self.api_url, files=files)
+        if response.status_code in RETRYABLE_STATUS:
+            raise httpx.HTTPStatusError(
+                f"图床返回 {response.status_code}", request=response.request, response=response
+            )
         try:
-            file_content = await file.read()
-            
-            # 构造 form-data
-            # 注意：字段名通常是 'file'
-            files = {
-                'file': (file.filename, file_content, file.content_type)
-            }
-            
-            # 发送请求
-            response = requests.post(self.api_url, files=files, timeout=30)
             res_data = response.json()
-            
-            # 调试用：如果上传失败，可以打印 res_data 看看报错
-            if response.status_code != 200:
-                print(f"上传接口返回错误: {res_data}")
-                return None
-
-            # 兼容处理：根据 API 文档，通常返回在 data.url 或直接在 url 字段
-            # 如果是该方案常见的返回格式：
-            if isinstance(res_data, list) and len(res_data) > 0:
-                return res_data[0].get("src") # 批量上传模式
-            
-            return res_data.get("data", {}).get("url") or res_data.get("url")
-            
+        except ValueError:
+            raise UploadError(f"图床返回非 JSON 响应 ({response.status_code})")
+        if response.status_code != 200:
+            raise UploadError(f"上传接口返回错误: {res_data}")
+        url = self._parse_url(res_data)
+        if not url:
+            raise UploadError(f"图床未返回 URL: {res_data}")
+        return url
+
+    async def upload(self, file: UploadFile) -> str:
+        """上传单个文件并返回 URL，失败时抛出异常"""
+        if not self.api_url:
+            raise UploadError("未配置图床地址 TG_IMG_API")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    return await self._post(file)
+                except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                    if attempt >= self.retries:
+                        raise UploadError(f"上传失败 (已重试 {self.retries} 次): {e}")
+                    delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                    logger.warning(f"上传 {file.filename} 失败: {e}，{delay:.2f}s 后重试 ({attempt + 1}/{self.retries})")
+                    await asyncio.sleep(delay)
+
+    async def upload_image(self, file: UploadFile):
+        """上传单个文件，失败返回 None (兼容旧接口)"""
+        try:
+            return await self.upload(file)
         except Exception as e:
-            print(f"图床对接异常: {e}")
+            logger.error(f"图床对接异常: {e}")
             return None
+
+    async def upload_many(self, files: list) -> list:
+        """并发上传多个文件 (受 max_concurrency 限制)，返回与输入顺序一致的 [{name, url, error}]"""
+        async def one(file: UploadFile):
+            try:
+                return {"name": file.filename, "url": await self.upload(file), "error": None}
+            except Exception as e:
+                logger.error(f"图片 {file.filename} 上传失败: {e}")
+                return {"name": file.filename, "url": None, "error": str(e)}
+
+        return await asyncio.gather(*(one(f) for f in files))
@@ -0,0 +1,58 @@
+from difflib import SequenceMatcher
+
+
+def _intersect(ra: tuple, rb: tuple):
+    start, end = max(ra[0], rb[0]), min(ra[1], rb[1])
+    return (start, end) if start < end else None
+
+
+def _sync_regions(base: list, ours: list, theirs: list) -> list:
+    """base 中同时与 ours、theirs 匹配的区间，返回 [(base 起止, ours 起止, theirs 起止)]，末尾为哨兵"""
+    a_matches = SequenceMatcher(None, base, ours, autojunk=False).get_matching_blocks()
+    b_matches = SequenceMatcher(None, base, theirs, autojunk=False).get_matching_blocks()
+    regions = []
+    ia = ib = 0
+    while ia < len(a_matches) and ib < len(b_matches):
+        a_base, a_pos, a_len = a_matches[ia]
+        b_base, b_pos, b_len = b_matches[ib]
+        overlap = _intersect((a_base, a_base + a_len), (b_base, b_base + b_len))
+        if overlap:
+            start, end = overlap
+            a_sub, b_sub = a_pos + start - a_base, b_pos + start - b_base
+            regions.append((start, end, a_sub, a_sub + end - start, b_sub, b_sub + end - start))
+        if a_base + a_len < b_base + b_len:
+            ia += 1
+        else:
+            ib += 1
+    regions.append((len(base), len(base), len(ours), len(ours), len(theirs), len(theirs)))
+    return regions
+
+
+def merge3(base: str, ours: str, theirs: str) -> tuple:
+    """
+    按行三方合并 (diff3)：只有一方修改的区块取修改方，双方改成相同内容的取其一，
+    双方改法不同的区块为冲突。返回 (合并结果 | None, 冲突区块列表)，有冲突时合并结果为 None。
+    冲突区块：{"line": base 中的起始行号 (从 1 开始), "base", "ours", "theirs"}
+    """
+    base_lines = base.splitlines(keepends=True)
+    ours_lines = ours.splitlines(keepends=True)
+    theirs_lines = theirs.splitlines(keepends=True)
+
+    merged, conflicts = [], []
+    iz = ia = ib = 0
+    for z_start, z_end, a_start, a_end, b_start, b_end in _sync_regions(base_lines, ours_lines, theirs_lines):
+        if a_start > ia or b_start > ib or z_start > iz:
+            old = base_lines[iz:z_start]
+            a, b = ours_lines[ia:a_start], theirs_lines[ib:b_start]
+            if a == b or b == old:
+                merged.extend(a)
+            elif a == old:
+                merged.extend(b)
+            else:
+                conflicts.append({"line": iz + 1, "base": "".join(old), "ours": "".join(a), "theirs": "".join(b)})
+        merged.extend(base_lines[z_start:z_end])
+        iz, ia, ib = z_end, a_end, b_end
+
+    if conflicts:
+        return None, conflicts
+    return "".join(merged), []
@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import logging
+import datetime
+from core.parser import parse_markdown
+
+logger = logging.getLogger("CMS-Metadata")
+
+_CJK_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+_WORD_RE = re.compile(r"[A-Za-z0-9]+(?:['’-][A-Za-z0-9]+)*")
+
+SORT_FIELDS = ("date", "title", "word_count", "path")
+
+
+def count_words(text: str) -> int:
+    """中文按字计数，其他按单词计数"""
+    return len(_CJK_RE.findall(text)) + len(_WORD_RE.findall(text))
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [str(v) for v in value if v is not None]
+    return [s.strip() for s in str(value).split(",") if s.strip()]
+
+
+def _as_date(value) -> str:
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value) if value else ""
+
+
+def extract_metadata(content: str) -> dict:
+    """解析 front-matter，提取列表展示和检索需要的字段 (与路径无关，可按 blob SHA 缓存)"""
+    try:
+        parsed = parse_markdown(content)
+    except Exception as e:
+        logger.warning(f"Front-matter parse failed: {e}")
+        parsed = {"metadata": {}, "content": content}
+    meta = parsed["metadata"]
+    return {
+        "title": str(meta["title"]) if meta.get("title") else None,
+        "date": _as_date(meta.get("date")),
+        "tags": _as_list(meta.get("tags")),
+        "categories": _as_list(meta.get("categories") or meta.get("category")),
+        "draft": bool(meta.get("draft", False)),
+        "word_count": count_words(parsed["content"]),
+    }
+
+
+class MetadataIndex:
+    """
+    blob SHA -> front-matter 元数据。blob 内容不可变，条目无需过期，
+    只有新出现的 SHA 需要读取和解析；持久化在 Redis 哈希中。
+    """
+
+    def __init__(self, redis_client=None, key: str = "cms:meta"):
+        self.redis = redis_client
+        self.key = key
+        self._meta = {}
+        self._loaded = False
+
+    def load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.redis:
+            return
+        try:
+            stored = self.redis.hgetall(self.key)
+            self._meta.update({sha: json.loads(raw) for sha, raw in stored.items()})
+            logger.info(f"Metadata index loaded: {len(self._meta)} blobs")
+        except Exception as e:
+            logger.error(f"Load metadata index failed: {e}")
+
+    def missing(self, shas) -> list:
+        self.load()
+        return [sha for sha in set(shas) if sha not in self._meta]
+
+    def add_many(self, contents: dict):
+        """contents 为 {blob_sha: markdown 文本}"""
+        entries = {sha: extract_metadata(text) for sha, text in contents.items()}
+        self._meta.update(entries)
+        if not self.redis or not entries:
+            return
+        try:
+            self.redis.hset(self.key, mapping={sha: json.dumps(m) for sha, m in entries.items()})
+        except Exception as e:
+            logger.error(f"Persist metadata index failed: {e}")
+
+    def prune(self, live_shas):
+        """清理已不被任何文章引用的 SHA"""
+        stale = [sha for sha in self._meta if sha not in live_shas]
+        for sha in stale:
+            del self._meta[sha]
+        if self.redis and stale:
+            try:
+                self.redis.hdel(self.key, *stale)
+            except Exception as e:
+                logger.error(f"Prune metadata index failed: {e}")
+
+    def get(self, sha: str):
+        return self._meta.get(sha)
+
+    def query(self, files: dict, q: str = None, tag: str = None, category: str = None,
+              draft: bool = None, sort: str = "date", order: str = "desc",
+              page: int = 1, page_size: int = 20):
+        """
+        在 {path: blob_sha} 上做过滤 / 排序 / 分页，返回 (当前页, 过滤后总数)。
+        仅对当前页构造响应对象，万级文章下开销在毫秒级。
+        """
+        keyword = q.lower() if q else None
+        matched = []
+        for path, sha in files.items():
+            meta = self._meta.get(sha)
+            if meta is None:
+                continue
+            is_draft = meta["draft"] or "src/drafts/" in path
+            if draft is not None and is_draft != draft:
+                continue
+            if tag and tag not in meta["tags"]:
+                continue
+            if category and category not in meta["categories"]:
+                continue
+            title = meta["title"] or os.path.basename(path)
+            if keyword and keyword not in title.lower() and keyword not in path.lower():
+                continue
+            matched.append((path, sha, meta, title, is_draft))
+
+        sort_key = {
+            "date": lambda m: m[2]["date"],
+            "title": lambda m: m[3].lower(),
+            "word_count": lambda m: m[2]["word_count"],
+            "path": lambda m: m[0],
+        }[sort if sort in SORT_FIELDS else "date"]
+        matched.sort(key=sort_key, reverse=(order == "desc"))
+
+        start = (page - 1) * page_size
+        items = [
+            {
+                "path": path,
+                "name": os.path.basename(path),
+                "sha": sha,
+                "isDraft": is_draft,
+                "title": title,
+                "date": meta["date"],
+                "tags": meta["tags"],
+                "categories": meta["categories"],
+                "word_count": meta["word_count"],
+            }
+            for path, sha, meta, title, is_draft in matched[start:start + page_size]
+        ]
+        return items, len(matched)
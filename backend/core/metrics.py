@@ -0,0 +1,200 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# 默认直方图分桶 (秒)，覆盖 Redis 的亚毫秒级到 GitHub 的秒级
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        self._function = None
+
+    def set_function(self, function):
+        """抓取时调用 function 计算取值 (返回数值或 {标签元组: 数值})，用于汇总已有的统计计数"""
+        self._function = function
+
+    def _items(self):
+        if self._function is None:
+            with self._lock:
+                return list(self._values.items())
+        try:
+            result = self._function()
+        except Exception:
+            return []
+        if result is None:
+            return []
+        return list(result.items()) if isinstance(result, dict) else [((), result)]
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, names, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        return [("", self.labelnames, key, "", value) for key, value in self._items() if value is not None]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+        result = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                result.append(("_bucket", self.labelnames, key, f'le="{_format_value(bound)}"', cumulative))
+            result.append(("_sum", self.labelnames, key, "", total))
+            result.append(("_count", self.labelnames, key, "", count))
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # 模块被重复导入时复用已注册的指标
+        return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels=()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def gauge(name: str, help: str, labels=()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labels))
+
+
+def histogram(name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+class RequestMetricsMiddleware:
+    """
+    记录到响应头发出为止的请求耗时。纯 ASGI 实现：不像 BaseHTTPMiddleware 那样为每个请求
+    额外包装一层响应流，/api/events 这类长连接的开销与直接调用应用相同。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        recorded = False
+
+        def observe(status_code):
+            nonlocal recorded
+            recorded = True
+            # 按路由模板聚合 (如 /api/article/detail)，避免路径参数造成标签爆炸
+            route = scope.get("route")
+            HTTP_LATENCY.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route.path if route else "unmatched",
+                status=status_code,
+            )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and not recorded:
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not recorded:
+                observe(500)
+
+
+# --- 各模块共用的指标 ---
+
+HTTP_LATENCY = histogram("cms_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+GITHUB_LATENCY = histogram("cms_github_request_duration_seconds", "GitHub API / mirror call latency by operation", ("operation", "status"))
+REDIS_LATENCY = histogram("cms_redis_op_duration_seconds", "Redis operation latency", ("component", "op"))
+INDEX_REBUILD = histogram("cms_index_rebuild_duration_seconds", "Article tree index rebuild time", ())
+JSON_ENCODE = histogram("cms_json_encode_duration_seconds", "Response JSON encode time", ())
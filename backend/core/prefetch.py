@@ -0,0 +1,141 @@
+import time
+import asyncio
+import logging
+from core import redis_io
+
+logger = logging.getLogger("CMS-Prefetch")
+
+
+def diff_files(old: dict, new: dict) -> tuple:
+    """按 blob SHA 对比两个 {path: sha}，返回 (新增或修改的路径, 删除的路径)"""
+    changed = [path for path, sha in new.items() if old.get(path) != sha]
+    removed = [path for path in old if path not in new]
+    return changed, removed
+
+
+class PrefetchWorker:
+    """
+    后台预热详情缓存：
+    - 定时调用 poll() (检查最新 commit，有变化时由调用方按树 diff 入队变更路径)
+    - 队列中的路径由 concurrency 个协程并发调用 warm(path) 写入缓存
+    - 在 Redis 有序集合中记录最近编辑的文章，启动时优先预热这些文章
+    """
+
+    def __init__(self, warm, poll=None, redis_client=None, key: str = "cms:recent",
+                 concurrency: int = 4, interval: float = 60, warm_on_start: int = 50, max_recent: int = 500):
+        self.warm = warm
+        self.poll = poll
+        self.redis = redis_client
+        self.key = key
+        self.concurrency = concurrency
+        self.interval = interval
+        self.warm_on_start = warm_on_start
+        self.max_recent = max_recent
+        # 队列与任务需在事件循环内创建
+        self._queue = None
+        self._queued = set()
+        self._tasks = []
+        self.counters = {"queued": 0, "warmed": 0, "skipped": 0, "errors": 0, "polls": 0}
+
+    # --- 生命周期 ---
+
+    def start(self, startup_paths=None):
+        """startup_paths: 返回启动时需要预热的路径列表的可调用对象 (在索引就绪后调用)"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._consume()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.ensure_future(self._run(startup_paths)))
+        logger.info(f"Prefetch worker started (concurrency={self.concurrency}, interval={self.interval}s)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, startup_paths):
+        if self.poll:
+            await self._poll_once()
+        if startup_paths:
+            try:
+                # 读取最近编辑记录和元数据索引需要访问 Redis，在线程中执行
+                self.enqueue(await asyncio.to_thread(startup_paths))
+            except Exception as e:
+                logger.error(f"Startup warm failed: {e}")
+        if not self.poll or self.interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._poll_once()
+
+    async def _poll_once(self):
+        self.counters["polls"] += 1
+        try:
+            await self.poll()
+        except Exception as e:
+            logger.error(f"Prefetch poll failed: {e}")
+
+    async def _consume(self):
+        while True:
+            path = await self._queue.get()
+            self._queued.discard(path)
+            try:
+                if await self.warm(path):
+                    self.counters["warmed"] += 1
+                else:
+                    self.counters["skipped"] += 1
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.warning(f"Prefetch {path} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    # --- 入队 ---
+
+    def enqueue(self, paths):
+        """入队待预热路径 (已在队列中的路径不会重复入队)；worker 未启动时忽略"""
+        if self._queue is None:
+            return
+        for path in paths:
+            if path not in self._queued:
+                self._queued.add(path)
+                self._queue.put_nowait(path)
+                self.counters["queued"] += 1
+
+    async def join(self):
+        if self._queue is not None:
+            await self._queue.join()
+
+    # --- 最近编辑 ---
+
+    def touch(self, paths):
+        """记录最近编辑的文章 (排队写入 Redis，不等待)"""
+        if not self.redis or not paths:
+            return
+        redis_io.submit(self._touch, list(paths), time.time())
+
+    def _touch(self, paths: list, now: float):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.zadd(self.key, {path: now for path in paths})
+            pipe.zremrangebyrank(self.key, 0, -self.max_recent - 1)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Record recent edits failed: {e}")
+
+    def recent(self, limit: int = None) -> list:
+        if not self.redis:
+            return []
+        try:
+            return self.redis.zrevrange(self.key, 0, (limit or self.warm_on_start) - 1)
+        except Exception as e:
+            logger.error(f"Read recent edits failed: {e}")
+            return []
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "running": bool(self._tasks),
+        }
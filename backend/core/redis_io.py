@@ -0,0 +1,46 @@
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("CMS-Redis")
+
+# redis-py 客户端是同步的：在事件循环中直接调用时，Redis 变慢或不可达会阻塞所有请求 (最长到 socket 超时)。
+# 所有 Redis 操作交给同一个线程按提交顺序执行：先提交的写入一定先于之后的读取完成，
+# 本进程读到的总是自己最近写入的值，其他 worker 收到的通知 (publish) 也不会早于对应的写入
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cms-redis")
+
+
+def _in_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+async def run(fn, *args, **kwargs):
+    """在 Redis 线程中执行 fn 并等待结果 (读取，或调用方需要结果的写入)"""
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def submit(fn, *args, **kwargs):
+    """
+    调用方不需要结果的写入：放入 Redis 线程排队后立即返回。
+    不在事件循环中 (启动阶段、脚本、已经在线程中) 时直接执行。fn 需自行记录失败。
+    """
+    if not _in_loop():
+        fn(*args, **kwargs)
+        return
+    future = _executor.submit(fn, *args, **kwargs)
+    future.add_done_callback(_log_failure)
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error(f"Redis write failed: {future.exception()}")
+
+
+async def drain():
+    """等待已排队的写入完成 (进程退出前调用)"""
+    await run(lambda: None)
@@ -1,7 +1,22 @@
 from pydantic import BaseModel
 from typing import Generic, TypeVar, Optional, Any
 from enum import IntEnum
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from core.metrics import JSON_ENCODE
 import time
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时使用标准库 json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，缺失时只提供 gzip
+    brotli = None
 
 # 1. 定义业务状态码枚举
 class Code(IntEnum):
@@ -10,6 +25,8 @@ class Code(IntEnum):
     UNAUTHORIZED = 401       # 未授权/Token失效
     FORBIDDEN = 403          # 权限不足
     NOT_FOUND = 404          # 资源不存在
+    CONFLICT = 409           # 版本冲突 (基准 SHA 已过期)
+    PRECONDITION_FAILED = 412  # 增量保存的基准内容不可用或校验失败，需上传完整内容
     GITHUB_ERROR = 502       # GitHub API 调用失败
     INTERNAL_ERROR = 500     # 服务器内部错误
 
@@ -57,3 +74,95 @@ def fail(
         "data": data,
         "timestamp": time.time()
     }
+
+# 4. 条件请求 (ETag / If-None-Match)
+def make_etag(version: Optional[str]) -> Optional[str]:
+    """由 commit SHA / blob SHA 生成强 ETag"""
+    return f'"{version}"' if version else None
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    """判断请求头 If-None-Match 是否命中当前 ETag"""
+    header = request.headers.get("if-none-match")
+    if not header or not etag:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def not_modified(etag: str) -> Response:
+    """304 响应：不带 body，也不经过 success() 的 JSON 编码"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+# 5. JSON 编码与预序列化响应
+def dumps(content: Any) -> bytes:
+    """紧凑 UTF-8 JSON 编码：优先 orjson，遇到它不支持的类型时回退标准库"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class TimedJSONResponse(JSONResponse):
+    """默认响应类：用 dumps() 编码并记录 JSON 编码耗时"""
+
+    def render(self, content) -> bytes:
+        with JSON_ENCODE.time():
+            return dumps(content)
+
+
+def accepted_encodings(request: Request) -> set:
+    """解析 Accept-Encoding，忽略 q=0 的编码"""
+    result = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            result.add(name.lower())
+    return result
+
+
+class PrecomputedPayload:
+    """
+    预先序列化好的 data 字段，由调用方按数据版本缓存。
+    命中时把字节直接拼接进 success() 同结构的响应信封，不再经过 jsonable_encoder 和二次编码；
+    gzip / brotli 压缩结果按需生成一次后与之一起缓存，此时信封中的 timestamp 为首次压缩的时间。
+    """
+
+    def __init__(self, data: Any, total: int = None, compress_min: int = 1024):
+        with JSON_ENCODE.time():
+            self.data = dumps(data)
+        self.total = total
+        self.compress_min = compress_min
+        self._compressed = {}
+
+    def body(self, msg: str = "操作成功", sha: str = None, **kwargs) -> bytes:
+        head = dumps({"code": Code.SUCCESS, "msg": msg})[:-1]
+        tail = dumps({"sha": sha, "total": self.total, "timestamp": time.time(), **kwargs})[1:]
+        return b"".join((head, b',"data":', self.data, b",", tail))
+
+    def compressed(self, encoding: str, **kwargs) -> bytes:
+        key = (encoding, dumps(kwargs))
+        body = self._compressed.get(key)
+        if body is None:
+            raw = self.body(**kwargs)
+            body = brotli.compress(raw, quality=5) if encoding == "br" else gzip.compress(raw, 6)
+            self._compressed[key] = body
+        return body
+
+    def response(self, request: Request, headers: dict = None, **kwargs) -> Response:
+        """按 Accept-Encoding 返回压缩或未压缩的响应，kwargs 与 success() 的参数一致"""
+        headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+        encoding = None
+        if len(self.data) >= self.compress_min:
+            accepted = accepted_encodings(request)
+            if brotli is not None and "br" in accepted:
+                encoding = "br"
+            elif "gzip" in accepted:
+                encoding = "gzip"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            content = self.compressed(encoding, **kwargs)
+        else:
+            content = self.body(**kwargs)
+        return Response(content, media_type="application/json", headers=headers)
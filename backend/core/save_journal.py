@@ -0,0 +1,455 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import datetime
+import uuid
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+from redis.exceptions import WatchError
+from core import redis_io
+from core.coordination import file_lock
+
+logger = logging.getLogger("CMS-Journal")
+
+
+def git_blob_sha(text: str) -> str:
+    """按 git 的规则计算 blob SHA，与 GitHub 提交后的 SHA 一致"""
+    data = text.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class SaveConflict(Exception):
+    """
+    基准版本已过期。current 为当前版本的 SHA；已知时附带当前内容 (theirs)
+    和客户端基准版本的内容 (base)，供调用方做三方合并。
+    """
+
+    def __init__(self, msg: str, current: str = None, theirs: str = None, base: str = None):
+        super().__init__(msg)
+        self.current = current
+        self.theirs = theirs
+        self.base = base
+
+
+def _entry_order(entry: dict) -> tuple:
+    """同一路径的两条记录谁更新：先比首次保存时间 (提交后重新开始的条目更晚)，再比序号"""
+    return entry.get("first", 0), entry.get("seq", 0)
+
+
+class LocalSaveStore:
+    """单进程部署：待提交的保存保存在进程内存中"""
+
+    def __init__(self):
+        self._entries = {}  # path -> entry
+        self._committed = OrderedDict()  # 临时 SHA -> 实际提交的 SHA (两者不一致时)
+
+    def get(self, path: str):
+        entry = self._entries.get(path)
+        return dict(entry) if entry else None
+
+    def values(self) -> list:
+        return [dict(e) for e in self._entries.values()]
+
+    def update(self, path: str, fn):
+        """fn(当前条目 | None) 返回新条目，返回 None 表示删除；fn 抛出的异常原样传出"""
+        entry = fn(self.get(path))
+        if entry is None:
+            self._entries.pop(path, None)
+        else:
+            self._entries[path] = entry
+        return entry
+
+    def remember(self, provisional: str, committed: str):
+        self._committed[provisional] = committed
+        while len(self._committed) > 1024:
+            self._committed.popitem(last=False)
+
+    def resolve(self, sha: str) -> str:
+        return self._committed.get(sha, sha)
+
+    @asynccontextmanager
+    async def exclusive(self):
+        yield
+
+
+class RedisSaveStore:
+    """
+    多 worker 部署：待提交的保存放在 Redis hash 中，任一 worker 都能读到其他 worker 接收的保存。
+    修改通过 WATCH/MULTI 乐观重试，提交由 Redis 锁保证同一时间只有一个进程在推送。
+    """
+
+    def __init__(self, redis_client, key_prefix: str = "cms:journal", lock_timeout: float = 120,
+                 lock_poll_max: float = 1.0):
+        self.redis = redis_client
+        self.key_entries = f"{key_prefix}:entries"
+        self.key_committed = f"{key_prefix}:committed"
+        self.key_lock = f"{key_prefix}:lock"
+        self.lock_timeout = lock_timeout
+        self.lock_poll_max = lock_poll_max
+
+    def get(self, path: str):
+        raw = self.redis.hget(self.key_entries, path)
+        return json.loads(raw) if raw else None
+
+    def values(self) -> list:
+        return [json.loads(raw) for raw in self.redis.hvals(self.key_entries)]
+
+    def update(self, path: str, fn):
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key_entries)
+                    raw = pipe.hget(self.key_entries, path)
+                    entry = fn(json.loads(raw) if raw else None)
+                    pipe.multi()
+                    if entry is None:
+                        pipe.hdel(self.key_entries, path)
+                    else:
+                        pipe.hset(self.key_entries, path, json.dumps(entry, ensure_ascii=False))
+                    pipe.execute()
+                    return entry
+                except WatchError:
+                    # 其他 worker 同时修改了队列，基于最新状态重试
+                    continue
+
+    def remember(self, provisional: str, committed: str):
+        self.redis.set(f"{self.key_committed}:{provisional}", committed, ex=86400)
+
+    def resolve(self, sha: str) -> str:
+        return self.redis.get(f"{self.key_committed}:{sha}") or sha
+
+    @asynccontextmanager
+    async def exclusive(self):
+        """
+        跨进程的提交锁 (SET NX PX)，持有者崩溃时锁在 lock_timeout 后过期。
+        SET 在 redis_io 线程中执行；锁被占用时按指数退避等待 (最长 lock_poll_max 秒)，不阻塞事件循环
+        """
+        token = uuid.uuid4().hex
+        delay = 0.05
+        while not await redis_io.run(self.redis.set, self.key_lock, token, nx=True, px=int(self.lock_timeout * 1000)):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.lock_poll_max)
+        try:
+            yield
+        finally:
+            await redis_io.run(self._unlock, token)
+
+    def _unlock(self, token: str):
+        # 只释放自己持有的锁 (过期后可能已被其他进程获得)
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(self.key_lock)
+                if pipe.get(self.key_lock) == token:
+                    pipe.multi()
+                    pipe.delete(self.key_lock)
+                    pipe.execute()
+            except WatchError:
+                pass
+
+
+class SaveJournal:
+    """
+    写后提交 (write-behind) 的保存队列：
+    - 保存立即追加到本地日志文件 (fsync)，返回内容的 blob SHA 作为临时版本，客户端可基于它继续编辑
+    - 同一路径在 debounce 秒内的连续保存合并为一条，最多延迟 max_delay 秒
+    - 后台协程把到期的保存合并为一次 commit (commit_changes)，成功后调用 on_commit 修补索引
+    - 启动时重放日志，未提交的保存不会因进程崩溃丢失
+    基准 SHA 已被其他人修改的保存标记为冲突，保留在日志中等待客户端重新保存。
+    多 worker 部署时传入 RedisSaveStore：所有 worker 共享待提交队列并追加同一个日志文件 (文件锁)，
+    后台协程只在 leader 进程运行，其他 worker 接收保存后通过 on_submit 通知它。
+    """
+
+    def __init__(self, commit_changes, on_commit=None, path: str = "save_journal.jsonl",
+                 debounce: float = 5, max_delay: float = 30, max_retry_delay: float = 300,
+                 store=None, on_submit=None):
+        self.commit_changes = commit_changes
+        self.on_commit = on_commit
+        self.on_submit = on_submit
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_retry_delay = max_retry_delay
+        self.store = store or LocalSaveStore()
+        # 事件与锁需在事件循环内创建
+        self._wake = None
+        self._flush_lock = None
+        self._task = None
+        self.counters = {"saves": 0, "coalesced": 0, "commits": 0, "files": 0, "conflicts": 0, "errors": 0}
+
+    # --- 生命周期 ---
+
+    def start(self):
+        if self._task:
+            return
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.ensure_future(self._run())
+        logger.info(f"Save journal started (debounce={self.debounce}s, pending={self.stats()['pending']})")
+
+    async def stop(self, timeout: float = 30):
+        """停止后台协程，并尽量把未提交的保存推送到 GitHub"""
+        if not self._task:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except Exception as e:
+            logger.error(f"Flush on shutdown failed, {self.stats()['pending']} saves kept in journal: {e}")
+
+    def wake(self):
+        """有新的保存 (可能来自其他 worker)，重新计算下一次提交时间"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                delay = self._next_due()
+            except Exception as e:
+                logger.error(f"Read pending saves failed: {e}")
+                delay = self.max_delay
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                due = self._due_paths()
+                if due:
+                    await self.flush(due)
+            except Exception as e:
+                logger.error(f"Flush pending saves failed: {e}", exc_info=True)
+
+    # --- 日志文件 ---
+
+    def load(self) -> int:
+        """重放日志 (每条记录为某路径的完整状态，同一路径取最新的一条)，返回待提交的保存数"""
+        if not os.path.exists(self.path):
+            return 0
+        latest = {}
+        with file_lock(self.lock_path), open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 崩溃时写了一半的最后一行
+                    logger.warning("Skipped corrupt journal line")
+                    continue
+                entry.pop("retry_at", None)
+                # 多个 worker 并发追加时行序不一定等于保存顺序
+                known = latest.get(entry["path"])
+                if known is None or _entry_order(entry) >= _entry_order(known):
+                    latest[entry["path"]] = entry
+        for path, entry in latest.items():
+            # 共享队列中已有更新的状态时以队列为准
+            self.store.update(path, lambda current, entry=entry: (
+                entry if current is None or _entry_order(entry) > _entry_order(current) else current
+            ))
+        if latest:
+            logger.info(f"Replayed {len(latest)} pending saves from {self.path}")
+        return len(latest)
+
+    def _append(self, line: str):
+        with file_lock(self.lock_path):
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _compact(self):
+        """用当前待提交的保存重写日志 (先写临时文件再替换)"""
+        with file_lock(self.lock_path):
+            entries = self.store.values()
+            if not entries:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+
+    # --- 保存 ---
+
+    def resolve(self, sha: str) -> str:
+        """临时 SHA 提交后与实际 SHA 不一致时返回实际 SHA"""
+        return self.store.resolve(sha)
+
+    async def submit(self, path: str, content: str, sha: str = None, message: str = None, current: str = None) -> dict:
+        """
+        接收一次保存。sha 为客户端的基准版本 (可以是之前返回的临时 SHA)，current 为索引中的已提交 SHA。
+        返回日志条目；基准版本已过期时抛出 SaveConflict。
+        """
+        sha = self.resolve(sha) if sha else None
+        now = time.time()
+        coalesced = False
+
+        def apply(entry):
+            nonlocal coalesced
+            if entry and not entry.get("conflict"):
+                if sha and sha != entry["sha"]:
+                    raise SaveConflict("版本冲突：该文章有尚未同步的其他修改", entry["sha"], theirs=entry["content"])
+                entry.update(content=content, sha=git_blob_sha(content), last=now, seq=entry["seq"] + 1)
+                if message:
+                    entry["message"] = message
+                coalesced = True
+                return entry
+            coalesced = False
+            if entry and sha == entry["sha"]:
+                # 客户端基于未能提交的内容继续编辑，它就是合并的基准
+                raise SaveConflict(
+                    "版本冲突：上一次自动保存未能同步，请刷新后重新编辑",
+                    entry["conflict"].get("current"), base=entry["content"],
+                )
+            if sha and current and sha != current:
+                raise SaveConflict("版本冲突：GitHub 上的文章已被修改", current)
+            return {
+                "path": path,
+                "content": content,
+                "sha": git_blob_sha(content),
+                "base": sha or current,
+                "message": message,
+                "first": now,
+                "last": now,
+                "seq": 1,
+                "conflict": None,
+            }
+
+        entry = self.store.update(path, apply)
+        self.counters["saves"] += 1
+        if coalesced:
+            self.counters["coalesced"] += 1
+        await asyncio.to_thread(self._append, json.dumps(entry, ensure_ascii=False) + "\n")
+        self.wake()
+        if self.on_submit:
+            self.on_submit(entry)
+        return entry
+
+    def get(self, path: str):
+        """待提交 (未冲突) 的保存，供读取接口返回最新内容"""
+        entry = self.store.get(path)
+        return entry if entry and not entry.get("conflict") else None
+
+    # --- 提交 ---
+
+    def _due_paths(self) -> list:
+        now = time.time()
+        return [
+            e["path"] for e in self.store.values()
+            if not e.get("conflict") and now >= e.get("retry_at", 0)
+            and (now - e["last"] >= self.debounce or now - e["first"] >= self.max_delay)
+        ]
+
+    def _next_due(self) -> float:
+        due = [
+            max(min(e["last"] + self.debounce, e["first"] + self.max_delay), e.get("retry_at", 0))
+            for e in self.store.values() if not e.get("conflict")
+        ]
+        if not due:
+            return self.max_delay
+        return min(max(min(due) - time.time(), 0.05), self.max_delay)
+
+    async def flush(self, paths=None):
+        """立即提交指定路径 (默认全部) 的保存；重命名、删除等操作前调用，保证基于最新版本"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock, self.store.exclusive():
+            targets = [
+                e for e in self.store.values()
+                if not e.get("conflict") and (paths is None or e["path"] in paths)
+            ]
+            if targets:
+                await self._commit(targets)
+
+    async def _commit(self, entries: list):
+        snapshot = {e["path"]: e for e in entries}
+        while snapshot:
+            changes = [{"path": p, "content": e["content"], "sha": e["base"]} for p, e in snapshot.items()]
+            try:
+                res = await self.commit_changes(changes, message=self._message(list(snapshot.values())))
+            except Exception as e:
+                self.counters["errors"] += 1
+                for path in snapshot:
+                    self.store.update(path, self._backoff)
+                logger.error(f"Flush {len(snapshot)} saves failed, will retry: {e}")
+                return
+            if not res["conflicts"]:
+                break
+            for conflict in res["conflicts"]:
+                path = conflict["path"]
+                if conflict["current"] == snapshot[path]["sha"]:
+                    # 崩溃恢复时重放了已经提交过的保存
+                    self._done(path, snapshot.pop(path), conflict["current"])
+                    continue
+                self.counters["conflicts"] += 1
+                self.store.update(path, lambda entry, conflict=conflict: entry and {**entry, "conflict": conflict})
+                snapshot.pop(path)
+                logger.warning(f"Pending save conflicts with GitHub: {path} ({conflict['reason']})")
+        else:
+            await asyncio.to_thread(self._compact)
+            return
+
+        self.counters["commits"] += 1
+        self.counters["files"] += len(res["files"])
+        if self.on_commit:
+            self.on_commit(res["commit"], res["files"], {p: e["content"] for p, e in snapshot.items()})
+        for path, entry in snapshot.items():
+            self._done(path, entry, res["files"][path])
+        logger.info(f"Flushed {len(snapshot)} saves in commit {res['commit']['sha'][:7]}")
+        await asyncio.to_thread(self._compact)
+
+    def _backoff(self, entry):
+        if not entry or entry.get("conflict"):
+            return entry
+        retries = entry.get("retries", 0) + 1
+        return {**entry, "retries": retries, "retry_at": time.time() + min(2 ** retries, self.max_retry_delay)}
+
+    def _done(self, path: str, entry: dict, committed: str):
+        if committed != entry["sha"]:
+            self.store.remember(entry["sha"], committed)
+
+        def apply(current):
+            if current is None or current["seq"] == entry["seq"]:
+                return None
+            # 提交期间又有新的保存，它的基准变为刚提交的版本
+            current["base"] = committed
+            current.pop("retries", None)
+            current.pop("retry_at", None)
+            return current
+
+        self.store.update(path, apply)
+
+    @staticmethod
+    def _message(entries: list) -> str:
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+        if len(entries) == 1:
+            entry = entries[0]
+            return entry["message"] or f"CMS Update: {os.path.basename(entry['path'])} ({now})"
+        return f"CMS Autosave: {len(entries)} files ({now})"
+
+    # --- 状态 ---
+
+    def entries(self) -> list:
+        return [
+            {k: v for k, v in e.items() if k != "content"}
+            for e in sorted(self.store.values(), key=lambda e: e["first"])
+        ]
+
+    def stats(self) -> dict:
+        entries = self.store.values()
+        return {
+            **self.counters,
+            "pending": sum(1 for e in entries if not e.get("conflict")),
+            "conflicted": sum(1 for e in entries if e.get("conflict")),
+            "running": self._task is not None,
+        }
@@ -0,0 +1,256 @@
+import re
+import html
+import math
+import heapq
+import logging
+import threading
+from array import array
+from collections import Counter
+from core.parser import parse_markdown
+
+logger = logging.getLogger("CMS-Search")
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[a-z0-9]+(?:['’-][a-z0-9]+)*")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+
+
+def tokenize(text: str, unigrams: bool = False) -> list:
+    """
+    中文按相邻二元组 (bigram) 切分，无需词典也能匹配任意词语；
+    英文/数字按单词切分并转小写。单个汉字组成的片段按单字保留。
+    unigrams=True (建索引时) 额外输出每个汉字，使单字查询 (中文里很常见) 也能命中；
+    查询时不输出单字，多字查询仍只按二元组打分。
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+                if unigrams:
+                    tokens.extend(run)
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def document_text(content: str) -> str:
+    """标题 + 正文作为索引文本 (不含其他 front-matter 字段)"""
+    try:
+        parsed = parse_markdown(content)
+    except Exception:
+        return content
+    title = parsed["metadata"].get("title")
+    return f"{title}\n{parsed['content']}" if title else parsed["content"]
+
+
+class SearchIndex:
+    """
+    基于 BM25 的倒排索引，文档以 blob SHA 为单位 (内容不可变，增量更新只需处理新 SHA)。
+    - 倒排表为 term -> (文档号数组, 词频数组)，使用 array 存储以控制 1 万篇以上时的内存
+    - 删除只打墓碑标记，墓碑占比超过 compact_ratio 时整体重建
+    - 持久化正文文本到 Redis 哈希，重启后本地重建倒排表，不需要重新从 GitHub 读取 blob
+    load / add_many / prune 耗时与文档数成正比，调用方应在线程中执行 (只允许一个写入方)；
+    写入时每篇文档只短暂持锁，加载和压缩先构建新的倒排表再整体替换，查询不会等待整个构建过程
+    """
+
+    def __init__(self, redis_client=None, key: str = "cms:search:docs",
+                 k1: float = 1.2, b: float = 0.75, compact_ratio: float = 0.25):
+        self.redis = redis_client
+        self.key = key
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._ids = {}            # sha -> 文档号
+        self._shas = []           # 文档号 -> sha (None 为已删除)
+        self._texts = []          # 文档号 -> 文本 (用于摘要)
+        self._lengths = array("I")
+        self._postings = {}       # term -> (array 文档号, array 词频)
+        self._total_length = 0
+        self._deleted = 0
+        self._norms = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    # --- 构建 ---
+
+    def load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.redis:
+            return
+        try:
+            stored = self.redis.hgetall(self.key)
+        except Exception as e:
+            logger.error(f"Load search index failed: {e}")
+            return
+        self._rebuild(stored.items())
+        logger.info(f"Search index loaded: {len(self._ids)} docs, {len(self._postings)} terms")
+
+    def missing(self, shas) -> list:
+        self.load()
+        return [sha for sha in set(shas) if sha not in self._ids]
+
+    def _add(self, sha: str, text: str):
+        if sha in self._ids:
+            return
+        # 分词不持锁，只有写入倒排表时持锁
+        terms = Counter(tokenize(text, unigrams=True))
+        length = sum(terms.values())
+        with self._lock:
+            doc = len(self._shas)
+            self._ids[sha] = doc
+            self._shas.append(sha)
+            self._texts.append(text)
+            self._lengths.append(length)
+            self._total_length += length
+            for term, tf in terms.items():
+                posting = self._postings.get(term)
+                if posting is None:
+                    posting = self._postings[term] = (array("I"), array("I"))
+                posting[0].append(doc)
+                posting[1].append(tf)
+            self._norms = None
+
+    def _rebuild(self, docs):
+        """在独立的实例上构建 docs ([(sha, 文本)]) 的倒排表，完成后整体替换当前状态"""
+        fresh = SearchIndex(k1=self.k1, b=self.b, compact_ratio=self.compact_ratio)
+        for sha, text in docs:
+            fresh._add(sha, text)
+        with self._lock:
+            self._ids, self._shas, self._texts = fresh._ids, fresh._shas, fresh._texts
+            self._lengths, self._postings = fresh._lengths, fresh._postings
+            self._total_length, self._deleted, self._norms = fresh._total_length, 0, None
+
+    def add_many(self, contents: dict):
+        """contents 为 {blob_sha: markdown 文本}"""
+        texts = {sha: document_text(raw) for sha, raw in contents.items() if sha not in self._ids}
+        for sha, text in texts.items():
+            self._add(sha, text)
+        if not self.redis or not texts:
+            return
+        try:
+            self.redis.hset(self.key, mapping=texts)
+        except Exception as e:
+            logger.error(f"Persist search index failed: {e}")
+
+    def prune(self, live_shas):
+        """移除已不被任何文章引用的文档"""
+        stale = [sha for sha in list(self._ids) if sha not in live_shas]
+        with self._lock:
+            for sha in stale:
+                doc = self._ids.pop(sha)
+                self._shas[doc] = None
+                self._texts[doc] = None
+                self._total_length -= self._lengths[doc]
+                self._deleted += 1
+            if stale:
+                self._norms = None
+        if stale and self._deleted > self.compact_ratio * max(len(self._ids), 1):
+            self._compact()
+        if self.redis and stale:
+            try:
+                self.redis.hdel(self.key, *stale)
+            except Exception as e:
+                logger.error(f"Prune search index failed: {e}")
+
+    def _compact(self):
+        live = [(sha, text) for sha, text in zip(self._shas, self._texts) if sha is not None]
+        self._rebuild(live)
+        logger.info(f"Search index compacted: {len(self._ids)} docs")
+
+    # --- 查询 ---
+
+    def _doc_norms(self):
+        """BM25 长度归一化项 k1 * (1 - b + b * dl / avgdl)，文档集合变化后重算"""
+        if self._norms is None:
+            avgdl = self._total_length / len(self._ids) if self._ids else 1.0
+            k1, b = self.k1, self.b
+            self._norms = [k1 * (1 - b + b * dl / (avgdl or 1.0)) for dl in self._lengths]
+        return self._norms
+
+    def score(self, query: str) -> dict:
+        """返回 {sha: BM25 分数}，多个词之间为 OR 语义"""
+        terms = set(tokenize(query))
+        with self._lock:
+            return self._score(terms)
+
+    def _score(self, terms: set) -> dict:
+        if not terms or not self._ids:
+            return {}
+        n = len(self._ids)
+        norms = self._doc_norms()
+        k1 = self.k1
+        shas = self._shas
+        scores = {}
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            docs, tfs = posting
+            df = len(docs)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for doc, tf in zip(docs, tfs):
+                if shas[doc] is None:
+                    continue
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / (tf + norms[doc])
+        return {shas[doc]: s for doc, s in scores.items()}
+
+    def search(self, query: str, files: dict, page: int = 1, page_size: int = 20,
+               snippet_chars: int = 120):
+        """
+        在 {path: blob_sha} 范围内检索，返回 (当前页结果, 命中总数)。
+        只为当前页生成带 <mark> 高亮的摘要。
+        """
+        scores = self.score(query)
+        if not scores:
+            return [], 0
+        hits = [(scores[sha], path, sha) for path, sha in files.items() if sha in scores]
+        top = heapq.nlargest(page * page_size, hits)[(page - 1) * page_size:]
+        pattern = self._highlight_pattern(query)
+        with self._lock:
+            texts = [self._texts[self._ids[sha]] if sha in self._ids else "" for _, _, sha in top]
+        items = [
+            {
+                "path": path,
+                "sha": sha,
+                "score": round(score, 4),
+                "snippet": self._snippet(text, pattern, snippet_chars),
+            }
+            for (score, path, sha), text in zip(top, texts)
+        ]
+        return items, len(hits)
+
+    @staticmethod
+    def _highlight_pattern(query: str):
+        words = sorted({t for t in tokenize(query)}, key=len, reverse=True)
+        if not words:
+            return None
+        return re.compile("|".join(re.escape(w) for w in words), re.IGNORECASE)
+
+    @staticmethod
+    def _snippet(text: str, pattern, width: int) -> str:
+        text = " ".join(text.split())
+        match = pattern.search(text) if pattern else None
+        start = max(match.start() - width // 3, 0) if match else 0
+        window = text[start:start + width]
+        parts, last = [], 0
+        if pattern:
+            for m in pattern.finditer(window):
+                parts.append(html.escape(window[last:m.start()]))
+                parts.append(f"<mark>{html.escape(m.group())}</mark>")
+                last = m.end()
+        parts.append(html.escape(window[last:]))
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if start + width < len(text) else ""
+        # 相邻的二元组命中合并为一段高亮
+        return prefix + "".join(parts).replace("</mark><mark>", "") + suffix
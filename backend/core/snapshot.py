@@ -0,0 +1,253 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import asyncio
+import logging
+from core.response import dumps, brotli
+from core.metadata_index import extract_metadata
+
+logger = logging.getLogger("CMS-Snapshot")
+
+
+def is_public(path: str) -> bool:
+    return path.startswith("src/posts/") and path.endswith(".md")
+
+
+class SnapshotExporter:
+    """
+    按 commit 导出不可变的静态快照，供 nginx 直接提供读请求 (不经过 Python)：
+        {root}/current -> versions/{commit}      (符号链接，原子切换)
+        versions/{commit}/articles.json          与 /api/articles 相同的响应
+        versions/{commit}/metadata.json          {path: front-matter}
+        versions/{commit}/detail/{path}.json     与 /api/article/detail 相同的响应 (仅已发布文章，不含草稿)
+        versions/{commit}/manifest.json          {path: {sha, meta}}，用于下一次增量构建
+        {root}/PENDING                           存在时快照落后于编辑 (写后提交未完成或新 commit 尚未导出)，
+                                                 nginx 据此把文章列表交给后端
+    每个 JSON 旁边都有预压缩的 .gz (安装 brotli 时还有 .br)。blob SHA 未变化的文章直接硬链接上一版快照的文件，
+    只有变化的文章需要读取内容和重新渲染。
+    """
+
+    def __init__(self, root: str, source, load_content, keep: int = 3, concurrency: int = 8, pending=None,
+                 recheck: float = 5):
+        """
+        source(): 返回当前状态 (commit, articles 响应字节, {path: blob sha})，commit 为空表示版本未确认
+        load_content(sha): 协程，返回 blob 文本
+        pending(): 返回尚未提交的保存数量，不为 0 时保留 PENDING 标记
+        recheck: 没有新版本时每隔多少秒检查一次能否移除标记 (其他 worker 留下的、或未产生 commit 就结束的保存)
+        """
+        self.root = root
+        self.source = source
+        self.load_content = load_content
+        self.keep = keep
+        self.concurrency = concurrency
+        self.versions = os.path.join(root, "versions")
+        self.current = os.path.join(root, "current")
+        self.marker = os.path.join(root, "PENDING")
+        self.pending = pending
+        self.recheck = recheck
+        # 事件与任务需在事件循环内创建
+        self._wake = None
+        self._task = None
+        self.counters = {"builds": 0, "rendered": 0, "linked": 0, "errors": 0, "last_seconds": 0.0}
+        self.exported = None
+
+    # --- 生命周期 ---
+
+    def start(self):
+        if self._task:
+            return
+        self._wake = asyncio.Event()
+        self._wake.set()
+        self._task = asyncio.ensure_future(self._run())
+        logger.info(f"Snapshot exporter started ({self.root})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def schedule(self):
+        """索引版本变化后调用；构建在后台进行，连续的变化只会导出最新版本"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.recheck)
+            except asyncio.TimeoutError:
+                await self._release(self.exported)
+                continue
+            self._wake.clear()
+            commit, articles_body, files = self.source()
+            if not commit:
+                continue
+            try:
+                if commit != self.exported:
+                    await self.export(commit, articles_body, files)
+                await self._release(commit)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"Snapshot export {commit[:7]} failed: {e}", exc_info=True)
+
+    # --- 落后标记 ---
+
+    def hold(self):
+        """
+        编辑已被接受但快照还不包含它 (写后提交排队中、或刚提交的 commit 尚未导出) 时调用，
+        任一 worker 都可以调用；标记由 leader 在快照追上之后移除
+        """
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.marker, "a"):
+                pass
+        except OSError as e:
+            logger.warning(f"Failed to mark snapshot as pending: {e}")
+
+    async def _release(self, commit: str):
+        """快照已是当前版本、且没有待提交的保存时移除标记"""
+        if not commit or self.exported != commit:
+            return
+        try:
+            if self.pending and self.pending():
+                return
+            await asyncio.to_thread(self._remove_marker)
+        except Exception as e:
+            logger.warning(f"Failed to release snapshot marker: {e}")
+
+    def _remove_marker(self):
+        try:
+            os.remove(self.marker)
+        except FileNotFoundError:
+            pass
+
+    # --- 构建 ---
+
+    async def export(self, commit: str, articles_body: bytes, files: dict):
+        start = time.perf_counter()
+        files = {path: sha for path, sha in files.items() if is_public(path)}
+        previous = await asyncio.to_thread(self._read_manifest)
+        changed = [path for path, sha in files.items() if previous.get(path, {}).get("sha") != sha]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(path):
+            async with semaphore:
+                return path, await self.load_content(files[path])
+
+        contents = dict(await asyncio.gather(*(fetch(path) for path in changed)))
+        rendered, linked = await asyncio.to_thread(self._write, commit, articles_body, files, contents, previous)
+
+        self.exported = commit
+        self.counters["builds"] += 1
+        self.counters["rendered"] += rendered
+        self.counters["linked"] += linked
+        self.counters["last_seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(f"Snapshot {commit[:7]} exported: {rendered} rendered, {linked} reused, {self.counters['last_seconds']}s")
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(os.path.join(self.current, "manifest.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_json(self, path: str, body: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(body)
+        with open(f"{path}.gz", "wb") as f:
+            f.write(gzip.compress(body, 9))
+        if brotli is not None:
+            with open(f"{path}.br", "wb") as f:
+                f.write(brotli.compress(body, quality=9))
+
+    def _link_json(self, src: str, dst: str) -> bool:
+        """从上一版快照硬链接 (不支持时复制)；源文件缺失时返回 False"""
+        if not os.path.exists(src):
+            return False
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        for suffix in ("", ".gz", ".br"):
+            if not os.path.exists(src + suffix):
+                continue
+            try:
+                os.link(src + suffix, dst + suffix)
+            except OSError:
+                shutil.copy2(src + suffix, dst + suffix)
+        return True
+
+    def _write(self, commit: str, articles_body: bytes, files: dict, contents: dict, previous: dict) -> tuple:
+        target = os.path.join(self.versions, commit)
+        if os.path.isdir(target):
+            # 同一 commit 已导出过 (如进程重启)，只需切换
+            self._activate(commit)
+            return 0, len(files)
+        tmp = f"{target}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        prev_dir = os.path.realpath(self.current)
+
+        manifest, rendered, linked = {}, 0, 0
+        for path, sha in files.items():
+            name = os.path.join("detail", f"{path}.json")
+            prev = previous.get(path)
+            if path not in contents and prev:
+                # 未变化：草稿只沿用清单记录，已发布文章复用上一版的文件
+                if prev["meta"]["draft"] or self._link_json(os.path.join(prev_dir, name), os.path.join(tmp, name)):
+                    manifest[path] = prev
+                    linked += 0 if prev["meta"]["draft"] else 1
+                    continue
+            content = contents.get(path)
+            if content is None:
+                # 上一版快照的文件丢失，无法复用也没有内容，跳过等待下次构建
+                continue
+            meta = extract_metadata(content)
+            manifest[path] = {"sha": sha, "meta": meta}
+            if meta["draft"]:
+                continue
+            self._write_json(os.path.join(tmp, name), dumps({
+                "code": 200,
+                "msg": "操作成功",
+                "data": {"path": path, "title": os.path.basename(path), "content": content},
+                "sha": sha,
+                "meta": meta,
+            }))
+            rendered += 1
+
+        self._write_json(os.path.join(tmp, "articles.json"), articles_body)
+        self._write_json(os.path.join(tmp, "metadata.json"), dumps({
+            p: m["meta"] for p, m in manifest.items() if not m["meta"]["draft"]
+        }))
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        with open(os.path.join(tmp, "VERSION"), "w") as f:
+            f.write(commit + "\n")
+
+        os.rename(tmp, target)
+        self._activate(commit)
+        self._prune(commit)
+        return rendered, linked
+
+    def _activate(self, commit: str):
+        """用相对路径符号链接指向新版本，rename 覆盖旧链接是原子操作"""
+        link = f"{self.current}.tmp-{os.getpid()}"
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(os.path.join("versions", commit), link)
+        os.replace(link, self.current)
+
+    def _prune(self, keep_commit: str):
+        """保留最近 keep 个版本，正在读取旧版本的请求不受影响"""
+        versions = [
+            os.path.join(self.versions, name) for name in os.listdir(self.versions)
+            if ".tmp-" not in name and name != keep_commit
+        ]
+        versions.sort(key=os.path.getmtime, reverse=True)
+        for old in versions[max(self.keep - 1, 0):]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {**self.counters, "exported": self.exported, "root": self.root, "held": os.path.exists(self.marker)}
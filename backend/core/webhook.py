@@ -0,0 +1,32 @@
+import hmac
+import hashlib
+
+# GitHub push 事件最多携带 20 个 commit，超过时 payload 中的文件列表不完整
+PUSH_PAYLOAD_COMMIT_LIMIT = 20
+
+
+def verify_signature(secret: str, body: bytes, signature: str) -> bool:
+    """校验 X-Hub-Signature-256 (HMAC-SHA256)"""
+    if not secret or not signature or not signature.startswith("sha256="):
+        return False
+    expected = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def summarize_push(payload: dict):
+    """
+    按提交顺序汇总 push 中每个路径的最终状态。
+    返回 (changed, removed, complete)：complete 为 False 表示文件列表可能不全
+    (强制推送或 commit 数超过 payload 上限)，调用方应整体失效。
+    """
+    changed, removed = set(), set()
+    commits = payload.get("commits") or []
+    for commit in commits:
+        for path in commit.get("added", []) + commit.get("modified", []):
+            changed.add(path)
+            removed.discard(path)
+        for path in commit.get("removed", []):
+            removed.add(path)
+            changed.discard(path)
+    complete = not payload.get("forced") and len(commits) < PUSH_PAYLOAD_COMMIT_LIMIT
+    return changed, removed, complete
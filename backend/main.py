@@ -1,23 +1,47 @@
 import os
+import re
+import json
+import time
+import asyncio
 import datetime
-import base64
 import logging
-import json
 import redis
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from contextlib import asynccontextmanager
+from redis.retry import Retry
+from redis.backoff import NoBackoff
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Tuple
 from dotenv import load_dotenv
-from core.response import success, fail, Code
+from core.response import (
+    success, fail, Code, make_etag, etag_matches, not_modified, TimedJSONResponse, PrecomputedPayload
+)
+from core import metrics, redis_io
 
 # 导入自定义工具类
-from core.github_client import GitHubClient
-from core.image_uploader import TelegramUploader
+from core.async_github_client import AsyncGitHubClient
+from core.github_scheduler import background, GitHubUnavailable
+from core.image_uploader import TelegramUploader, UploadError
+from core.image_processor import ImageProcessor
+from core.article_index import ArticleIndex, is_article
+from core.metadata_index import MetadataIndex
+from core.search_index import SearchIndex
+from core.webhook import verify_signature, summarize_push
+from core.cache import TwoTierCache
+from core.prefetch import PrefetchWorker, diff_files
+from core.content_store import ContentStore
+from core.save_journal import SaveJournal, SaveConflict, RedisSaveStore, git_blob_sha
+from core.coordination import EventBus, LeaderElection
+from core.merge import merge3
+from core.delta import apply_patch, PatchError
+from core.snapshot import SnapshotExporter
+from core.change_feed import ChangeFeed, describe_changes
 from core.auth import (
     LoginRequest, PasswordChangeRequest, Token,
-    verify_password, get_stored_hash, create_access_token,
-    update_password, get_current_user, init_auth_file,
+    verify_password_async, get_stored_hash_async, create_access_token,
+    update_password_async, get_current_user, init_auth_file, forget_stored_hash,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from fastapi import Depends, status
@@ -26,9 +50,6 @@ from datetime import timedelta
 # 1. 加载配置
 load_dotenv()
 
-# 初始化 Auth 文件
-init_auth_file()
-
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -41,61 +62,502 @@ logging.basicConfig(
 )
 logger = logging.getLogger("CMS-Backend")
 
+class RedactTokenFilter(logging.Filter):
+    """EventSource 只能通过查询参数传 token (/api/events?token=...)：访问日志中隐去，避免登录凭证落盘"""
+    pattern = re.compile(r"([?&]token=)[^&\s]+")
+
+    def filter(self, record):
+        args = record.args
+        if isinstance(args, tuple) and len(args) >= 3 and "token=" in str(args[2]):
+            record.args = args[:2] + (self.pattern.sub(r"\1***", str(args[2])),) + args[3:]
+        return True
+
+logging.getLogger("uvicorn.access").addFilter(RedactTokenFilter())
+
 # 2. 实例化 FastAPI
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """进程启动与关闭 (start_workers / close_clients 定义在下方)"""
+    await start_workers()
+    try:
+        yield
+    finally:
+        await close_clients()
+
+app = FastAPI(default_response_class=TimedJSONResponse, lifespan=lifespan)
 
 # 3. 初始化工具类
-client = GitHubClient()
+client = AsyncGitHubClient()
 uploader = TelegramUploader()
 
 # Redis 初始化
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+# 连接超时有上限：Redis 不可达时启动最多等待这么久，而不是系统默认的 TCP 超时
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 1))
+# 单次读写的超时：Redis 变慢或中途断开时，操作最多等待这么久后按未命中 / 写入失败处理
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 1))
 try:
-    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
-    redis_client.ping()
+    # 启动探测只连接一次：redis-py 默认会对连接失败退避重试数秒，Redis 不可用时会拖慢每个 worker 的启动
+    with redis.Redis(
+        host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        retry=Retry(NoBackoff(), 0),
+    ) as probe:
+        probe.ping()
+    redis_client = redis.Redis(
+        host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT, socket_timeout=REDIS_SOCKET_TIMEOUT,
+    )
     logger.info(f"Redis connected at {REDIS_HOST}:{REDIS_PORT}")
 except Exception as e:
     logger.warning(f"Redis connection failed: {e}. Caching will be disabled.")
     redis_client = None
 
 # 缓存配置
-CACHE_TTL_ARTICLES = 3600  # 1 hour
-CACHE_TTL_DETAIL = 86400   # 24 hours
-CACHE_KEY_VERSION = "cms:version"
-CACHE_KEY_ARTICLES = "cms:articles"
+# 配置了 GitHub Webhook 后，外部提交会主动推送失效，TTL 可以大幅放宽
+WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
+WEBHOOK_PATCH_LIMIT = int(os.getenv("WEBHOOK_PATCH_LIMIT", 20))
+CACHE_TTL_VERSION = 3600 if WEBHOOK_SECRET else 300      # 1 hour / 5 minutes
+CACHE_KEY_VERSION = "version"
 
-def get_cache(key: str):
-    if not redis_client: return None
-    try:
-        return redis_client.get(key)
-    except Exception as e:
-        logger.error(f"Redis get failed: {e}")
-        return None
+# 文章内容按 blob SHA 存储 (不可变，无需 TTL)；压缩数据需要不做 utf-8 解码的 Redis 连接
+blob_redis = redis.Redis(
+    host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+) if redis_client else None
+content_store = ContentStore(
+    blob_redis,
+    max_bytes=int(os.getenv("CONTENT_STORE_MAX_BYTES", 256 * 1024 * 1024)),
+    local_max_bytes=int(os.getenv("CONTENT_STORE_LOCAL_MAX_BYTES", 32 * 1024 * 1024)),
+    compression=os.getenv("CONTENT_COMPRESSION"),
+)
+
+# 文章树索引 (按 commit SHA 持久化到 Redis)
+article_index = ArticleIndex(redis_client)
+# front-matter 元数据索引 (按 blob SHA 持久化到 Redis)
+metadata_index = MetadataIndex(redis_client)
+# 全文检索倒排索引 (按 blob SHA 增量更新，正文持久化到 Redis)
+search_index = SearchIndex(redis_client)
+# 图片去重 + 缩放转码，位于图床上传之前
+image_processor = ImageProcessor(uploader, redis_client)
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", 60))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", 4))
+PREFETCH_WARM_ON_START = int(os.getenv("PREFETCH_WARM_ON_START", 50))
+METADATA_FETCH_CONCURRENCY = int(os.getenv("METADATA_FETCH_CONCURRENCY", 8))
+# 元数据 / 全文索引在后台补齐：请求最多等待 BLOB_INDEX_WAIT 秒 (足够补齐刚保存的少量文章)，
+# 之后直接使用不完整的索引；补齐失败 (如 GitHub 额度不足) 后至少间隔 BLOB_INDEX_RETRY 秒再重试
+BLOB_INDEX_WAIT = float(os.getenv("BLOB_INDEX_WAIT", 0.5))
+BLOB_INDEX_RETRY = float(os.getenv("BLOB_INDEX_RETRY", 60))
+# 每读取这么多 blob 写入一次索引，冷启动时结果逐步可用
+BLOB_INDEX_BATCH = 200
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", 1024))
+# 写后提交：保存先写入本地日志，合并后由后台批量提交到 GitHub
+SAVE_WRITE_BEHIND = os.getenv("SAVE_WRITE_BEHIND", "true").lower() == "true"
+SAVE_DEBOUNCE = float(os.getenv("SAVE_DEBOUNCE", 5))
+SAVE_MAX_DELAY = float(os.getenv("SAVE_MAX_DELAY", 30))
+SAVE_JOURNAL_FILE = os.getenv(
+    "SAVE_JOURNAL_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "save_journal.jsonl")
+)
+# 多 worker 部署 (uvicorn --workers / gunicorn 均读取 WEB_CONCURRENCY)：
+# 后台任务只在 leader 进程运行，内存缓存通过 Redis pub/sub 互相通知失效
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+MULTI_WORKER = WEB_CONCURRENCY > 1
+LEADER_LOCK_FILE = os.getenv(
+    "LEADER_LOCK_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "leader.lock")
+)
+if MULTI_WORKER and not redis_client and SAVE_WRITE_BEHIND:
+    # 没有 Redis 时各 worker 无法共享待提交队列
+    logger.warning("Multi-worker mode without Redis: write-behind saves disabled, saves commit synchronously")
+    SAVE_WRITE_BEHIND = False
+# 预序列化的文章列表 (revision, PrecomputedPayload)，索引变化后重新生成
+_list_payload = None
+# 静态快照：每个新 commit 导出文章列表和详情 JSON，供 nginx 直接提供读请求
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "false").lower() == "true"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "snapshot"))
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", 3))
+# 变更推送 (/api/events)：每个 worker 最多保持的事件流连接数，以及心跳间隔 (需小于反向代理的读超时)
+FEED_MAX_CONNECTIONS = int(os.getenv("FEED_MAX_CONNECTIONS", 5000))
+FEED_HEARTBEAT = float(os.getenv("FEED_HEARTBEAT", 25))
+# 保存时基准版本过期的三方合并结果计数
+save_merges = {"clean": 0, "conflict": 0, "unavailable": 0}
+# 增量保存结果计数：成功应用 / 基准不在缓存中 / 补丁无效或校验不一致 (后两者由客户端改为上传完整内容)
+save_deltas = {"applied": 0, "missing_base": 0, "mismatch": 0}
+# 后台补齐 blob 索引的任务 (同一时间只有一个)、已完整索引的文章索引 revision、失败后的重试时间
+_blob_index_task = None
+_blob_indexed_revision = None
+_blob_index_retry_at = 0.0
+# 进行中的全量树重建 {version: task}：同一版本只拉取一次，其余请求等待其结果
+_index_rebuilds = {}
+
+# 两级缓存：进程内 LRU + Redis，带 single-flight 与 stale-while-revalidate
+cache = TwoTierCache(
+    redis_client,
+    max_entries=int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", 2048)),
+    max_bytes=int(os.getenv("CACHE_LOCAL_MAX_BYTES", 64 * 1024 * 1024)),
+    namespace="cms",
+)
+
+async def get_current_version():
+    """读取当前数据版本号 (Latest Commit SHA)，优先走缓存"""
+    # 过期后 1 分钟内先返回旧版本并后台刷新
+    version, _ = await cache.get_or_fill(
+        CACHE_KEY_VERSION, client.get_latest_commit_sha, ttl=CACHE_TTL_VERSION, stale_ttl=60
+    )
+    if version is None:
+        # GitHub 不可用 (熔断、额度耗尽或请求失败)：沿用已知的最新版本，读请求继续由索引和内容存储提供
+        version = article_index.commit_sha or await article_index.stored_commit()
+    return version
+
+async def ensure_index(force: bool = False) -> bool:
+    """
+    确保文章索引对应当前版本。返回 True 表示命中；
+    只有上游在 CMS 之外变化 (或强制刷新) 时才拉取全量树。
+    """
+    version = await get_current_version()
+    if not force and await article_index.is_current(version):
+        return True
+    # single-flight：请求、预取轮询和 webhook 同时发现新版本时只有一个拉取全量树
+    task = _index_rebuilds.get(version)
+    if task is None:
+        task = asyncio.ensure_future(rebuild_index(version))
+        _index_rebuilds[version] = task
+        task.add_done_callback(lambda t: _index_rebuilds.pop(version) if _index_rebuilds.get(version) is t else None)
+    await asyncio.shield(task)
+    return False
+
+async def rebuild_index(version: str):
+    """拉取 version 的全量树重建索引，并按新旧树 diff 推送变更、预取变化的文章"""
+    stored = await article_index.stored_commit()
+    previous = article_index.commit_sha
+    if previous is None and stored not in (None, version) and await article_index.load():
+        previous = stored
+    had_index = bool(article_index.files) or stored is not None
+    tree = await client.get_tree(version)
+    if article_index.commit_sha != previous:
+        # 拉取期间索引已被推进 (CMS 提交、webhook 修补或其他 worker 重建)，不能用这棵树覆盖
+        logger.info(f"Index moved to {article_index.commit_sha} while fetching {version[:7]}, tree discarded")
+        return
+    old_files = dict(article_index.files)
+    article_index.rebuild(version, tree)
+    if previous and previous != version:
+        # 上游在 CMS 之外有提交：按 blob SHA 对比新旧树，只预取变化的文章
+        changed, removed = diff_files(old_files, article_index.files)
+        prefetcher.touch(changed)
+        prefetcher.enqueue(changed)
+        if not feed.announced(version):
+            files = {path: article_index.files[path] for path in changed}
+            files.update((path, None) for path in removed)
+            publish_changes(describe_changes(old_files, files), commit=version)
+        logger.info(f"Upstream {previous[:7]}..{version[:7]}: {len(changed)} changed, {len(removed)} removed")
+    elif previous is None and had_index:
+        # 旧索引的版本未知，无法对比，推进缓存代数整体失效 (blob 内容不受影响)
+        await cache.invalidate_all()
+        events.publish("invalidate")
+        publish_resync(version)
+    events.publish("index", commit=version)
+    snapshot.schedule()
+    return False
+
+async def ensure_blob_indexes() -> bool:
+    """
+    确保元数据索引和全文索引覆盖文章树中的所有 blob，返回 True 表示已完整。
+    缺失的 blob 由后台任务读取，请求不直接回源：短暂等待后即使用当前 (可能不完整的) 索引。
+    """
+    global _blob_index_task
+    if _blob_indexed_revision == article_index.revision:
+        return True
+    if _blob_index_task is None and time.time() >= _blob_index_retry_at:
+        _blob_index_task = asyncio.ensure_future(fill_blob_indexes())
+        _blob_index_task.add_done_callback(_on_blob_index_done)
+    if _blob_index_task is not None:
+        await asyncio.wait({_blob_index_task}, timeout=BLOB_INDEX_WAIT)
+    return _blob_indexed_revision == article_index.revision
+
+def _on_blob_index_done(task):
+    global _blob_index_task, _blob_index_retry_at
+    _blob_index_task = None
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Blob index fill failed: {task.exception()}")
+        _blob_index_retry_at = time.time() + BLOB_INDEX_RETRY
+
+@background
+async def fetch_blob_text(sha: str) -> str:
+    text, _ = await content_store.get_or_fetch(sha, lambda: client.get_blob(sha))
+    return text
+
+async def fill_blob_indexes():
+    """
+    为文章树中新出现的 blob 读取内容 (后台优先级)，分批增量更新元数据索引和全文索引；
+    两个索引缺失的 SHA 合并后每个 blob 只读取一次，解析和建索引在线程中执行。
+    单个 blob 读取失败不影响其余，稍后重试；GitHub 不可用时停止本轮补齐。
+    """
+    global _blob_indexed_revision, _blob_index_retry_at
+    revision = article_index.revision
+    live = set(article_index.files.values())
+    await asyncio.to_thread(metadata_index.load)
+    missing_meta = set(metadata_index.missing(live))
+    # 全文索引首次加载 (从 Redis 读取正文重建倒排表) 和增量更新都在线程中执行，不阻塞事件循环
+    missing_search = set(await asyncio.to_thread(search_index.missing, live))
+    missing = sorted(missing_meta | missing_search)
+    failed, attempted, unavailable = 0, 0, None
+    if missing:
+        logger.info(f"Indexing {len(missing)} blobs")
+        semaphore = asyncio.Semaphore(METADATA_FETCH_CONCURRENCY)
+
+        async def fetch(sha):
+            nonlocal unavailable
+            async with semaphore:
+                # GitHub 已不可用：本轮剩余的 blob 不再发出请求
+                if unavailable:
+                    raise unavailable
+                try:
+                    return await fetch_blob_text(sha)
+                except GitHubUnavailable as e:
+                    unavailable = e
+                    raise
+
+        for i in range(0, len(missing), BLOB_INDEX_BATCH):
+            batch = missing[i:i + BLOB_INDEX_BATCH]
+            attempted += len(batch)
+            results = await asyncio.gather(*(fetch(sha) for sha in batch), return_exceptions=True)
+            contents = {}
+            for sha, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    failed += 1
+                else:
+                    contents[sha] = result
+            await asyncio.to_thread(metadata_index.add_many, {sha: contents[sha] for sha in missing_meta if sha in contents})
+            await asyncio.to_thread(search_index.add_many, {sha: contents[sha] for sha in missing_search if sha in contents})
+            if unavailable:
+                break
+    if len(search_index) != len(live):
+        await asyncio.to_thread(metadata_index.prune, live)
+        await asyncio.to_thread(search_index.prune, live)
+    if failed or unavailable:
+        failed += len(missing) - attempted
+        retry = max(BLOB_INDEX_RETRY, (unavailable.retry_after or 0) if unavailable else 0)
+        _blob_index_retry_at = time.time() + retry
+        logger.warning(f"Blob index incomplete: {failed} of {len(missing)} blobs not indexed, retry in {retry:.0f}s")
+    elif revision == article_index.revision:
+        _blob_indexed_revision = revision
+
+def indexed_version():
+    """
+    廉价地获取已确认的当前版本：仅当进程内缓存的版本号与索引一致时返回，
+    不访问 Redis 和 GitHub，用于 If-None-Match 的快速判断。
+    """
+    version = cache.peek(CACHE_KEY_VERSION)
+    if version and version == article_index.commit_sha:
+        return version
+    return None
+
+def list_payload() -> PrecomputedPayload:
+    """当前文章列表的预序列化结果，按索引 revision 缓存，命中时无需重新编码"""
+    global _list_payload
+    revision = article_index.revision
+    if _list_payload is None or _list_payload[0] != revision:
+        articles = article_index.articles()
+        _list_payload = (revision, PrecomputedPayload(articles, total=len(articles), compress_min=RESPONSE_COMPRESS_MIN_BYTES))
+    return _list_payload[1]
+
+def record_commit(commit: dict, files: dict, contents: dict = None):
+    """
+    CMS 写入后原地修补文章索引 (files 为 {path: 新 SHA | None 表示删除})，
+    并把版本号直接推进到新 commit，避免下一次读取触发全量重建。
+    contents 为已知的新内容 {path: 文本}，直接写入内容存储；其余变更路径交给预热队列。
+    """
+    contents = contents or {}
+    parents = commit.get("parents") or []
+    parent_sha = parents[0]["sha"] if parents else None
+    changes = describe_changes(article_index.files, files)
+    article_index.apply(files, commit_sha=commit["sha"], parent_sha=parent_sha)
+    written = [path for path, sha in files.items() if sha]
+    for path in written:
+        if path in contents:
+            content_store.put(files[path], contents[path])
+    prefetcher.touch(written)
+    prefetcher.enqueue([path for path in written if path not in contents])
+    if article_index.commit_sha:
+        cache.set(CACHE_KEY_VERSION, article_index.commit_sha, ttl=CACHE_TTL_VERSION, stale_ttl=60)
+        if SNAPSHOT_ENABLED:
+            snapshot.hold()
+        snapshot.schedule()
+    else:
+        cache.delete(CACHE_KEY_VERSION)
+    events.publish("commit", commit=commit["sha"], parent=parent_sha, files=files)
+    publish_changes(changes, commit=commit["sha"])
+
+def publish_changes(changes: list, commit: str = None, pending: bool = False):
+    """把文章变更推送给浏览器：本进程的事件流直接投递，其他 worker 经 Redis pub/sub 转发"""
+    changes = [c for c in changes if is_article(c["path"]) or is_article(c.get("from") or "")]
+    if not changes:
+        return
+    event = feed.event(changes, commit=commit, pending=pending)
+    feed.deliver(event)
+    events.publish("feed", event=event)
+
+def publish_resync(commit: str = None):
+    """无法给出逐条变更 (如旧索引版本未知)：通知所有客户端重新拉取列表"""
+    event = feed.event(commit=commit, kind="resync")
+    feed.deliver(event)
+    events.publish("feed", event=event)
+
+def on_journal_submit(entry: dict):
+    """写后提交的保存：唤醒 leader 的提交任务，并以临时版本推送变更 (提交后还会再推送一次正式 commit)"""
+    if SNAPSHOT_ENABLED:
+        snapshot.hold()
+    events.publish("save", path=entry["path"])
+    action = "update" if entry.get("base") else "create"
+    publish_changes([{"path": entry["path"], "action": action, "sha": entry["sha"]}], pending=True)
 
-def set_cache(key: str, value: str, ex: int = None):
-    if not redis_client: return
+def on_remote_commit(event: dict):
+    """
+    其他 worker 提交后修补本进程的索引 (Redis 中的索引和版本号已由对方更新)；
+    不是线性提交时只丢弃本地版本号，下一次读取从 Redis 加载索引。
+    """
+    if event["parent"] and event["parent"] == article_index.commit_sha:
+        article_index.apply(event["files"], commit_sha=event["commit"], parent_sha=event["parent"], persist=False)
+    cache.forget_local(CACHE_KEY_VERSION)
+    snapshot.schedule()
+
+def on_remote_index(event: dict):
+    """其他 worker 重建了索引：丢弃本地版本号，下一次读取时按 Redis 中的版本加载"""
+    if event["commit"] != article_index.commit_sha:
+        cache.forget_local(CACHE_KEY_VERSION)
+        snapshot.schedule()
+
+def on_resync(event: dict):
+    """订阅断开期间可能错过通知：本地层全部作废，以 Redis 为准；浏览器端同样重新拉取"""
+    cache.reset_local()
+    feed.resync()
+
+async def warm_detail(path: str) -> bool:
+    """预热单篇文章内容 (按 blob SHA 读取)，已在内容存储中时返回 False"""
+    sha = article_index.files.get(path)
+    if not sha:
+        return False
+    _, status = await content_store.get_or_fetch(sha, lambda: client.get_blob(sha))
+    return status == "MISS"
+
+async def read_blob(sha: str) -> str:
+    text, _ = await content_store.get_or_fetch(sha, lambda: client.get_blob(sha))
+    return text
+
+async def merge_save(base_sha: str, ours: str, conflict: SaveConflict) -> tuple:
+    """
+    客户端基于 base_sha 编辑，而文章已变为 conflict.current：用内容存储中的 blob 做按行三方合并。
+    返回 (合并后的内容 | None, 冲突区块)；基准或当前内容无法读取时返回 (None, [])。
+    """
     try:
-        redis_client.set(key, value, ex=ex)
+        base = conflict.base if conflict.base is not None else await read_blob(base_sha)
+        theirs = conflict.theirs if conflict.theirs is not None else await read_blob(conflict.current)
     except Exception as e:
-        logger.error(f"Redis set failed: {e}")
+        logger.warning(f"无法读取合并所需的版本 (base={base_sha}, current={conflict.current}): {e}")
+        save_merges["unavailable"] += 1
+        return None, []
+    merged, hunks = merge3(base, ours, theirs)
+    save_merges["clean" if merged is not None else "conflict"] += 1
+    return merged, hunks
 
-def delete_cache(pattern: str):
-    if not redis_client: return
+async def rebuild_delta(item: "SaveArticleRequest") -> Optional[str]:
+    """
+    增量保存：在缓存的基准内容 (待提交的保存或内容存储中的 blob) 上应用补丁，并用结果的 blob SHA 校验。
+    基准不在缓存中、补丁无效或校验不一致时返回 None，由客户端改为上传完整内容。
+    """
+    pending = save_journal.get(item.path)
+    if pending and pending["sha"] == item.sha:
+        base = pending["content"]
+    else:
+        base = await content_store.get(save_journal.resolve(item.sha))
+    if base is None:
+        save_deltas["missing_base"] += 1
+        return None
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            redis_client.delete(*keys)
-    except Exception as e:
-        logger.error(f"Redis delete failed: {e}")
+        content = apply_patch(base, item.patch)
+    except PatchError as e:
+        logger.warning(f"增量保存补丁无效: {item.path} - {e}")
+        content = None
+    if content is None or git_blob_sha(content) != item.checksum:
+        save_deltas["mismatch"] += 1
+        return None
+    save_deltas["applied"] += 1
+    return content
+
+def save_conflict(e: SaveConflict, hunks: list):
+    """合并失败：返回当前版本 SHA 和冲突区块，客户端据此提示用户处理"""
+    return fail(msg=f"保存失败：{e}", code=Code.CONFLICT, data={"current": e.current, "conflicts": hunks})
+
+def snapshot_source() -> tuple:
+    """导出快照所需的当前状态；索引版本未确认时不导出"""
+    if not article_index.commit_sha:
+        return None, None, {}
+    body = list_payload().body(extra={"cache": "SNAPSHOT"})
+    return article_index.commit_sha, body, dict(article_index.files)
+
+def startup_warm_paths() -> list:
+    """启动时预热：最近编辑过的文章，不足时按 front-matter 日期补齐"""
+    paths = [path for path in prefetcher.recent() if path in article_index.files]
+    if len(paths) < PREFETCH_WARM_ON_START:
+        metadata_index.load()
+        latest, _ = metadata_index.query(article_index.files, sort="date", page_size=PREFETCH_WARM_ON_START)
+        paths += [item["path"] for item in latest if item["path"] not in paths]
+    return paths[:PREFETCH_WARM_ON_START]
+
+# 详情缓存预热：定时检查新版本，按树 diff 预取变化的文章；其中的 GitHub 请求按后台优先级调度
+prefetcher = PrefetchWorker(
+    background(warm_detail),
+    poll=background(ensure_index),
+    redis_client=redis_client,
+    concurrency=PREFETCH_CONCURRENCY,
+    interval=PREFETCH_INTERVAL,
+    warm_on_start=PREFETCH_WARM_ON_START,
+)
+
+snapshot = SnapshotExporter(
+    SNAPSHOT_DIR, snapshot_source, background(read_blob), keep=SNAPSHOT_KEEP,
+    pending=lambda: save_journal.stats()["pending"],
+)
+
+# 进程间通知与 leader 选举 (单 worker 时不订阅，也不加锁，当前进程直接运行后台任务)
+events = EventBus(redis_client if MULTI_WORKER else None)
+leader = LeaderElection(LEADER_LOCK_FILE if MULTI_WORKER else None)
+
+# 浏览器端变更推送；事件 id 由 Redis 分配，进程重启或切换 worker 后仍可按 Last-Event-ID 补发
+feed = ChangeFeed(redis_client, heartbeat=FEED_HEARTBEAT, max_connections=FEED_MAX_CONNECTIONS)
+
+# 写后提交的保存日志：到期的保存合并为一次 commit，提交后同样通过 record_commit 修补索引；
+# 多 worker 时待提交队列放在 Redis 中共享，由 leader 负责提交
+save_journal = SaveJournal(
+    client.commit_changes,
+    on_commit=record_commit,
+    path=SAVE_JOURNAL_FILE,
+    debounce=SAVE_DEBOUNCE,
+    max_delay=SAVE_MAX_DELAY,
+    store=RedisSaveStore(redis_client) if MULTI_WORKER and redis_client else None,
+    on_submit=on_journal_submit,
+)
+
+events.on("commit", on_remote_commit)
+events.on("index", on_remote_index)
+events.on("invalidate", lambda event: cache.reset_local())
+events.on("auth", lambda event: forget_stored_hash())
+events.on("save", lambda event: save_journal.wake())
+events.on("resync", on_resync)
+events.on("feed", lambda event: feed.deliver(event["event"]))
 
 # --- 请求模型定义 ---
 
 class SaveArticleRequest(BaseModel):
     path: str
-    content: str
+    content: Optional[str] = None  # 完整内容；增量保存时为空
     sha: Optional[str] = None  # 允许为 None 或空，代表新建
     message: Optional[str] = None
+    sync: bool = False  # 跳过写后提交，立即提交到 GitHub
+    # 增量保存：[[at, delete, insert]] 相对于 sha 对应的内容 (UTF-16 偏移)，checksum 为结果的 blob SHA
+    patch: Optional[List[Tuple[int, int, str]]] = None
+    checksum: Optional[str] = None
 
 class DeleteArticleRequest(BaseModel):
     path: str
@@ -107,6 +569,16 @@ class RenameArticleRequest(BaseModel):
     sha: str
     content: Optional[str] = None # 如果重命名时内容有变化可以一起传
 
+class BatchChange(BaseModel):
+    path: str
+    content: Optional[str] = None
+    sha: Optional[str] = None  # 基准 SHA，新建时为空
+    delete: bool = False
+
+class BatchChangeRequest(BaseModel):
+    changes: List[BatchChange]
+    message: Optional[str] = None
+
 # 允许跨域的源
 origins = [
     "http://localhost:5173",
@@ -121,12 +593,110 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def start_workers():
+    # 首次启动需要 bcrypt 生成初始密码哈希，放到线程中执行；多个 worker 通过文件锁只生成一次。
+    # 启动过程不访问 GitHub，首次读取时才建立连接
+    await asyncio.to_thread(init_auth_file)
+    events.start()
+    leader.start(start_leader_tasks)
+
+def start_leader_tasks():
+    """只在 leader 进程运行的后台任务：写后提交、预取轮询、快照导出"""
+    # 重放上次未提交的保存 (进程崩溃或提交失败时留下的)
+    save_journal.load()
+    if SAVE_WRITE_BEHIND or save_journal.stats()["pending"]:
+        save_journal.start()
+    if PREFETCH_ENABLED:
+        prefetcher.start(startup_warm_paths)
+    if SNAPSHOT_ENABLED:
+        snapshot.start()
+
+async def close_clients():
+    await feed.stop()
+    await save_journal.stop()
+    await prefetcher.stop()
+    await snapshot.stop()
+    if _blob_index_task is not None:
+        _blob_index_task.cancel()
+    # 排队中的 Redis 写入 (索引、版本号、最近编辑) 完成后再释放 leader 锁
+    await redis_io.drain()
+    # 后台任务停止后再释放 leader 锁，其他 worker 接替时不会与未完成的提交重叠
+    await leader.stop()
+    await events.stop()
+    await client.aclose()
+    await uploader.aclose()
+    image_processor.shutdown()
+
+# --- 指标 ---
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
+def _cache_lookups():
+    c, b = cache.stats(), content_store.stats()
+    return {
+        ("two_tier", "local_hit"): c["local_hits"],
+        ("two_tier", "redis_hit"): c["redis_hits"],
+        ("two_tier", "stale_hit"): c["stale_hits"],
+        ("two_tier", "miss"): c["misses"],
+        ("content", "local_hit"): b["local_hits"],
+        ("content", "redis_hit"): b["redis_hits"],
+        ("content", "miss"): b["misses"],
+    }
+
+def _cache_hit_ratio():
+    c, b = cache.stats(), content_store.stats()
+    content_hits = b["local_hits"] + b["redis_hits"]
+    content_total = content_hits + b["misses"]
+    return {
+        ("two_tier",): c["hit_ratio"],
+        ("content",): round(content_hits / content_total, 4) if content_total else None,
+    }
+
+# 抓取时从各模块已有的统计中读取，不在热路径上重复计数
+metrics.counter("cms_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result")).set_function(_cache_lookups)
+metrics.gauge("cms_cache_hit_ratio", "Cache hit ratio since start", ("cache",)).set_function(_cache_hit_ratio)
+metrics.gauge("cms_content_store_bytes", "Bytes of article content stored in Redis", ()).set_function(
+    lambda: content_store.stats().get("redis_bytes"))
+metrics.gauge("cms_github_rate_limit_remaining", "Remaining GitHub API quota", ()).set_function(
+    lambda: client.rate_remaining)
+metrics.gauge("cms_github_rate_limit_reset_timestamp", "GitHub API quota reset time (unix seconds)", ()).set_function(
+    lambda: client.rate_reset)
+metrics.counter("cms_github_scheduler_events_total", "GitHub request scheduler events (retries, breaker trips, ...)",
+                ("event",)).set_function(
+    lambda: {(k,): v for k, v in client.scheduler.counters.items()})
+metrics.gauge("cms_github_breaker_open", "1 while the GitHub circuit breaker rejects requests", ()).set_function(
+    lambda: 0 if client.scheduler.state == "closed" else 1)
+metrics.gauge("cms_github_queued_requests", "GitHub requests waiting for a concurrency slot", ("priority",)).set_function(
+    lambda: {(k,): v for k, v in client.scheduler.limiter.queued().items()})
+metrics.gauge("cms_feed_connections", "Open /api/events streams", ()).set_function(
+    lambda: feed.stats()["connections"])
+metrics.gauge("cms_index_articles", "Articles in the tree index", ()).set_function(
+    lambda: len(article_index.files))
+metrics.gauge("cms_prefetch_pending", "Paths waiting in the prefetch queue", ()).set_function(
+    lambda: prefetcher.stats()["pending"])
+metrics.gauge("cms_save_journal_pending", "Saves waiting to be committed to GitHub", ()).set_function(
+    lambda: save_journal.stats()["pending"])
+metrics.counter("cms_save_deltas_total", "Delta (patch) saves by result", ("result",)).set_function(
+    lambda: {(k,): v for k, v in save_deltas.items()})
+metrics.counter("cms_save_merges_total", "Three-way merges of stale saves by result", ("result",)).set_function(
+    lambda: {(k,): v for k, v in save_merges.items()})
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Prometheus 文本格式；配置 METRICS_TOKEN 后需携带 Authorization: Bearer <token>"""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    # 部分指标 (如内容存储字节数) 需要读取 Redis，在线程中渲染
+    return Response(await asyncio.to_thread(metrics.REGISTRY.render), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # --- Auth 接口 ---
 
 @app.post("/api/login", response_model=Token)
 async def login(request: LoginRequest):
     try:
-        hashed_password = get_stored_hash()
+        hashed_password = await get_stored_hash_async()
         if not hashed_password:
              logger.error("Auth file not found or corrupted")
              raise HTTPException(
@@ -134,7 +704,7 @@ async def login(request: LoginRequest):
                 detail="Login service unavailable"
              )
 
-        if not verify_password(request.password, hashed_password):
+        if not await verify_password_async(request.password, hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect password",
@@ -156,126 +726,236 @@ async def login(request: LoginRequest):
 
 @app.post("/api/password/change", dependencies=[Depends(get_current_user)])
 async def change_password(request: PasswordChangeRequest):
-    hashed_password = get_stored_hash()
-    if not verify_password(request.current_password, hashed_password):
-        return fail(msg="当前密码错误", code=Code.PARAM_ERROR)
+    hashed_password = await get_stored_hash_async()
+    if not await verify_password_async(request.current_password, hashed_password):
+        return fail(msg="当前密码错误", code=Code.BAD_REQUEST)
     
-    update_password(request.new_password)
+    await update_password_async(request.new_password)
+    events.publish("auth")
     return success(msg="密码修改成功")
 
 # --- API 接口 ---
 
+@app.get("/api/cache/stats", dependencies=[Depends(get_current_user)])
+async def get_cache_stats():
+    """缓存命中 / 未命中 / 回源耗时统计"""
+    return success(data={
+        **cache.stats(),
+        "prefetch": prefetcher.stats(),
+        "content": await asyncio.to_thread(content_store.stats),
+        "snapshot": snapshot.stats() if SNAPSHOT_ENABLED else None,
+        "github": client.scheduler.stats(),
+        "feed": feed.stats(),
+        "worker": {"pid": os.getpid(), "leader": leader.is_leader, "events": events.stats()},
+    })
+
+@app.get("/api/images/stats", dependencies=[Depends(get_current_user)])
+async def image_stats():
+    """图片去重命中、节省字节数以及哈希 / 转码 / 上传各阶段累计耗时"""
+    return success(data=image_processor.stats())
+
 @app.get("/api/version", dependencies=[Depends(get_current_user)])
-def get_version():
+async def get_version():
     """获取当前数据版本号 (Latest Commit SHA)"""
     try:
-        version = get_cache(CACHE_KEY_VERSION)
-        if not version:
-            version = client.get_latest_commit_sha()
-            if version:
-                set_cache(CACHE_KEY_VERSION, version, ex=300) # 5 minutes TTL for version check
-        
+        version = await get_current_version()
         return success(data={"version": version})
     except Exception as e:
         return fail(msg=f"获取版本失败: {str(e)}", code=Code.GITHUB_ERROR)
 
+@app.get("/api/events")
+async def change_events(request: Request, token: Optional[str] = None):
+    """
+    文章变更推送 (text/event-stream)，取代轮询 /api/version：
+    - event: change  data: {"id", "commit", "changes": [{"path", "action", "sha", "from"}], "pending"}
+      action 为 create / update / delete / rename；pending 为 true 表示写后提交尚未推送到 GitHub (sha 为临时版本)
+    - event: resync  无法补发断线期间的事件，客户端应重新拉取列表
+    EventSource 不能设置请求头，token 可通过查询参数传递；断线重连时浏览器自动带上 Last-Event-ID。
+    """
+    auth = request.headers.get("Authorization", "")
+    await get_current_user(token or auth[len("Bearer "):])
+    if feed.full():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many event streams")
+    try:
+        last_id = int(request.headers["Last-Event-ID"])
+    except (KeyError, ValueError):
+        last_id = None
+    return StreamingResponse(
+        feed.stream(last_id),
+        media_type="text/event-stream",
+        # 关闭 nginx 的响应缓冲，事件立即送达
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/api/articles")
-def get_articles(force_refresh: bool = False):
+async def get_articles(request: Request, force_refresh: bool = False):
     try:
-        # 缓存检查
-        if not force_refresh:
-            cached_data = get_cache(CACHE_KEY_ARTICLES)
-            if cached_data:
-                data = json.loads(cached_data)
-                return success(data=data, total=len(data), extra={"cache": "HIT"})
-
-        # 获取全量文件树
-        tree = client.repo.get_git_tree("main", recursive=True)
-        root = {"name": "Root", "children": []}
-        folder_map = {"": root}
-
-        for file in tree.tree:
-            # 过滤目录
-            if file.path.startswith(("src/posts/", "src/drafts/")) and file.path.endswith(".md"):
-                path_parts = file.path.split('/')
-                current_path = ""
-                for i in range(len(path_parts) - 1):
-                    part = path_parts[i]
-                    parent_path = current_path
-                    current_path = f"{current_path}/{part}" if current_path else part
-                    if current_path not in folder_map:
-                        new_folder = {"name": part, "type": "folder", "children": [], "path": current_path}
-                        folder_map[parent_path]["children"].append(new_folder)
-                        folder_map[current_path] = new_folder
-                
-                file_node = {
-                    "name": path_parts[-1],
-                    "path": file.path,
-                    "type": "file",
-                    "sha": file.sha,
-                    "isDraft": "src/drafts/" in file.path
-                }
-                # 容错处理：确保 current_path 在 map 中
-                if current_path in folder_map:
-                    folder_map[current_path]["children"].append(file_node)
-
-        # 整理返回列表
-        final_list = []
-        src_node = next((n for n in root["children"] if n["name"] == "src"), None)
-        if src_node:
-            for sub in src_node["children"]:
-                if sub["name"] in ["posts", "drafts"]:
-                    final_list.extend(sub["children"])
-        
-        # 写入缓存
-        set_cache(CACHE_KEY_ARTICLES, json.dumps(final_list), ex=CACHE_TTL_ARTICLES)
-        
-        # 返回标准成功结构，携带数据总量
-        return success(data=final_list, total=len(final_list), extra={"cache": "MISS"})
+        # 条件请求：版本未变化时直接 304，无需编码列表
+        if not force_refresh and etag_matches(request, make_etag(indexed_version())):
+            return not_modified(make_etag(article_index.commit_sha))
+
+        # 索引与当前版本一致时直接返回，只有上游在 CMS 之外变化时才拉取全量树
+        hit = await ensure_index(force=force_refresh)
+        payload = list_payload()
+        if etag_matches(request, make_etag(article_index.commit_sha)):
+            return not_modified(make_etag(article_index.commit_sha))
+        headers = {}
+        if article_index.commit_sha:
+            headers["ETag"] = make_etag(article_index.commit_sha)
+            headers["Cache-Control"] = "private, no-cache"
+
+        # 返回标准成功结构，携带数据总量；列表已预先序列化 (及压缩)，直接拼接进响应
+        return payload.response(request, headers=headers, extra={"cache": "HIT" if hit else "MISS"})
     except Exception as e:
         logger.error(f"获取文章列表失败: {str(e)}", exc_info=True)
         return fail(msg=f"获取文章列表失败: {str(e)}", code=Code.INTERNAL_ERROR)
 
+@app.get("/api/articles/query", dependencies=[Depends(get_current_user)])
+async def query_articles(
+    q: Optional[str] = None,
+    tag: Optional[str] = None,
+    category: Optional[str] = None,
+    draft: Optional[bool] = None,
+    sort: str = "date",
+    order: str = "desc",
+    page: int = 1,
+    page_size: int = 20,
+):
+    """基于 front-matter 的服务端检索：标题关键字 / 标签 / 分类 / 草稿过滤，排序与分页"""
+    try:
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), 100)
+        await ensure_index()
+        # 索引补齐期间返回不完整的结果，indexing 为 true
+        complete = await ensure_blob_indexes()
+        items, total = metadata_index.query(
+            article_index.files, q=q, tag=tag, category=category, draft=draft,
+            sort=sort, order=order, page=page, page_size=page_size,
+        )
+        return success(data=items, total=total, page=page, page_size=page_size, indexing=not complete)
+    except Exception as e:
+        logger.error(f"查询文章失败: {str(e)}", exc_info=True)
+        return fail(msg=f"查询文章失败: {str(e)}", code=Code.INTERNAL_ERROR)
+
+@app.get("/api/search", dependencies=[Depends(get_current_user)])
+async def search_articles(q: str, page: int = 1, page_size: int = 20):
+    """全文检索 (BM25 排序)，返回带 <mark> 高亮的摘要"""
+    try:
+        if not q.strip():
+            return fail(msg="搜索关键字不能为空", code=Code.BAD_REQUEST)
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), 100)
+        await ensure_index()
+        complete = await ensure_blob_indexes()
+        items, total = search_index.search(q, article_index.files, page=page, page_size=page_size)
+        for item in items:
+            meta = metadata_index.get(item["sha"]) or {}
+            item["title"] = meta.get("title") or os.path.basename(item["path"])
+            item["isDraft"] = meta.get("draft", False) or "src/drafts/" in item["path"]
+        return success(data=items, total=total, page=page, page_size=page_size, indexing=not complete)
+    except Exception as e:
+        logger.error(f"搜索失败: {str(e)}", exc_info=True)
+        return fail(msg=f"搜索失败: {str(e)}", code=Code.INTERNAL_ERROR)
+
 @app.get("/api/article/detail", dependencies=[Depends(get_current_user)])
-def get_article_detail(path: str, force_refresh: bool = False):
+async def get_article_detail(path: str, request: Request, response: Response, force_refresh: bool = False):
     try:
-        cache_key = f"cms:article:{path}"
-        
-        if not force_refresh:
-            cached_data = get_cache(cache_key)
-            if cached_data:
-                return success(data=json.loads(cached_data), extra={"cache": "HIT"})
+        # 条件请求：通过索引把路径解析为 blob SHA，未变化时直接 304
+        if not force_refresh and indexed_version():
+            if etag_matches(request, make_etag(article_index.files.get(path))):
+                return not_modified(make_etag(article_index.files[path]))
 
-        content_file = client.repo.get_contents(path)
-        raw_content = base64.b64decode(content_file.content).decode('utf-8')
-        
-        result = {
-            "path": path,
-            "title": os.path.basename(path),
-            "content": raw_content,
-        }
-        
-        # 写入缓存
-        set_cache(cache_key, json.dumps(result), ex=CACHE_TTL_DETAIL)
+        # 通过文章索引把路径解析为 blob SHA，内容按 SHA 读取 (并发请求同一 blob 时只回源一次)
+        await ensure_index(force=force_refresh)
+        sha = article_index.files.get(path)
+        pending = save_journal.get(path)
+        if pending:
+            # 尚未提交的保存：返回最新内容和临时版本，保证读到自己的写入
+            content, sha, status = pending["content"], pending["sha"], "PENDING"
+        elif sha:
+            content, status = await content_store.get_or_fetch(sha, lambda: client.get_blob(sha))
+        else:
+            # 不在文章索引中的路径 (非 posts/drafts)，按路径读取后同样按 SHA 存储
+            content, sha = await client.get_file_content(path, ref=await get_current_version())
+            content_store.put(sha, content)
+            status = "MISS"
+
+        if etag_matches(request, make_etag(sha)):
+            return not_modified(make_etag(sha))
+        response.headers["ETag"] = make_etag(sha)
+        response.headers["Cache-Control"] = "private, no-cache"
 
         # 返回详情，并带上关键的 SHA
-        return success(data=result, sha=content_file.sha, extra={"cache": "MISS"})
+        data = {"path": path, "title": os.path.basename(path), "content": content}
+        return success(data=data, sha=sha, extra={"cache": status})
     except Exception as e:
         logger.error(f"读取文件内容失败: {path} - {str(e)}", exc_info=True)
         return fail(msg=f"读取文件内容失败: {path}", code=Code.NOT_FOUND)
 
 @app.post("/api/article/save")
-def save_to_github(item: SaveArticleRequest):
+async def save_to_github(item: SaveArticleRequest):
     try:
         # 1. 基础验证
         if not item.path:
-            return fail(msg="文件路径不能为空", code=Code.PARAM_ERROR)
+            return fail(msg="文件路径不能为空", code=Code.BAD_REQUEST)
+        if item.patch is not None:
+            if not item.sha or not item.checksum:
+                return fail(msg="增量保存需要基准 SHA 和校验值", code=Code.BAD_REQUEST)
+            item.content = await rebuild_delta(item)
+            if item.content is None:
+                return fail(msg="增量保存的基准内容不可用，请上传完整内容", code=Code.PRECONDITION_FAILED)
         if not item.content:
-            return fail(msg="文件内容不能为空", code=Code.PARAM_ERROR)
+            return fail(msg="文件内容不能为空", code=Code.BAD_REQUEST)
+
+        user_msg = item.message.strip() if item.message and item.message.strip() else None
+        base_sha = None if not item.sha or item.sha in ["", "new"] else item.sha
+
+        if SAVE_WRITE_BEHIND and not item.sync:
+            # 写入本地日志后立即返回临时版本 (内容的 blob SHA)，客户端可基于它继续保存
+            await ensure_index()
+            try:
+                entry = await save_journal.submit(
+                    item.path, item.content, sha=base_sha, message=user_msg,
+                    current=article_index.files.get(item.path),
+                )
+                return success(msg="已保存，稍后自动同步到 GitHub", sha=entry["sha"], pending=True)
+            except SaveConflict as e:
+                conflict = e
+            # 基准版本已过期：在本地三方合并，合并成功则基于最新版本保存
+            merged, hunks = await merge_save(base_sha, item.content, conflict)
+            if merged is None:
+                return save_conflict(conflict, hunks)
+            try:
+                entry = await save_journal.submit(
+                    item.path, merged, sha=conflict.current, message=user_msg,
+                    current=article_index.files.get(item.path),
+                )
+            except SaveConflict as e:
+                return save_conflict(e, [])
+            return success(
+                msg="已自动合并其他修改并保存，稍后同步到 GitHub", sha=entry["sha"],
+                data={"content": merged}, pending=True, merged=True,
+            )
+
+        # 立即提交：先推送该路径尚未提交的保存，临时版本随之变为正式版本
+        await save_journal.flush([item.path])
+        if base_sha:
+            item.sha = save_journal.resolve(base_sha)
+
+        # 提交前先对照本地索引检查基准版本，过期时在本地合并，不发出注定失败的 GitHub 请求
+        await ensure_index()
+        current = article_index.files.get(item.path)
+        merged = None
+        if base_sha and current and item.sha != current:
+            conflict = SaveConflict("版本冲突：GitHub 上的文章已被修改", current)
+            merged, hunks = await merge_save(item.sha, item.content, conflict)
+            if merged is None:
+                return save_conflict(conflict, hunks)
+            item.content, item.sha = merged, current
 
         now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
         default_msg = f"CMS Update: {os.path.basename(item.path)} ({now})"
-        final_msg = item.message.strip() if item.message and item.message.strip() else default_msg
+        final_msg = user_msg or default_msg
 
         params = {
             "path": item.path,
@@ -288,16 +968,15 @@ def save_to_github(item: SaveArticleRequest):
         if not item.sha or item.sha in ["", "new"]:
             logger.info(f"正在新建文件: {item.path}")
             try:
-                res = client.repo.create_file(**params)
+                res = await client.create_file(**params)
                 action = "创建"
             except Exception as create_e:
                 # 容错处理：如果报错 "sha wasn't supplied" (422)，说明文件已存在，尝试获取 SHA 并转为更新
                 if "sha" in str(create_e) and "supplied" in str(create_e) and "422" in str(create_e):
                     logger.warning(f"文件已存在但未提供 SHA，尝试自动修复: {item.path}")
                     try:
-                        existing_file = client.repo.get_contents(item.path)
-                        params["sha"] = existing_file.sha
-                        res = client.repo.update_file(**params)
+                        _, params["sha"] = await client.get_file_content(item.path)
+                        res = await client.update_file(**params)
                         action = "更新 (自动修复)"
                     except Exception as inner_e:
                         # 如果修复过程中再次失败（如获取失败），抛出原始错误
@@ -308,18 +987,18 @@ def save_to_github(item: SaveArticleRequest):
         else:
             logger.info(f"正在更新文件: {item.path} (SHA: {item.sha})")
             params["sha"] = item.sha
-            res = client.repo.update_file(**params)
+            res = await client.update_file(**params)
             action = "更新"
             
         # 核心：必须返回新的 SHA，否则前端无法连续保存
-        new_sha = res['content'].sha
+        new_sha = res['content']['sha']
         logger.info(f"文件{action}成功: {item.path}, New SHA: {new_sha}")
         
-        # 缓存清理
-        delete_cache(CACHE_KEY_ARTICLES)
-        delete_cache(f"cms:article:{item.path}")
-        delete_cache(CACHE_KEY_VERSION)
-        
+        # 修补索引与缓存
+        record_commit(res['commit'], {item.path: new_sha}, {item.path: item.content})
+
+        if merged is not None:
+            return success(msg=f"已自动合并其他修改，文件{action}成功", sha=new_sha, data={"content": merged}, merged=True)
         return success(msg=f"文件{action}成功", sha=new_sha)
     except Exception as e:
         logger.error(f"保存失败: {str(e)}", exc_info=True)
@@ -328,84 +1007,202 @@ def save_to_github(item: SaveArticleRequest):
             return fail(msg="保存失败：GitHub 版本冲突，请刷新页面重新编辑", code=Code.GITHUB_ERROR)
         return fail(msg=f"保存失败: {str(e)}", code=Code.INTERNAL_ERROR)
 
+@app.get("/api/saves", dependencies=[Depends(get_current_user)])
+async def list_pending_saves():
+    """写后提交队列：尚未同步到 GitHub 的保存 (含冲突) 与统计"""
+    return success(data={"entries": save_journal.entries(), "stats": save_journal.stats()})
+
+@app.post("/api/saves/flush", dependencies=[Depends(get_current_user)])
+async def flush_pending_saves():
+    """立即把排队中的保存提交到 GitHub (如离开编辑器前)"""
+    try:
+        await save_journal.flush()
+        stats = save_journal.stats()
+        if stats["conflicted"]:
+            return fail(msg=f"{stats['conflicted']} 篇文章同步冲突", code=Code.CONFLICT, data=save_journal.entries())
+        return success(msg="已同步到 GitHub", data=stats)
+    except Exception as e:
+        logger.error(f"同步保存队列失败: {str(e)}", exc_info=True)
+        return fail(msg=f"同步失败: {str(e)}", code=Code.GITHUB_ERROR)
+
 # ... (image upload unchanged) ...
 @app.post("/api/upload/image", dependencies=[Depends(get_current_user)])
 async def upload_image(file: UploadFile = File(...)):
     try:
         # 1. 验证文件类型
         if not file.content_type.startswith("image/"):
-            return fail(msg="仅支持上传图片文件", code=Code.PARAM_ERROR)
+            return fail(msg="仅支持上传图片文件", code=Code.BAD_REQUEST)
         
         logger.info(f"开始上传图片: {file.filename}")
-        url = await uploader.upload_image(file)
-        
-        if url:
-            logger.info(f"图片上传成功: {url}")
-            return success(data={"url": url})
-        else:
-            logger.error("图片上传失败: 图床服务返回空 URL")
-            return fail(msg="图片上传失败，请检查图床配置", code=Code.INTERNAL_ERROR)
+        result = await image_processor.upload(file)
+        logger.info(f"图片上传成功: {result['url']} (去重: {result['dedup']}, {result['bytes_in']} -> {result['bytes_out']} 字节)")
+        return success(data=result)
+    except UploadError as e:
+        logger.error(f"图片上传失败: {str(e)}")
+        return fail(msg=f"图片上传失败，请检查图床配置: {str(e)}", code=Code.INTERNAL_ERROR)
     except Exception as e:
         logger.error(f"图片上传异常: {str(e)}", exc_info=True)
         return fail(msg=f"图片上传异常: {str(e)}", code=Code.INTERNAL_ERROR)
 
+@app.post("/api/upload/images", dependencies=[Depends(get_current_user)])
+async def upload_images(files: List[UploadFile] = File(...)):
+    """批量上传图片：并发上传 (受 TG_IMG_MAX_CONCURRENCY 限制)，逐个返回结果"""
+    try:
+        rejected = [f.filename for f in files if not (f.content_type or "").startswith("image/")]
+        if rejected:
+            return fail(msg=f"仅支持上传图片文件: {', '.join(rejected)}", code=Code.BAD_REQUEST)
+
+        logger.info(f"开始批量上传图片: {len(files)} 张")
+        results = await image_processor.upload_many(files)
+        failed = sum(1 for r in results if not r["url"])
+        msg = "图片上传成功" if not failed else f"{failed} 张图片上传失败"
+        return success(data=results, msg=msg, total=len(results))
+    except Exception as e:
+        logger.error(f"批量上传异常: {str(e)}", exc_info=True)
+        return fail(msg=f"批量上传异常: {str(e)}", code=Code.INTERNAL_ERROR)
+
 
 # 新增：删除接口
 @app.post("/api/article/delete")
-def delete_article(item: DeleteArticleRequest):
+async def delete_article(item: DeleteArticleRequest):
     try:
-        client.repo.delete_file(
+        # 先提交该路径尚未同步的保存，客户端持有的临时版本才能匹配
+        await save_journal.flush([item.path])
+        res = await client.delete_file(
             path=item.path,
             message=f"CMS Delete: {os.path.basename(item.path)}",
-            sha=item.sha,
+            sha=save_journal.resolve(item.sha),
             branch="main"
         )
-        # 缓存清理
-        delete_cache(CACHE_KEY_ARTICLES)
-        delete_cache(f"cms:article:{item.path}")
-        delete_cache(CACHE_KEY_VERSION)
+        # 修补索引与缓存
+        record_commit(res['commit'], {item.path: None})
         
         return success(msg="文章已从 GitHub 彻底移除")
     except Exception as e:
         return fail(msg=f"删除操作失败: {str(e)}", code=Code.GITHUB_ERROR)
 
-# 新增：重命名接口 (GitHub API 逻辑：新建+删除)
+# 新增：重命名接口 (Git Data API：删除旧路径 + 新路径复用原 blob，单次提交)
 @app.post("/api/article/rename", dependencies=[Depends(get_current_user)])
-def rename_article(item: RenameArticleRequest):
+async def rename_article(item: RenameArticleRequest):
     try:
-        # 1. 获取内容
-        content = item.content
-        if not content:
-            old_file = client.repo.get_contents(item.old_path)
-            content = base64.b64decode(old_file.content).decode('utf-8')
-
-        # 2. 在新路径创建文件
-        create_res = client.repo.create_file(
-            path=item.new_path,
-            message=f"CMS Rename (Create): {item.old_path} -> {item.new_path}",
-            content=content,
-            branch="main"
-        )
+        await save_journal.flush([item.old_path, item.new_path])
+        item.sha = save_journal.resolve(item.sha)
+        new_file = {"path": item.new_path}
+        if item.content:
+            new_file["content"] = item.content
+        else:
+            new_file["blob_sha"] = item.sha
 
-        # 3. 删除旧路径文件
-        client.repo.delete_file(
-            path=item.old_path,
-            message=f"CMS Rename (Delete): {item.old_path}",
-            sha=item.sha,
-            branch="main"
+        res = await client.commit_changes(
+            [{"path": item.old_path, "sha": item.sha, "delete": True}, new_file],
+            message=f"CMS Rename: {item.old_path} -> {item.new_path}"
         )
-        
-        # 缓存清理
-        delete_cache(CACHE_KEY_ARTICLES)
-        delete_cache(f"cms:article:{item.old_path}")
-        delete_cache(f"cms:article:{item.new_path}")
-        delete_cache(CACHE_KEY_VERSION)
-        
+        if res["conflicts"]:
+            return fail(msg="重命名失败：版本冲突，请刷新页面后重试", code=Code.CONFLICT, data={"conflicts": res["conflicts"]})
+
+        # 修补索引与缓存
+        record_commit(res["commit"], res["files"], {item.new_path: item.content} if item.content else None)
+
         # 返回新文件的 SHA，以便前端立即继续编辑新文件
-        return success(msg="重命名成功", sha=create_res['content'].sha)
+        return success(msg="重命名成功", sha=res["files"][item.new_path])
     except Exception as e:
         return fail(msg=f"重命名失败: {str(e)}", code=Code.INTERNAL_ERROR)
 
+# 批量提交：多文件保存 / 删除 / 重命名合并为一次 commit
+@app.post("/api/articles/batch", dependencies=[Depends(get_current_user)])
+async def batch_commit(item: BatchChangeRequest):
+    try:
+        if not item.changes:
+            return fail(msg="变更列表不能为空", code=Code.BAD_REQUEST)
+        paths = [c.path for c in item.changes]
+        if len(set(paths)) != len(paths):
+            return fail(msg="同一路径不能在一次提交中出现多次", code=Code.BAD_REQUEST)
+        if any(not c.delete and not c.content for c in item.changes):
+            return fail(msg="保存的文件内容不能为空", code=Code.BAD_REQUEST)
+
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+        default_msg = f"CMS Batch: {len(item.changes)} files ({now})"
+        final_msg = item.message.strip() if item.message and item.message.strip() else default_msg
+
+        await save_journal.flush(paths)
+        for c in item.changes:
+            if c.sha:
+                c.sha = save_journal.resolve(c.sha)
+        res = await client.commit_changes([c.dict() for c in item.changes], message=final_msg)
+        if res["conflicts"]:
+            # 逐文件报告冲突，整个批次不会提交
+            return fail(msg="批量提交失败：部分文件版本冲突", code=Code.CONFLICT, data={"conflicts": res["conflicts"]})
+
+        record_commit(res["commit"], res["files"], {c.path: c.content for c in item.changes if not c.delete})
+        logger.info(f"批量提交成功: {len(res['files'])} files, commit {res['commit']['sha']}")
+        return success(msg="批量提交成功", data={"files": res["files"]}, sha=res["commit"]["sha"])
+    except Exception as e:
+        logger.error(f"批量提交失败: {str(e)}", exc_info=True)
+        return fail(msg=f"批量提交失败: {str(e)}", code=Code.GITHUB_ERROR)
+
+# GitHub Webhook：推送事件主动失效 / 修补缓存，替代 TTL 轮询
+@app.post("/api/webhook/github")
+async def github_webhook(request: Request):
+    body = await request.body()
+    if not WEBHOOK_SECRET:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Webhook not configured")
+    if not verify_signature(WEBHOOK_SECRET, body, request.headers.get("X-Hub-Signature-256")):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid signature")
+
+    event = request.headers.get("X-GitHub-Event")
+    if event == "ping":
+        return success(msg="pong")
+    if event != "push":
+        return success(msg=f"忽略事件: {event}")
+
+    payload = json.loads(body)
+    if payload.get("ref") != f"refs/heads/{client.branch}":
+        return success(msg=f"忽略分支: {payload.get('ref')}")
+
+    before, after = payload.get("before"), payload.get("after")
+    if not after or payload.get("deleted"):
+        # 分支被删除或 payload 不含新版本号：无法修补，只让版本号失效，下次读取时重新确认
+        cache.delete(CACHE_KEY_VERSION)
+        logger.warning(f"Webhook push without new commit (before={before[:7] if before else None}), version invalidated")
+        return success(msg="推送不含新版本，已让版本号失效", data={"action": "invalidated", "changed": 0, "removed": 0})
+    if article_index.commit_sha == after:
+        # CMS 自身的提交，写入时已经修补过
+        return success(msg="已是最新版本", data={"action": "noop"})
+
+    changed, removed, complete = summarize_push(payload)
+    changed_articles = sorted(path for path in changed if is_article(path))
+
+    if complete and article_index.commit_sha == before and len(changed_articles) <= WEBHOOK_PATCH_LIMIT:
+        # 拉取变更文章：同时得到新的 blob SHA 并写入内容存储
+        contents = await asyncio.gather(*(client.get_file_content(path, ref=after) for path in changed_articles))
+        files = {path: None for path in removed}
+        for path, (content, sha) in zip(changed_articles, contents):
+            files[path] = sha
+            content_store.put(sha, content)
+        changes = describe_changes(article_index.files, files)
+        article_index.apply(files, commit_sha=after, parent_sha=before)
+        prefetcher.touch(changed_articles)
+        cache.set(CACHE_KEY_VERSION, after, ttl=CACHE_TTL_VERSION, stale_ttl=60)
+        events.publish("commit", commit=after, parent=before, files=files)
+        publish_changes(changes, commit=after)
+        action = "patched"
+    elif article_index.commit_sha:
+        # 文件列表不完整或索引不在 before 上：重建索引，按新旧树 diff 失效并预热变化的文章
+        cache.set(CACHE_KEY_VERSION, after, ttl=CACHE_TTL_VERSION, stale_ttl=60)
+        await ensure_index()
+        action = "rebuilt"
+    else:
+        # 索引版本未知，无法对比：整体失效，下次读取时重建
+        await cache.invalidate_all()
+        cache.set(CACHE_KEY_VERSION, after, ttl=CACHE_TTL_VERSION, stale_ttl=60)
+        events.publish("invalidate")
+        action = "invalidated"
+
+    logger.info(f"Webhook push {before[:7] if before else None}..{after[:7] if after else None}: {action}, {len(changed)} changed, {len(removed)} removed")
+    return success(msg="已处理推送事件", data={"action": action, "changed": len(changed), "removed": len(removed)})
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # 多 worker 时 uvicorn 在子进程中按 import 字符串重新加载应用，并在 worker 退出时自动拉起
+    # 事件流是长连接，关闭时最多等待 10 秒后强制断开，客户端会自动重连
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WEB_CONCURRENCY, timeout_graceful_shutdown=10)
@@ -1,5 +1,6 @@
 import apiClient, { type ApiResponse } from './client'
 import { ApiCache } from '../utils/apiCache'
+import { diffPatch, gitBlobSha } from '../utils/delta'
 
 export interface ArticleSaveParams {
   path: string
@@ -7,6 +8,45 @@ export interface ArticleSaveParams {
   sha: string
   title?: string
   message?: string
+  sync?: boolean // 立即提交到 GitHub，不经过服务端保存队列
+}
+
+export interface BatchChange {
+  path: string
+  content?: string
+  sha?: string
+  delete?: boolean
+}
+
+export interface SearchHit {
+  path: string
+  sha: string
+  title: string
+  isDraft: boolean
+  score: number
+  snippet: string // 已转义的 HTML，命中部分以 <mark> 包裹
+}
+
+// 小于此长度的文章直接上传完整内容
+const DELTA_MIN_LENGTH = 4096
+// 最近加载 / 保存过的内容 (path -> {sha, content})，作为增量保存的基准
+const baseContents = new Map<string, { sha: string; content: string }>()
+
+const rememberBase = (path: string, sha?: string, content?: string) => {
+  if (sha && content !== undefined) baseContents.set(path, { sha, content })
+}
+
+// 基准内容已知且改动较小时只上传补丁和结果的校验值，否则返回 null
+const deltaPayload = async (data: ArticleSaveParams) => {
+  const base = baseContents.get(data.path)
+  if (!base || !data.sha || base.sha !== data.sha || data.content.length < DELTA_MIN_LENGTH) return null
+  const patch = diffPatch(base.content, data.content)
+  const inserted = patch.reduce((size, [, , insert]) => size + insert.length, 0)
+  if (inserted > data.content.length / 2) return null
+  const checksum = await gitBlobSha(data.content)
+  if (!checksum) return null
+  const { content, ...rest } = data
+  return { ...rest, patch, checksum }
 }
 
 export const articleApi = {
@@ -60,6 +100,9 @@ export const articleApi = {
           const vRes = await apiClient.get('/version');
           if (vRes.status === 200 && vRes.data.version === cached.version) {
              console.log('Frontend Cache Hit: Detail', path);
+             // 缓存的是 { data, sha } 结构 (见下方写入缓存处)
+             const entry = cached.data as any
+             rememberBase(path, entry.sha, entry.data?.content)
              // 注意：这里缺少 SHA，如果依赖 SHA 进行编辑可能需要重新考虑。
              // 但通常 SHA 包含在 content_file 元数据里。
              // 后端 getDetail 返回 data 和 sha 字段。
@@ -86,6 +129,7 @@ export const articleApi = {
     }>>('/article/detail', { params: { path, force_refresh: forceRefresh } });
 
     if (res.code === 200) {
+      rememberBase(path, res.sha, res.data.content)
       apiClient.get('/version').then(vRes => {
         if (vRes.status === 200) {
            // 缓存整个 res 结构不太好，因为类型不匹配。
@@ -105,8 +149,17 @@ export const articleApi = {
 
   // 保存文章
   save: async (data: ArticleSaveParams) => {
-    const res = await apiClient.post<any, ApiResponse<{ sha: string }>>('/article/save', data);
+    const delta = await deltaPayload(data)
+    let res: ApiResponse<{ content?: string } | null>
+    try {
+      res = await apiClient.post<any, ApiResponse<{ content?: string } | null>>('/article/save', delta ?? data);
+    } catch (e: any) {
+      // 服务端没有基准内容或校验不一致：改为上传完整内容
+      if (!delta || e?.code !== 412) throw e
+      res = await apiClient.post<any, ApiResponse<{ content?: string } | null>>('/article/save', data);
+    }
     if (res.code === 200) {
+      rememberBase(data.path, res.sha, res.merged && res.data?.content ? res.data.content : data.content)
       // 激进失效策略
       await ApiCache.remove('cms_article_list');
       await ApiCache.remove(`cms_article_${data.path}`);
@@ -135,12 +188,37 @@ export const articleApi = {
     return res;
   },
 
+  // 批量提交：多个文件的保存 / 删除合并为一次 commit
+  batch: async (changes: BatchChange[], message?: string) => {
+    const res = await apiClient.post<any, ApiResponse<{ files: Record<string, string | null> }>>('/articles/batch', { changes, message });
+    if (res.code === 200) {
+      await ApiCache.remove('cms_article_list');
+      for (const change of changes) {
+        await ApiCache.remove(`cms_article_${change.path}`);
+      }
+    }
+    return res;
+  },
+
+  // 全文检索（BM25 排序，带高亮摘要）
+  search: (q: string, page = 1, pageSize = 20) =>
+    apiClient.get<any, ApiResponse<SearchHit[]>>('/search', { params: { q, page, page_size: pageSize } }),
+
   // 图片上传（如果是直接由 Vditor 调用，保持原样；如果手动调用可写在这）
   uploadImage: (formData: FormData) => 
     apiClient.post<any, ApiResponse<{ url: string }>>('/upload/image', formData, {
       headers: { 'Content-Type': 'multipart/form-data' }
     }),
 
+  // 批量上传图片（后端并发上传，逐个返回结果）
+  uploadImages: (files: File[]) => {
+    const formData = new FormData()
+    files.forEach(file => formData.append('files', file))
+    return apiClient.post<any, ApiResponse<{ name: string; url: string | null; error: string | null }[]>>('/upload/images', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' }
+    })
+  },
+
   // 改变密码
   changePassword: async (data: { currentPassword: string; newPassword: string }) => {
     // 注意：apiClient 已经配置了 baseURL 为 /api，所以这里不要再加 /api 前缀
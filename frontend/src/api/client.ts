@@ -37,7 +37,7 @@ apiClient.interceptors.response.use(
 
     // 如果设置了跳过错误处理，则直接 reject，不弹窗
     if (skipErrorHandle) {
-      return Promise.reject(new Error(res.msg));
+      return Promise.reject(Object.assign(new Error(res.msg), { code: res.code }));
     }
 
     switch (res.code) {
@@ -48,13 +48,16 @@ apiClient.interceptors.response.use(
       case 404:
         ElMessage.error('找不到相关资源');
         break;
+      case 412:
+        // 增量保存的基准内容不可用，由调用方改为上传完整内容
+        break;
       case 502:
         ElMessage.error('GitHub 接口响应超时，请检查网络或配置');
         break;
       default:
         ElMessage.error(res.msg || '未知逻辑错误');
     }
-    return Promise.reject(new Error(res.msg));
+    return Promise.reject(Object.assign(new Error(res.msg), { code: res.code }));
   },
   (error) => {
     if (error.response?.status === 401) {
@@ -92,6 +95,8 @@ export interface ApiResponse<T = any> {
   data: T;
   sha?: string;
   total?: number;
+  pending?: boolean; // 保存已写入服务端队列，稍后同步到 GitHub
+  merged?: boolean; // 基准版本已过期，服务端已与他人的修改自动合并，data.content 为合并结果
 }
 
 export default apiClient
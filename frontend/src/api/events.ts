@@ -0,0 +1,60 @@
+import { ApiCache } from '../utils/apiCache'
+
+export interface ArticleChange {
+  path: string
+  action: 'create' | 'update' | 'delete' | 'rename'
+  sha: string | null // 删除时为 null
+  from?: string // rename 的原路径
+}
+
+export interface ChangeEvent {
+  id: number
+  commit: string | null
+  changes: ArticleChange[]
+  pending: boolean // 写后提交尚未推送到 GitHub
+}
+
+export interface ChangeFeedHandlers {
+  onChange: (event: ChangeEvent) => void
+  // 服务端无法补发断线期间的事件，需要重新拉取列表
+  onResync: () => void
+  // 连接状态变化：断开期间由调用方回退到轮询
+  onStatus?: (open: boolean) => void
+}
+
+/**
+ * 订阅 /api/events 变更推送 (Server-Sent Events)，取代轮询 /api/version。
+ * 浏览器断线后自动重连并带上 Last-Event-ID，服务端补发错过的事件。
+ * EventSource 不能设置请求头，token 通过查询参数传递。返回取消订阅函数。
+ */
+export const subscribeChanges = (handlers: ChangeFeedHandlers): (() => void) => {
+  const token = localStorage.getItem('token')
+  if (!token || typeof EventSource === 'undefined') {
+    handlers.onStatus?.(false)
+    return () => {}
+  }
+
+  const source = new EventSource(`/api/events?token=${encodeURIComponent(token)}`)
+
+  source.addEventListener('change', async (e) => {
+    const event: ChangeEvent = JSON.parse((e as MessageEvent).data)
+    // 先让本地缓存失效，之后的 getList / getDetail 会穿透到后端
+    await ApiCache.remove('cms_article_list')
+    for (const change of event.changes) {
+      await ApiCache.remove(`cms_article_${change.path}`)
+      if (change.from) await ApiCache.remove(`cms_article_${change.from}`)
+    }
+    handlers.onChange(event)
+  })
+
+  source.addEventListener('resync', async () => {
+    await ApiCache.remove('cms_article_list')
+    handlers.onResync()
+  })
+
+  source.onopen = () => handlers.onStatus?.(true)
+  // 出错后浏览器会自动重连；若被拒绝 (如 token 过期)，readyState 变为 CLOSED 不再重连
+  source.onerror = () => handlers.onStatus?.(false)
+
+  return () => source.close()
+}
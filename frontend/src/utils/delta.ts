@@ -0,0 +1,44 @@
+/**
+ * 增量保存：相对于基准内容的补丁 [[at, delete, insert]]，偏移为 JS 字符串下标 (UTF-16 码元)
+ */
+export type PatchOp = [number, number, string]
+
+const isHighSurrogate = (code: number) => code >= 0xd800 && code <= 0xdbff
+const isLowSurrogate = (code: number) => code >= 0xdc00 && code <= 0xdfff
+
+/**
+ * 去掉公共前缀和后缀，剩下的中间部分即为一次替换。
+ * 自动保存两次之间通常只有一处连续的编辑，O(n) 即可得到很小的补丁。
+ */
+export const diffPatch = (base: string, next: string): PatchOp[] => {
+  if (base === next) return []
+  const max = Math.min(base.length, next.length)
+  let prefix = 0
+  while (prefix < max && base.charCodeAt(prefix) === next.charCodeAt(prefix)) prefix++
+  // 不切开代理对 (emoji 等)
+  if (prefix > 0 && isHighSurrogate(base.charCodeAt(prefix - 1))) prefix--
+
+  let suffix = 0
+  while (
+    suffix < max - prefix &&
+    base.charCodeAt(base.length - 1 - suffix) === next.charCodeAt(next.length - 1 - suffix)
+  ) suffix++
+  if (suffix > 0 && isLowSurrogate(base.charCodeAt(base.length - suffix))) suffix--
+
+  return [[prefix, base.length - prefix - suffix, next.slice(prefix, next.length - suffix)]]
+}
+
+/**
+ * 按 git 规则计算 blob SHA ("blob <字节数>\0" + UTF-8 内容)，服务端用它校验重建结果。
+ * 非安全上下文 (http 且非 localhost) 没有 crypto.subtle，返回 null。
+ */
+export const gitBlobSha = async (text: string): Promise<string | null> => {
+  if (!globalThis.crypto?.subtle) return null
+  const body = new TextEncoder().encode(text)
+  const header = new TextEncoder().encode(`blob ${body.length}\0`)
+  const data = new Uint8Array(header.length + body.length)
+  data.set(header)
+  data.set(body, header.length)
+  const digest = await crypto.subtle.digest('SHA-1', data)
+  return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('')
+}